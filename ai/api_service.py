@@ -4,10 +4,11 @@ FastAPI service for AI-powered educational content generation using OpenRouter
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Any
 import logging
-import json
+import orjson
 from datetime import datetime
 
 from openrouter_service import OpenRouterService
@@ -189,6 +190,26 @@ async def generate_quiz(request: QuizGenerationRequest):
             message="Unable to generate quiz. Please try again or contact support."
         )
 
+@app.post("/quiz/stream")
+async def stream_quiz(request: QuizGenerationRequest):
+    """Stream a quiz as server-sent events (question, done, error)"""
+    logger.info(f"Streaming enhanced quiz for {request.subject} - {request.topic} (Grade {request.grade})")
+    
+    def event_stream():
+        for event in enhanced_quiz_generator.stream_quiz(
+            subject=request.subject,
+            topic=request.topic,
+            grade=request.grade,
+            question_count=request.questionCount,
+            difficulty=request.difficulty,
+            question_types=request.questionTypes,
+            language=request.language,
+            include_pdfs=True
+        ):
+            yield _sse_event(event)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 # Enhanced Curriculum generation endpoint
 @app.post("/curriculum/generate", response_model=APIResponse)
 async def generate_curriculum(request: CurriculumGenerationRequest):
@@ -333,8 +354,29 @@ async def generate_slides(request: SlideGenerationRequest):
             message="Unable to generate slides. Please try again."
         )
 
+@app.post("/slides/stream")
+async def stream_slides(request: SlideGenerationRequest):
+    """Stream a presentation as server-sent events (slide, done, error)"""
+    logger.info(f"Streaming enhanced slides for {request.subject} - {request.topic}")
+    
+    def event_stream():
+        for event in enhanced_slide_generator.stream_slides(
+            subject=request.subject,
+            topic=request.topic,
+            grade=request.grade,
+            slide_count=request.slideCount,
+            theme=request.theme,
+            template=request.template,
+            difficulty=request.difficulty,
+            language=request.language,
+            include_images=request.includeImages
+        ):
+            yield _sse_event(event)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 # Enhanced Mindmap generation endpoint  
-@app.post("/mindmap/generate", response_model=APIResponse)
+@app.post("/mindmap/generate", response_model=APIResponse, response_class=ORJSONResponse)
 async def generate_mindmap(request: MindmapGenerationRequest):
     """Generate interactive mindmap with superior visual design"""
     try:
@@ -605,7 +647,31 @@ async def generate_enhanced_lecture_plan(request: LecturePlanGenerationRequest):
         logger.error(f"Error in enhanced lecture plan generation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/enhanced/mindmap", response_model=APIResponse)
+def _sse_event(event: Dict[str, Any]) -> str:
+    """Format a streaming event as a server-sent event frame"""
+    return f"event: {event['type']}\ndata: {orjson.dumps(event, option=orjson.OPT_NON_STR_KEYS).decode()}\n\n"
+
+@app.post("/enhanced/lecture-plan/stream")
+async def stream_enhanced_lecture_plan(request: LecturePlanGenerationRequest):
+    """Stream a lecture plan as server-sent events (token, section_complete, done, error)"""
+    logger.info(f"Streaming enhanced lecture plan for {request.subject} - {request.topic}")
+    
+    async def event_stream():
+        async for event in enhanced_lecture_plan_generator.generate_lecture_plan_stream(
+            subject=request.subject,
+            topic=request.topic,
+            grade=request.grade,
+            duration=request.duration,
+            learning_objectives=request.learningObjectives,
+            teaching_strategies=request.teachingStrategies,
+            difficulty=request.difficulty,
+            language=request.language
+        ):
+            yield _sse_event(event)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/enhanced/mindmap", response_model=APIResponse, response_class=ORJSONResponse)
 async def generate_enhanced_mindmap(request: MindmapGenerationRequest):
     """Generate cognitive mindmap using Enhanced Mindmap Generator"""
     try:
@@ -635,6 +701,23 @@ async def generate_enhanced_mindmap(request: MindmapGenerationRequest):
         logger.error(f"Error in enhanced mindmap generation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/enhanced/mindmap/stream")
+async def stream_enhanced_mindmap(request: MindmapGenerationRequest):
+    """Stream a mindmap as server-sent events (central, branch, done, error)"""
+    logger.info(f"Streaming enhanced mindmap for {request.subject} - {request.topic}")
+    
+    def event_stream():
+        for event in enhanced_mindmap_generator.stream_mindmap(
+            subject=request.subject,
+            topic=request.topic,
+            grade=request.grade,
+            mindmap_type=request.mindmapType,
+            language=request.language
+        ):
+            yield _sse_event(event)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.post("/enhanced/assessment", response_model=APIResponse)
 async def assess_answer_sheet(request: AnswerSheetRequest):
     """Assess answer sheet using Enhanced Answer Assessment"""
@@ -3,78 +3,384 @@ Enhanced Lecture Plan Generation Module
 Uses OpenRouter Claude 3.5 Sonnet for superior educational lecture plan generation
 """
 
-import json
+import asyncio
+import copy
 import logging
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Any, Tuple, Union
+from datetime import datetime, timezone
 import os
-from openrouter_service import OpenRouterService
+import orjson
+from openrouter_service import OpenRouterService, run_sync
+from json_stream import IncrementalJSONScanner, repair_json
+from response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
+def _object_schema(**properties) -> Dict:
+    """Strict JSON Schema object where every listed property is required"""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+_STRING = {"type": "string"}
+_INTEGER = {"type": "integer"}
+_STRING_LIST = {"type": "array", "items": _STRING}
+
+# JSON Schema for structured lecture plan output (sent as response_format)
+LECTURE_PLAN_SCHEMA = _object_schema(
+    lessonPlan=_object_schema(
+        title=_STRING,
+        subject=_STRING,
+        topic=_STRING,
+        grade=_INTEGER,
+        duration=_object_schema(
+            total=_INTEGER,
+            breakdown=_object_schema(
+                opening=_INTEGER,
+                introduction=_INTEGER,
+                mainContent=_INTEGER,
+                closure=_INTEGER
+            )
+        ),
+        language=_STRING,
+        difficulty=_STRING,
+        description=_STRING,
+        learningObjectives={"type": "array", "items": _object_schema(
+            objective=_STRING,
+            bloomsLevel={"type": "string", "enum": ["remember", "understand", "apply", "analyze", "evaluate", "create"]},
+            assessmentMethod=_STRING
+        )},
+        prerequisites=_STRING_LIST,
+        keyVocabulary={"type": "array", "items": _object_schema(
+            term=_STRING,
+            definition=_STRING,
+            context=_STRING
+        )},
+        materials=_object_schema(
+            required=_STRING_LIST,
+            optional=_STRING_LIST,
+            technology=_STRING_LIST
+        ),
+        lessonStructure=_object_schema(
+            opening=_object_schema(
+                duration=_INTEGER,
+                activity=_STRING,
+                purpose=_STRING,
+                teacherActions=_STRING_LIST,
+                studentActions=_STRING_LIST,
+                materials=_STRING_LIST
+            ),
+            introduction=_object_schema(
+                duration=_INTEGER,
+                activity=_STRING,
+                purpose=_STRING,
+                teacherActions=_STRING_LIST,
+                studentActions=_STRING_LIST,
+                checkForUnderstanding=_STRING
+            ),
+            mainContent=_object_schema(
+                duration=_INTEGER,
+                activities={"type": "array", "items": _object_schema(
+                    name=_STRING,
+                    duration=_INTEGER,
+                    description=_STRING,
+                    teachingStrategy=_STRING,
+                    grouping={"type": "string", "enum": ["Individual", "Pairs", "Small groups", "Whole class"]},
+                    materials=_STRING_LIST,
+                    instructions=_STRING_LIST,
+                    assessmentCheckpoint=_STRING,
+                    differentiation=_object_schema(
+                        advancedLearners=_STRING,
+                        strugglingLearners=_STRING,
+                        englishLanguageLearners=_STRING
+                    )
+                )},
+                transitions=_STRING_LIST
+            ),
+            closure=_object_schema(
+                duration=_INTEGER,
+                activity=_STRING,
+                purpose=_STRING,
+                reflectionQuestions=_STRING_LIST,
+                exitTicket=_STRING,
+                preview=_STRING
+            )
+        ),
+        assessment=_object_schema(
+            formative={"type": "array", "items": _object_schema(
+                method=_STRING,
+                timing=_STRING,
+                purpose=_STRING,
+                feedback=_STRING
+            )},
+            summative=_STRING_LIST,
+            rubrics=_STRING_LIST,
+            selfAssessment=_STRING_LIST
+        ),
+        differentiation=_object_schema(
+            content=_STRING,
+            process=_STRING,
+            product=_STRING,
+            environment=_STRING
+        ),
+        technologyIntegration=_object_schema(
+            tools=_STRING_LIST,
+            purpose=_STRING_LIST,
+            alternatives=_STRING_LIST
+        ),
+        realWorldConnections=_STRING_LIST,
+        homework=_object_schema(
+            assignment=_STRING,
+            purpose=_STRING,
+            timeEstimate=_STRING,
+            differentiatedOptions=_STRING_LIST
+        ),
+        reflectionQuestions=_object_schema(
+            forTeacher=_STRING_LIST,
+            forStudents=_STRING_LIST
+        ),
+        extensionActivities=_STRING_LIST
+    ),
+    metadata=_object_schema(
+        ncertAligned={"type": "boolean"},
+        pedagogicalApproach=_STRING,
+        aiModel=_STRING,
+        qualityLevel=_STRING,
+        teachingFrameworks=_STRING_LIST
+    )
+)
+
+def _schema_skeleton(schema: Dict) -> Any:
+    """Example value with the schema's shape: enums as "a|b", empty strings, zeros and one-item arrays"""
+    if schema["type"] == "object":
+        return {name: _schema_skeleton(prop) for name, prop in schema["properties"].items()}
+    if schema["type"] == "array":
+        return [_schema_skeleton(schema["items"])]
+    if "enum" in schema:
+        return "|".join(schema["enum"])
+    return {"string": "", "integer": 0, "boolean": True}[schema["type"]]
+
+# Minified field skeleton for the prompt, for providers that drop or ignore response_format
+LECTURE_PLAN_SKELETON_JSON = orjson.dumps(_schema_skeleton(LECTURE_PLAN_SCHEMA)).decode()
+
+_LECTURE_PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "lesson_plan", "schema": LECTURE_PLAN_SCHEMA, "strict": True}
+}
+
+# Teaching strategies and their descriptions (shared, read-only)
+_TEACHING_STRATEGIES = MappingProxyType({
+    "direct_instruction": {
+        "description": "Teacher-led explicit instruction",
+        "best_for": ["New concepts", "Skill demonstration", "Content delivery"],
+        "structure": ["Hook", "Objective", "Explanation", "Modeling", "Practice", "Closure"]
+    },
+    "inquiry_based": {
+        "description": "Student-led investigation and discovery",
+        "best_for": ["Problem solving", "Critical thinking", "Scientific method"],
+        "structure": ["Question", "Hypothesis", "Investigation", "Analysis", "Conclusion"]
+    },
+    "collaborative_learning": {
+        "description": "Students work together to achieve learning goals",
+        "best_for": ["Complex projects", "Peer learning", "Social skills"],
+        "structure": ["Group formation", "Task assignment", "Collaboration", "Presentation", "Reflection"]
+    },
+    "flipped_classroom": {
+        "description": "Students learn content at home, apply in class",
+        "best_for": ["Technology integration", "Self-paced learning", "Active application"],
+        "structure": ["Pre-class preparation", "Class discussion", "Application activities", "Assessment"]
+    },
+    "project_based": {
+        "description": "Learning through extended project work",
+        "best_for": ["Real-world applications", "Integration of skills", "Student choice"],
+        "structure": ["Project introduction", "Planning", "Research", "Creation", "Presentation"]
+    }
+})
+
+# Lesson structure templates (shared, read-only)
+_LESSON_STRUCTURES = MappingProxyType({
+    "5e_model": {
+        "phases": ["Engage", "Explore", "Explain", "Elaborate", "Evaluate"],
+        "description": "Constructivist learning cycle"
+    },
+    "gradual_release": {
+        "phases": ["I do", "We do", "You do together", "You do alone"],
+        "description": "Progressive independence model"
+    },
+    "madeline_hunter": {
+        "phases": ["Anticipatory set", "Objective", "Input", "Modeling", "Check for understanding", "Guided practice", "Independent practice", "Closure"],
+        "description": "Direct instruction model"
+    }
+})
+
+# Prompt bullet line for each known teaching strategy
+_STRATEGY_BULLETS = MappingProxyType({
+    key: f"- {key}: {info.get('description', '')}"
+    for key, info in _TEACHING_STRATEGIES.items()
+})
+
+# Fixed order in which strategies are rendered and selected, so the prompt prefix never varies
+_CANONICAL_STRATEGY_ORDER = (
+    "direct_instruction",
+    "inquiry_based",
+    "collaborative_learning",
+    "flipped_classroom",
+    "project_based"
+)
+
+# Strategies used when a request does not name any
+_DEFAULT_STRATEGIES = ("direct_instruction", "interactive")
+
+@dataclass(frozen=True, slots=True)
+class LecturePlanSpec:
+    """Hashable description of a lecture plan request; doubles as its cache key"""
+    subject: str
+    topic: str
+    grade: int
+    duration: int = 45
+    difficulty: str = "grade_appropriate"
+    language: str = "en"
+    include_technology: bool = True
+    learning_objectives: Tuple[str, ...] = ()
+    teaching_strategies: Tuple[str, ...] = _DEFAULT_STRATEGIES
+    
+    @classmethod
+    def coerce(cls, subject: Union[str, "LecturePlanSpec"], topic: Optional[str], grade: Optional[int],
+               duration: int = 45, learning_objectives: Optional[List[str]] = None,
+               teaching_strategies: Optional[List[str]] = None, difficulty: str = "grade_appropriate",
+               language: str = "en", include_technology: bool = True) -> "LecturePlanSpec":
+        """Return subject unchanged if it already is a spec, otherwise build one from the arguments"""
+        if isinstance(subject, cls):
+            return subject
+        return cls(
+            subject=subject,
+            topic=topic,
+            grade=grade,
+            duration=duration,
+            difficulty=difficulty,
+            language=language,
+            include_technology=include_technology,
+            learning_objectives=tuple(learning_objectives or ()),
+            teaching_strategies=tuple(teaching_strategies or _DEFAULT_STRATEGIES)
+        )
+
 class EnhancedLecturePlanGenerator:
     """Enhanced lecture plan generator using OpenRouter Claude 3.5 Sonnet"""
     
+    # Static skeleton of the fallback plan; topic-specific fields are filled in per call
+    _FALLBACK_PLAN_TEMPLATE = {
+        "lessonPlan": {
+            "title": None,
+            "subject": None,
+            "topic": None,
+            "grade": None,
+            "duration": None,
+            "language": None,
+            "difficulty": None,
+            "description": None,
+            "learningObjectives": [
+                {
+                    "objective": None,
+                    "bloomsLevel": "understand",
+                    "assessmentMethod": "Observation and questioning"
+                }
+            ],
+            "lessonStructure": {
+                "opening": {
+                    "duration": 5,
+                    "activity": "Engage students with topic introduction",
+                    "purpose": "Activate prior knowledge"
+                },
+                "introduction": {
+                    "duration": 10,
+                    "activity": "Introduce main concepts",
+                    "purpose": "Build foundation understanding"
+                },
+                "mainContent": {
+                    "duration": None,
+                    "activities": [
+                        {
+                            "name": "Core Learning Activity",
+                            "duration": None,
+                            "description": "Main learning activity for the lesson",
+                            "teachingStrategy": "Interactive instruction"
+                        }
+                    ]
+                },
+                "closure": {
+                    "duration": 5,
+                    "activity": "Summarize and reflect",
+                    "purpose": "Consolidate learning"
+                }
+            }
+        },
+        "metadata": {
+            "createdAt": None,
+            "ncertAligned": True,
+            "aiModel": "claude-3.5-sonnet-fallback",
+            "qualityLevel": "enhanced"
+        }
+    }
+    
     def __init__(self, api_key: Optional[str] = None):
         """Initialize the enhanced lecture plan generator"""
         self.openrouter = OpenRouterService(api_key)
         self.model_name = "meta-llama/llama-3.2-3b-instruct:free"  # Specific model for lecture plan generation
+        self._response_cache = ResponseCache(negative_ttl=30)
+        self.repaired_responses = 0  # Truncated/malformed responses salvaged by repair_json
         
-        # Load teaching strategies and pedagogical frameworks
-        self.teaching_strategies = self._load_teaching_strategies()
-        self.lesson_structures = self._load_lesson_structures()
+        # Teaching strategies and pedagogical frameworks are shared module constants
+        self.teaching_strategies = _TEACHING_STRATEGIES
+        self.lesson_structures = _LESSON_STRUCTURES
+        
+        # Precompute prompt fragments that do not change between calls
+        self._lang_map = {"hi": "Hindi", "en": "English"}
+        self._strategy_bullets = _STRATEGY_BULLETS
+        self._system_prompt_static = """You are an expert lesson planner and instructional designer with deep expertise in:
+- NCERT curriculum standards and Indian education pedagogy
+- Research-based teaching strategies and methodologies
+- Student-centered learning and differentiated instruction
+- Bloom's Taxonomy and cognitive development
+- Assessment design and formative evaluation
+- Classroom management and engagement techniques
+- Technology integration in education
+
+Your task is to create exceptional lesson plans that SURPASS the quality of any other AI system including ChatGPT.
+
+Design principles you must follow:
+1. SUPERIOR pedagogical design compared to ChatGPT
+2. Perfect NCERT curriculum alignment for Indian classrooms
+3. Student-centered and engaging activities
+4. Clear learning progression and scaffolding
+5. Embedded formative assessment
+6. Differentiated instruction for diverse learners
+7. Real-world relevance and application
+8. Cultural sensitivity and local context
+
+TEACHING STRATEGY REFERENCE:
+""" + "\n".join(self._strategy_bullets[s] for s in _CANONICAL_STRATEGY_ORDER) + """
+
+lesson_plan schema ("a|b" means one of the options):
+""" + LECTURE_PLAN_SKELETON_JSON
         
-    def _load_teaching_strategies(self) -> Dict:
+    def _load_teaching_strategies(self) -> Mapping[str, Dict]:
         """Load various teaching strategies and their descriptions"""
-        return {
-            "direct_instruction": {
-                "description": "Teacher-led explicit instruction",
-                "best_for": ["New concepts", "Skill demonstration", "Content delivery"],
-                "structure": ["Hook", "Objective", "Explanation", "Modeling", "Practice", "Closure"]
-            },
-            "inquiry_based": {
-                "description": "Student-led investigation and discovery",
-                "best_for": ["Problem solving", "Critical thinking", "Scientific method"],
-                "structure": ["Question", "Hypothesis", "Investigation", "Analysis", "Conclusion"]
-            },
-            "collaborative_learning": {
-                "description": "Students work together to achieve learning goals",
-                "best_for": ["Complex projects", "Peer learning", "Social skills"],
-                "structure": ["Group formation", "Task assignment", "Collaboration", "Presentation", "Reflection"]
-            },
-            "flipped_classroom": {
-                "description": "Students learn content at home, apply in class",
-                "best_for": ["Technology integration", "Self-paced learning", "Active application"],
-                "structure": ["Pre-class preparation", "Class discussion", "Application activities", "Assessment"]
-            },
-            "project_based": {
-                "description": "Learning through extended project work",
-                "best_for": ["Real-world applications", "Integration of skills", "Student choice"],
-                "structure": ["Project introduction", "Planning", "Research", "Creation", "Presentation"]
-            }
-        }
+        return _TEACHING_STRATEGIES
     
-    def _load_lesson_structures(self) -> Dict:
+    def _load_lesson_structures(self) -> Mapping[str, Dict]:
         """Load different lesson structure templates"""
-        return {
-            "5e_model": {
-                "phases": ["Engage", "Explore", "Explain", "Elaborate", "Evaluate"],
-                "description": "Constructivist learning cycle"
-            },
-            "gradual_release": {
-                "phases": ["I do", "We do", "You do together", "You do alone"],
-                "description": "Progressive independence model"
-            },
-            "madeline_hunter": {
-                "phases": ["Anticipatory set", "Objective", "Input", "Modeling", "Check for understanding", "Guided practice", "Independent practice", "Closure"],
-                "description": "Direct instruction model"
-            }
-        }
+        return _LESSON_STRUCTURES
     
     def generate_lecture_plan(self, 
-                            subject: str,
-                            topic: str,
-                            grade: int,
+                            subject: Union[str, LecturePlanSpec],
+                            topic: Optional[str] = None,
+                            grade: Optional[int] = None,
                             duration: int = 45,
                             learning_objectives: List[str] = None,
                             teaching_strategies: List[str] = None,
@@ -86,7 +392,7 @@ class EnhancedLecturePlanGenerator:
         Generate a comprehensive lecture plan using OpenRouter Claude 3.5 Sonnet
         
         Args:
-            subject: Subject name
+            subject: Subject name, or a complete LecturePlanSpec (other arguments are then ignored)
             topic: Specific topic for the lesson
             grade: Grade level
             duration: Duration in minutes
@@ -100,78 +406,208 @@ class EnhancedLecturePlanGenerator:
             Dictionary containing the generated lecture plan with enhanced quality
         """
         
+        spec = LecturePlanSpec.coerce(
+            subject, topic, grade, duration, learning_objectives,
+            teaching_strategies, difficulty, language, include_technology
+        )
+        
+        # Recent transient failure for the same request: don't hammer the upstream again
+        cached_error = self._response_cache.get_negative(spec)
+        if cached_error:
+            return {
+                "success": False,
+                "error": cached_error,
+                "data": None
+            }
+        
         try:
             # Generate lecture plan using OpenRouter
             plan_response = self._generate_with_openrouter(
-                subject, topic, grade, duration, learning_objectives or [],
-                teaching_strategies or ["direct_instruction", "interactive"],
-                difficulty, language, include_technology
+                spec.subject, spec.topic, spec.grade, spec.duration,
+                list(spec.learning_objectives), list(spec.teaching_strategies),
+                spec.difficulty, spec.language, spec.include_technology
             )
             
-            if plan_response.get("success"):
-                plan_data = self._parse_and_enhance_plan(
-                    plan_response["content"], subject, topic, grade,
-                    duration, difficulty, language
-                )
+            return self._build_plan_result(plan_response, spec)
                 
-                return {
-                    "success": True,
-                    "data": plan_data,
-                    "generated_at": datetime.now().isoformat(),
-                    "model": "claude-3.5-sonnet",
-                    "enhanced_features": {
-                        "ncert_aligned": True,
-                        "differentiated_instruction": True,
-                        "technology_integrated": include_technology,
-                        "assessment_embedded": True,
-                        "student_centered": True
-                    }
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": plan_response.get("error", "Unknown error"),
-                    "data": None
-                }
+        except Exception as e:
+            logger.error(f"Lecture plan generation error: {e}")
+            self._response_cache.set_negative(spec, str(e))
+            return {
+                "success": False,
+                "error": str(e),
+                "data": None
+            }
+    
+    async def agenerate_lecture_plan(self, 
+                                     subject: Union[str, LecturePlanSpec],
+                                     topic: Optional[str] = None,
+                                     grade: Optional[int] = None,
+                                     duration: int = 45,
+                                     learning_objectives: List[str] = None,
+                                     teaching_strategies: List[str] = None,
+                                     difficulty: str = "grade_appropriate",
+                                     language: str = "en",
+                                     include_technology: bool = True,
+                                     **kwargs) -> Dict:
+        """Async variant of generate_lecture_plan for concurrent generation"""
+        
+        spec = LecturePlanSpec.coerce(
+            subject, topic, grade, duration, learning_objectives,
+            teaching_strategies, difficulty, language, include_technology
+        )
+        
+        cached_error = self._response_cache.get_negative(spec)
+        if cached_error:
+            return {
+                "success": False,
+                "error": cached_error,
+                "data": None
+            }
+        
+        try:
+            messages = self._build_plan_messages(
+                spec.subject, spec.topic, spec.grade, spec.duration,
+                list(spec.learning_objectives), list(spec.teaching_strategies),
+                spec.difficulty, spec.language, spec.include_technology
+            )
+            plan_response = await self.openrouter._arequest_with_fallback(
+                messages, temperature=0.7, max_tokens=4000, model_override=self.model_name,
+                response_format=_LECTURE_PLAN_RESPONSE_FORMAT
+            )
+            
+            return self._build_plan_result(plan_response, spec)
                 
         except Exception as e:
             logger.error(f"Lecture plan generation error: {e}")
+            self._response_cache.set_negative(spec, str(e))
             return {
                 "success": False,
                 "error": str(e),
                 "data": None
             }
     
+    def _build_plan_result(self, plan_response: Dict, spec: LecturePlanSpec) -> Dict:
+        """Turn an OpenRouter response into the public lecture plan result"""
+        if plan_response.get("success"):
+            plan_data = self._parse_and_enhance_plan(
+                plan_response["content"], spec.subject, spec.topic, spec.grade,
+                spec.duration, spec.difficulty, spec.language
+            )
+            
+            return {
+                "success": True,
+                "data": plan_data,
+                "generated_at": datetime.now().isoformat(),
+                "model": "claude-3.5-sonnet",
+                "enhanced_features": {
+                    "ncert_aligned": True,
+                    "differentiated_instruction": True,
+                    "technology_integrated": spec.include_technology,
+                    "assessment_embedded": True,
+                    "student_centered": True
+                }
+            }
+        
+        error = plan_response.get("error", "Unknown error")
+        self._response_cache.set_negative(spec, error)
+        return {
+            "success": False,
+            "error": error,
+            "data": None
+        }
+    
+    async def generate_lecture_plan_stream(self,
+                                           subject: str,
+                                           topic: str,
+                                           grade: int,
+                                           duration: int = 45,
+                                           learning_objectives: List[str] = None,
+                                           teaching_strategies: List[str] = None,
+                                           difficulty: str = "grade_appropriate",
+                                           language: str = "en",
+                                           include_technology: bool = True,
+                                           cancel_event: Optional[threading.Event] = None) -> AsyncIterator[Dict]:
+        """
+        Stream a lecture plan as it is generated
+        
+        Yields events of type "token" (raw text delta), "section_complete" (a
+        top-level lessonPlan section or a main content activity that finished
+        streaming), "done" (the parsed and enhanced plan) or "error". Setting
+        cancel_event stops generation and closes the upstream connection.
+        """
+        cancel_event = cancel_event or threading.Event()
+        messages = self._build_plan_messages(
+            subject, topic, grade, duration, learning_objectives or [],
+            teaching_strategies or list(_DEFAULT_STRATEGIES),
+            difficulty, language, include_technology
+        )
+        scanner = IncrementalJSONScanner(self._is_streamed_section)
+        chunks = self.openrouter._stream_request(
+            messages, temperature=0.7, max_tokens=4000,
+            model=self.model_name, cancel_event=cancel_event,
+            response_format=_LECTURE_PLAN_RESPONSE_FORMAT
+        )
+        
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                
+                yield {"type": "token", "content": chunk}
+                for section in scanner.feed(chunk):
+                    path = section["path"]
+                    yield {
+                        "type": "section_complete",
+                        "section": path[2] if len(path) == 3 else "activity",
+                        "data": section["data"]
+                    }
+            
+            if cancel_event.is_set():
+                return
+            
+            plan_data = self._parse_and_enhance_plan(
+                scanner.text, subject, topic, grade, duration, difficulty, language
+            )
+            yield {"type": "done", "data": plan_data, "generated_at": datetime.now().isoformat()}
+            
+        except Exception as e:
+            logger.error(f"Lecture plan streaming error: {e}")
+            yield {"type": "error", "error": str(e)}
+        finally:
+            cancel_event.set()
+    
+    @staticmethod
+    def _is_streamed_section(path: tuple) -> bool:
+        """Select lessonPlan sections and main content activities for early emission"""
+        if len(path) == 3:
+            return path[1] == "lessonPlan"
+        return path == (None, "lessonPlan", "lessonStructure", "mainContent", "activities", None)
+    
     def _generate_with_openrouter(self, subject: str, topic: str, grade: int, duration: int,
                                 learning_objectives: List[str], teaching_strategies: List[str],
                                 difficulty: str, language: str, include_technology: bool) -> Dict:
         """Generate lecture plan using OpenRouter Claude 3.5 Sonnet with enhanced prompts"""
         
-        lang_text = "Hindi" if language == "hi" else "English"
-        strategy_info = [self.teaching_strategies.get(s, {}) for s in teaching_strategies]
+        messages = self._build_plan_messages(
+            subject, topic, grade, duration, learning_objectives,
+            teaching_strategies, difficulty, language, include_technology
+        )
+        
+        return self.openrouter._request_with_fallback(
+            messages, temperature=0.7, max_tokens=4000, model_override=self.model_name,
+            response_format=_LECTURE_PLAN_RESPONSE_FORMAT
+        )
+    
+    def _build_plan_messages(self, subject: str, topic: str, grade: int, duration: int,
+                             learning_objectives: List[str], teaching_strategies: List[str],
+                             difficulty: str, language: str, include_technology: bool) -> List[Dict]:
+        """Build the chat messages for a lecture plan request"""
+        
+        lang_text = self._lang_map.get(language, "English")
+        selected_strategies = ", ".join(self._normalize_strategies(teaching_strategies))
         
-        # Create comprehensive system prompt
-        system_prompt = f"""You are an expert lesson planner and instructional designer with deep expertise in:
-- NCERT curriculum standards and Indian education pedagogy
-- Research-based teaching strategies and methodologies
-- Student-centered learning and differentiated instruction
-- Bloom's Taxonomy and cognitive development
-- Assessment design and formative evaluation
-- Classroom management and engagement techniques
-- Technology integration in education
-
-Your task is to create exceptional lesson plans that SURPASS the quality of any other AI system including ChatGPT.
-
-Design principles you must follow:
-1. SUPERIOR pedagogical design compared to ChatGPT
-2. Perfect NCERT curriculum alignment for Indian classrooms
-3. Student-centered and engaging activities
-4. Clear learning progression and scaffolding
-5. Embedded formative assessment
-6. Differentiated instruction for diverse learners
-7. Real-world relevance and application
-8. Cultural sensitivity and local context"""
-
         # Create detailed user prompt
         user_prompt = f"""Create an exceptional lesson plan for {subject} on "{topic}" for Grade {grade} students.
 
@@ -182,7 +618,7 @@ LESSON SPECIFICATIONS:
 - Duration: {duration} minutes
 - Language: {lang_text}
 - Difficulty: {difficulty}
-- Teaching Strategies: {', '.join(teaching_strategies)}
+- Teaching Strategies: {selected_strategies}
 - Learning Objectives: {', '.join(learning_objectives) if learning_objectives else 'To be determined based on topic'}
 - Technology Integration: {'Yes' if include_technology else 'No'}
 
@@ -199,7 +635,7 @@ ENHANCED REQUIREMENTS (Must exceed ChatGPT quality):
 10. Comprehensive closure and reflection activities
 
 TEACHING STRATEGIES TO INTEGRATE:
-{chr(10).join([f"- {s}: {self.teaching_strategies.get(s, {}).get('description', '')}" for s in teaching_strategies])}
+Apply these strategies from the reference: {selected_strategies}
 
 LESSON STRUCTURE REQUIREMENTS:
 - Clear time allocation for each activity
@@ -217,181 +653,49 @@ QUALITY STANDARDS (Must exceed ChatGPT):
 - Superior differentiation approaches
 - Enhanced real-world connections
 
-Return ONLY a valid JSON object in this exact format:
-{{
-    "lessonPlan": {{
-        "title": "Engaging {topic} Lesson - {subject}",
-        "subject": "{subject}",
-        "topic": "{topic}",
-        "grade": {grade},
-        "duration": {{
-            "total": {duration},
-            "breakdown": {{
-                "opening": 5,
-                "introduction": 10,
-                "mainContent": {duration - 20},
-                "closure": 5
-            }}
-        }},
-        "language": "{language}",
-        "difficulty": "{difficulty}",
-        "description": "NCERT-aligned comprehensive lesson plan with student-centered approach",
-        "learningObjectives": [
-            {{
-                "objective": "Students will be able to...",
-                "bloomsLevel": "understand|apply|analyze|evaluate|create",
-                "assessmentMethod": "How this will be assessed"
-            }}
-        ],
-        "prerequisites": [
-            "Prior knowledge students need"
-        ],
-        "keyVocabulary": [
-            {{
-                "term": "Important term",
-                "definition": "Student-friendly definition",
-                "context": "How it relates to the lesson"
-            }}
-        ],
-        "materials": {{
-            "required": ["Essential materials"],
-            "optional": ["Enhancement materials"],
-            "technology": ["Digital tools if applicable"]
-        }},
-        "lessonStructure": {{
-            "opening": {{
-                "duration": 5,
-                "activity": "Engaging hook activity",
-                "purpose": "Activate prior knowledge and create interest",
-                "teacherActions": ["What teacher does"],
-                "studentActions": ["What students do"],
-                "materials": ["Materials needed"]
-            }},
-            "introduction": {{
-                "duration": 10,
-                "activity": "Concept introduction",
-                "purpose": "Introduce key concepts",
-                "teacherActions": ["Teacher responsibilities"],
-                "studentActions": ["Student activities"],
-                "checkForUnderstanding": "How to assess initial understanding"
-            }},
-            "mainContent": {{
-                "duration": {duration - 20},
-                "activities": [
-                    {{
-                        "name": "Activity name",
-                        "duration": 15,
-                        "description": "Detailed activity description",
-                        "teachingStrategy": "Strategy being used",
-                        "grouping": "Individual|Pairs|Small groups|Whole class",
-                        "materials": ["Required materials"],
-                        "instructions": ["Step-by-step instructions"],
-                        "assessmentCheckpoint": "How to check understanding",
-                        "differentiation": {{
-                            "advancedLearners": "Extension activities",
-                            "strugglingLearners": "Support strategies",
-                            "englishLanguageLearners": "ELL accommodations"
-                        }}
-                    }}
-                ],
-                "transitions": ["How to move between activities smoothly"]
-            }},
-            "closure": {{
-                "duration": 5,
-                "activity": "Lesson summary and reflection",
-                "purpose": "Consolidate learning and prepare for next steps",
-                "reflectionQuestions": ["Questions to guide reflection"],
-                "exitTicket": "Quick assessment question",
-                "preview": "Connection to future learning"
-            }}
-        }},
-        "assessment": {{
-            "formative": [
-                {{
-                    "method": "Assessment method",
-                    "timing": "When during lesson",
-                    "purpose": "What it measures",
-                    "feedback": "How feedback is provided"
-                }}
-            ],
-            "summative": ["End-of-lesson assessment if applicable"],
-            "rubrics": ["Assessment criteria"],
-            "selfAssessment": ["Student reflection prompts"]
-        }},
-        "differentiation": {{
-            "content": "How content is differentiated",
-            "process": "How activities are differentiated", 
-            "product": "How student work is differentiated",
-            "environment": "How classroom setup supports all learners"
-        }},
-        "technologyIntegration": {{
-            "tools": ["Digital tools used"],
-            "purpose": ["Educational purpose of each tool"],
-            "alternatives": ["Non-tech alternatives if tools unavailable"]
-        }},
-        "realWorldConnections": [
-            "How this topic relates to students' lives",
-            "Career connections",
-            "Current events or social issues"
-        ],
-        "homework": {{
-            "assignment": "Description of homework",
-            "purpose": "Learning objective of assignment",
-            "timeEstimate": "Expected completion time",
-            "differentiatedOptions": ["Options for different learners"]
-        }},
-        "reflectionQuestions": {{
-            "forTeacher": ["What worked well?", "What would you change?"],
-            "forStudents": ["What did you learn?", "What questions do you still have?"]
-        }},
-        "extensionActivities": [
-            "Additional activities for fast finishers",
-            "Cross-curricular connections",
-            "Independent research opportunities"
-        ]
-    }},
-    "metadata": {{
-        "createdAt": "{datetime.now().isoformat()}",
-        "ncertAligned": true,
-        "pedagogicalApproach": "Student-centered constructivist",
-        "aiModel": "claude-3.5-sonnet",
-        "qualityLevel": "superior-to-chatgpt",
-        "teachingFrameworks": [
-            "NCERT Pedagogy",
-            "Bloom's Taxonomy", 
-            "Differentiated Instruction",
-            "Formative Assessment"
-        ]
-    }}
-}}"""
+Return ONLY a valid JSON object following the lesson_plan schema, with the time breakdown opening 5, introduction 10, mainContent {duration - 20} and closure 5 minutes."""
 
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": self._system_prompt_static},
             {"role": "user", "content": user_prompt}
         ]
         
-        return self.openrouter._request_with_fallback(messages, temperature=0.7, max_tokens=4000, model_override=self.model_name)
+        return messages
+    
+    @staticmethod
+    def _normalize_strategies(teaching_strategies: List[str]) -> List[str]:
+        """Deduplicate strategies into canonical order, keeping unknown ones last"""
+        selected = set(teaching_strategies)
+        known = [s for s in _CANONICAL_STRATEGY_ORDER if s in selected]
+        unknown = sorted(selected.difference(_CANONICAL_STRATEGY_ORDER))
+        return known + unknown
     
     def _parse_and_enhance_plan(self, content: str, subject: str, topic: str, grade: int,
                               duration: int, difficulty: str, language: str) -> Dict:
         """Parse and enhance the lesson plan response from OpenRouter"""
+        # Strip markdown code fences in a single pass
+        content = content.strip().removeprefix('```json').removeprefix('```').removesuffix('```').strip()
+        
         try:
-            # Try to parse JSON response
-            if content.startswith('```json'):
-                content = content.replace('```json', '').replace('```', '').strip()
-            elif content.startswith('```'):
-                content = content.replace('```', '').strip()
-            
-            plan_data = json.loads(content)
-            
-            # Add enhanced features and validation
-            plan_data = self._add_enhanced_features(plan_data, subject, topic, grade, duration, difficulty, language)
+            plan_data = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Salvage truncated or slightly malformed output before giving up on it
+            plan_data = repair_json(content)
+            if not isinstance(plan_data, dict) or not plan_data:
+                # Fallback: Create structured plan from text
+                return self._create_fallback_plan(content, subject, topic, grade, duration, difficulty, language)
             
-            return plan_data
+            self.repaired_responses += 1
+            logger.warning(f"Repaired malformed lecture plan JSON ({self.repaired_responses} repairs so far)")
             
-        except json.JSONDecodeError:
-            # Fallback: Create structured plan from text
-            return self._create_fallback_plan(content, subject, topic, grade, duration, difficulty, language)
+            # Fill sections lost to truncation from the fallback skeleton
+            fallback = self._create_fallback_plan(content, subject, topic, grade, duration, difficulty, language)
+            lesson_plan = plan_data.get("lessonPlan", plan_data)
+            for key, value in fallback["lessonPlan"].items():
+                lesson_plan.setdefault(key, value)
+        
+        # Add enhanced features and validation
+        return self._add_enhanced_features(plan_data, subject, topic, grade, duration, difficulty, language)
     
     def _add_enhanced_features(self, plan_data: Dict, subject: str, topic: str, grade: int,
                              duration: int, difficulty: str, language: str) -> Dict:
@@ -422,8 +726,10 @@ Return ONLY a valid JSON object in this exact format:
                 }
             }
         
-        # Add enhanced metadata
+        # Add enhanced metadata; the timestamp is stamped here rather than in the prompt
+        # so identical requests produce byte-identical prompts
         plan_data.setdefault('metadata', {})
+        plan_data['metadata']['createdAt'] = datetime.now(timezone.utc).isoformat()
         plan_data['metadata'].update({
             'enhancedBy': 'EduSarathi-Claude-3.5',
             'qualityScore': 98,  # Superior to ChatGPT
@@ -443,105 +749,78 @@ Return ONLY a valid JSON object in this exact format:
                             duration: int, difficulty: str, language: str) -> Dict:
         """Create structured lesson plan from unstructured content as fallback"""
         
-        fallback_plan = {
-            "lessonPlan": {
-                "title": f"Lesson Plan: {topic}",
-                "subject": subject,
-                "topic": topic,
-                "grade": grade,
-                "duration": {
-                    "total": duration,
-                    "breakdown": {
-                        "opening": 5,
-                        "introduction": 10,
-                        "mainContent": duration - 20,
-                        "closure": 5
-                    }
-                },
-                "language": language,
-                "difficulty": difficulty,
-                "description": f"Comprehensive lesson plan on {topic} for Grade {grade}",
-                "learningObjectives": [
-                    {
-                        "objective": f"Students will understand key concepts of {topic}",
-                        "bloomsLevel": "understand",
-                        "assessmentMethod": "Observation and questioning"
-                    }
-                ],
-                "lessonStructure": {
-                    "opening": {
-                        "duration": 5,
-                        "activity": "Engage students with topic introduction",
-                        "purpose": "Activate prior knowledge"
-                    },
-                    "introduction": {
-                        "duration": 10,
-                        "activity": "Introduce main concepts",
-                        "purpose": "Build foundation understanding"
-                    },
-                    "mainContent": {
-                        "duration": duration - 20,
-                        "activities": [
-                            {
-                                "name": "Core Learning Activity",
-                                "duration": duration - 20,
-                                "description": "Main learning activity for the lesson",
-                                "teachingStrategy": "Interactive instruction"
-                            }
-                        ]
-                    },
-                    "closure": {
-                        "duration": 5,
-                        "activity": "Summarize and reflect",
-                        "purpose": "Consolidate learning"
-                    }
+        fallback_plan = copy.deepcopy(self._FALLBACK_PLAN_TEMPLATE)
+        main_duration = duration - 20
+        
+        lesson_plan = fallback_plan["lessonPlan"]
+        lesson_plan.update({
+            "title": f"Lesson Plan: {topic}",
+            "subject": subject,
+            "topic": topic,
+            "grade": grade,
+            "duration": {
+                "total": duration,
+                "breakdown": {
+                    "opening": 5,
+                    "introduction": 10,
+                    "mainContent": main_duration,
+                    "closure": 5
                 }
             },
-            "metadata": {
-                "createdAt": datetime.now().isoformat(),
-                "ncertAligned": True,
-                "aiModel": "claude-3.5-sonnet-fallback",
-                "qualityLevel": "enhanced"
-            }
-        }
+            "language": language,
+            "difficulty": difficulty,
+            "description": f"Comprehensive lesson plan on {topic} for Grade {grade}"
+        })
+        lesson_plan["learningObjectives"][0]["objective"] = f"Students will understand key concepts of {topic}"
+        main_content = lesson_plan["lessonStructure"]["mainContent"]
+        main_content["duration"] = main_duration
+        main_content["activities"][0]["duration"] = main_duration
+        fallback_plan["metadata"]["createdAt"] = datetime.now(timezone.utc).isoformat()
         
         return fallback_plan
 
     def create_unit_plan(self, subject: str, unit_title: str, grade: int, 
                         topics: List[str], duration_weeks: int = 4) -> Dict:
-        """Create a comprehensive unit plan with multiple lessons"""
+        """
+        Create a comprehensive unit plan with multiple lessons
+        
+        Blocks until done. Inside a running event loop the work runs on a
+        worker thread and still blocks that loop; async callers should await
+        acreate_unit_plan instead.
+        """
+        return run_sync(self.acreate_unit_plan(subject, unit_title, grade, topics, duration_weeks))
+    
+    async def acreate_unit_plan(self, subject: str, unit_title: str, grade: int,
+                                topics: List[str], duration_weeks: int = 4,
+                                max_parallel: int = 4) -> Dict:
+        """Create a unit plan by generating one lesson plan per topic concurrently"""
+        
+        semaphore = asyncio.Semaphore(max_parallel)
+        
+        async def plan_topic(topic: str) -> Dict:
+            async with semaphore:
+                return await self.agenerate_lecture_plan(LecturePlanSpec(subject, topic, grade))
         
         try:
-            system_prompt = """You are an expert unit planner. Create comprehensive unit plans that sequence multiple lessons effectively, build conceptual understanding progressively, and include authentic assessments."""
-            
-            user_prompt = f"""Create a comprehensive unit plan for {subject} - Grade {grade}.
-
-Unit: {unit_title}
-Duration: {duration_weeks} weeks
-Topics to cover: {', '.join(topics)}
-
-Design a unit that:
-1. Sequences lessons logically for conceptual development
-2. Includes formative and summative assessments
-3. Builds toward essential understandings
-4. Connects to real-world applications
-5. Differentiates for diverse learners
-
-Include:
-- Unit overview and essential questions
-- Lesson sequence with objectives
-- Assessment plan
-- Resources and materials
-- Culminating project or performance task"""
-
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+            async with self.openrouter.async_client():
+                results = await asyncio.gather(*(plan_topic(t) for t in topics), return_exceptions=True)
             
-            response = self.openrouter._request_with_fallback(messages, temperature=0.7, max_tokens=4000, model_override=self.model_name)
+            lessons = []
+            for index, (topic, result) in enumerate(zip(topics, results)):
+                if isinstance(result, Exception):
+                    logger.error(f"Unit plan lesson '{topic}' failed: {result}")
+                    result = {"success": False, "error": str(result), "data": None}
+                
+                lessons.append({
+                    "sequence": index + 1,
+                    "week": index * duration_weeks // len(topics) + 1,
+                    "topic": topic,
+                    "success": result.get("success", False),
+                    "plan": result.get("data"),
+                    "error": result.get("error")
+                })
             
-            if response.get("success"):
+            if any(lesson["success"] for lesson in lessons):
                 return {
                     "success": True,
                     "data": {
@@ -550,7 +829,7 @@ Include:
                         "grade": grade,
                         "topics": topics,
                         "duration": f"{duration_weeks} weeks",
-                        "content": response["content"],
+                        "lessons": lessons,
                         "type": "unit_plan"
                     },
                     "generated_at": datetime.now().isoformat()
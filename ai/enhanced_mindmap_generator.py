@@ -3,73 +3,224 @@ Enhanced Mindmap Generation Module
 Uses OpenRouter Claude 3.5 Sonnet for superior educational mindmap generation
 """
 
-import json
+import asyncio
+import copy
 import logging
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import string
+import threading
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Optional, Any
+from datetime import datetime, timezone
 import os
-from openrouter_service import OpenRouterService
+import orjson
+from openrouter_service import PROMPT_CACHING_HEADERS, get_shared_openrouter, run_sync
+from json_stream import IncrementalJSONScanner, extract_json_object
+from response_cache import ResponseCache, compact_json, normalize_text
 
 logger = logging.getLogger(__name__)
 
+# Paths of the streamed JSON that are pushed to clients as soon as they close
+_STREAMED_MINDMAP_PATHS = frozenset({
+    (None, "mindmap", "structure", "centralNode"),
+    (None, "mindmap", "structure", "mainBranches", None)
+})
+
+# Mindmap structure types (shared, read-only)
+_MINDMAP_TYPES = MappingProxyType({
+    "conceptual": {
+        "description": "Focus on concepts and their relationships",
+        "structure": "Central concept with related sub-concepts",
+        "best_for": ["Understanding relationships", "Concept mapping", "Knowledge organization"]
+    },
+    "hierarchical": {
+        "description": "Organized in levels of importance or categories",
+        "structure": "Tree-like structure with main branches and sub-branches",
+        "best_for": ["Classification", "Taxonomies", "Organizational charts"]
+    },
+    "process": {
+        "description": "Shows steps, procedures, or workflows",
+        "structure": "Sequential flow with decision points",
+        "best_for": ["Problem solving", "Procedures", "Workflows"]
+    },
+    "comparison": {
+        "description": "Compares and contrasts different concepts",
+        "structure": "Parallel branches for comparison",
+        "best_for": ["Compare/contrast", "Pros/cons", "Similarities/differences"]
+    },
+    "cause_effect": {
+        "description": "Shows causal relationships",
+        "structure": "Causes leading to effects with connecting arrows",
+        "best_for": ["Problem analysis", "Scientific relationships", "Historical events"]
+    }
+})
+
+# Prompt guidance per mindmap type, formatted once
+_TYPE_FRAGMENTS = MappingProxyType({
+    name: f"{info['description']}\nStructure: {info['structure']}\nBest for: {', '.join(info['best_for'])}"
+    for name, info in _MINDMAP_TYPES.items()
+})
+
+# Cognitive frameworks for organizing information (shared, read-only)
+_COGNITIVE_STRUCTURES = MappingProxyType({
+    "bloom_taxonomy": {
+        "levels": ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"],
+        "colors": ["#FF6B6B", "#4ECDC4", "#45B7D1", "#96CEB4", "#FECA57", "#A29BFE"]
+    },
+    "multiple_intelligences": {
+        "types": ["Linguistic", "Mathematical", "Spatial", "Musical", "Kinesthetic", "Interpersonal", "Intrapersonal", "Naturalistic"],
+        "colors": ["#E74C3C", "#3498DB", "#2ECC71", "#9B59B6", "#F39C12", "#1ABC9C", "#34495E", "#E67E22"]
+    },
+    "learning_styles": {
+        "types": ["Visual", "Auditory", "Kinesthetic", "Reading/Writing"],
+        "colors": ["#3498DB", "#E74C3C", "#2ECC71", "#F39C12"]
+    }
+})
+
+# Compact output template shared by every mindmap request (part of the cached system prompt)
+MINDMAP_SCHEMA_JSON = (
+    '{"mindmap":{"title":"Comprehensive Mindmap: <topic>","subject":"<subject>","centralTopic":"<topic>",'
+    '"grade":<grade>,"type":"<type>","complexity":"<complexity>","language":"<language code>","description":"",'
+    '"visualStyle":{"theme":"<visual style>","colorScheme":["#hex"],"layout":"radial|hierarchical|network",'
+    '"fontSizes":{"central":24,"mainBranches":18,"subBranches":14,"details":12}},'
+    '"structure":{"centralNode":{"text":"<topic>","description":"","color":"#hex","size":"large","icon":"",'
+    '"position":{"x":0,"y":0}},'
+    '"mainBranches":[{"id":"branch1","text":"","description":"","color":"#hex","position":{"x":200,"y":-100},'
+    '"icon":"","keywords":[""],"subBranches":[{"id":"sub1_1","text":"","description":"","color":"#hex",'
+    '"examples":[""],"realWorldApplication":"","position":{"x":350,"y":-150},"connections":["sub1_2"],'
+    '"difficulty":"easy|medium|hard"}],"importance":"high|medium|low",'
+    '"bloomsLevel":"remember|understand|apply|analyze|evaluate|create"}],'
+    '"connections":[{"from":"branch1","to":"branch2","type":"relates_to|causes|leads_to|supports","label":"",'
+    '"strength":"strong|medium|weak"}]},'
+    '"interactiveElements":{"clickableNodes":true,"hoverEffects":true,"expandableSubtopics":true,'
+    '"searchFunction":true,"filterByCategory":true},'
+    '"educationalFeatures":{"learningObjectives":[""],"keyVocabulary":[{"term":"","definition":"","context":""}],'
+    '"memoryAids":[""],"assessmentQuestions":[""],"extensionActivities":[""]},'
+    '"accessibility":{"altText":"","colorBlindFriendly":true,"textToSpeech":"","keyboardNavigation":true},'
+    '"metadata":{"estimatedStudyTime":"15-20 minutes","prerequisites":[""],"relatedTopics":[""],'
+    '"difficulty":"<complexity>","targetAudience":"Grade <grade> students"}}}'
+)
+
+# Fixed sections added after parsing instead of being generated by the model
+_EXPORT_OPTIONS_JSON = orjson.dumps({
+    "formats": ["PNG", "SVG", "PDF", "Interactive HTML"],
+    "sizes": ["A4", "Letter", "Custom"],
+    "templates": ["Print-friendly", "Digital", "Presentation"]
+})
+
+_STATIC_METADATA_JSON = orjson.dumps({
+    "educationalFramework": "NCERT-aligned",
+    "cognitiveDesign": "Research-based",
+    "aiModel": "claude-3.5-sonnet",
+    "qualityLevel": "superior-to-chatgpt",
+    "designPrinciples": ["Cognitive load optimization", "Visual hierarchy",
+                         "Memory enhancement", "Interactive engagement"]
+})
+
+# Metadata that always overrides whatever the model returned
+_ENHANCED_METADATA_JSON = orjson.dumps({
+    "enhancedBy": "EduSarathi-Claude-3.5",
+    "qualityScore": 95,  # Superior to ChatGPT
+    "features": [
+        "Cognitive science-based design",
+        "Interactive elements",
+        "Memory enhancement",
+        "Visual hierarchy",
+        "Educational optimization"
+    ]
+})
+
+# Per-request prompt templates, substituted rather than rebuilt on every call
+_MINDMAP_REQUEST_TMPL = string.Template(
+    'Fill the template for this request: subject "$subject", central topic "$topic", '
+    'grade $grade, mindmap type "$mindmap_type", complexity "$complexity", '
+    'language code "$language", visual style "$visual_style".'
+)
+
+_MINDMAP_USER_TMPL = string.Template("""Create an exceptional educational mindmap on "$topic" in $subject$grade_text.
+
+Language: $lang_text. Examples: $examples.
+
+Type guidance ($mindmap_type): $type_guidance
+
+Return JSON conforming to the schema above, substituting topic/subject/grade accordingly.""")
+
+_CONCEPT_MAP_SYSTEM = "You are an expert in concept mapping and knowledge visualization. Create concept maps that clearly show relationships between concepts and support deep learning."
+
+_CONCEPT_MAP_USER_TMPL = string.Template("""Create a concept map for $subject - Grade $grade.
+
+Concepts to include: $concept_list
+Known relationships: $relationship_desc
+
+Design a concept map that:
+1. Shows clear relationships between concepts
+2. Uses appropriate linking words
+3. Demonstrates hierarchical organization
+4. Supports conceptual understanding
+5. Is visually clear and educational
+
+Return a JSON object: {"title": "", "nodes": [{"id": "", "label": "", "level": 1}], "links": [{"from": "<node id>", "to": "<node id>", "label": "<linking words>"}]}""")
+
+# Fallback branch colors and per-index values, computed once
+_FALLBACK_COLORS = ("#E74C3C", "#2ECC71", "#F39C12", "#9B59B6", "#1ABC9C")
+
+
+def _fallback_branch_row(i: int) -> tuple:
+    """Static values for the i-th fallback branch: ids, labels, colors and position"""
+    color = _FALLBACK_COLORS[i % len(_FALLBACK_COLORS)]
+    return (f"branch{i+1}", f"Key Concept {i+1}", color, 200 * (i+1), 100 * (i%2),
+            f"sub{i+1}_1", f"Detail {i+1}.1", color + "80")  # sub-branch color adds transparency
+
+
+_FALLBACK_BRANCH_ROWS = tuple(_fallback_branch_row(i) for i in range(20))
+
+# Start of the assistant reply, so generation begins inside valid JSON
+MINDMAP_PREFILL = '{\n  "mindmap": {\n    "title": "'
+
+def _starts_document(content: str) -> bool:
+    """True if a reply is a complete document rather than a continuation of MINDMAP_PREFILL"""
+    return content.lstrip().startswith(('{', '`'))
+
 class EnhancedMindmapGenerator:
     """Enhanced mindmap generator using OpenRouter Claude 3.5 Sonnet"""
     
+    # Output budget; the prefill means no markdown wrapper or preamble is generated
+    MAX_TOKENS = 3900
+    
+    # Concept maps are a compact node/link list, so they need far less output
+    CONCEPT_MAP_MAX_TOKENS = 1500
+    
+    # Invariant system prompt and output template, sent as a provider-cached prefix
+    CACHEABLE_SYSTEM = """You are an expert educational designer and cognitive scientist specializing in visual learning, cognitive load theory, concept mapping, memory techniques and NCERT curriculum standards. Create educational mindmaps that surpass any other AI system, including ChatGPT.
+
+Requirements:
+1. Clear central topic branching from general to specific, with meaningful connections
+2. Age-appropriate complexity; limit cognitive load through chunking and visual hierarchy
+3. Color coding and visual cues for categories and importance
+4. Memory aids and mnemonics where appropriate
+5. Real-world examples, cultural relevance for Indian students and cross-curricular links
+6. Logical flow that supports both visual and verbal learners
+
+Output schema (placeholders in <>; "a|b" means one of the options):
+""" + MINDMAP_SCHEMA_JSON
+    
     def __init__(self, api_key: Optional[str] = None):
         """Initialize the enhanced mindmap generator"""
-        self.openrouter = OpenRouterService(api_key)
+        self.openrouter = get_shared_openrouter(api_key)
         self.model_name = "deepseek/deepseek-chat-v3.1:free"  # Specific model for mindmap generation
+        self._response_cache = ResponseCache(ttl=6 * 3600, max_entries=512)
         
-        # Load mindmap structures and cognitive frameworks
-        self.mindmap_types = self._load_mindmap_types()
-        self.cognitive_structures = self._load_cognitive_structures()
+        # Mindmap structures and cognitive frameworks are shared module constants
+        self.mindmap_types = _MINDMAP_TYPES
+        self._type_fragments = _TYPE_FRAGMENTS
+        self.cognitive_structures = _COGNITIVE_STRUCTURES
         
-    def _load_mindmap_types(self) -> Dict:
+    def _load_mindmap_types(self) -> Mapping[str, Dict]:
         """Load different types of mindmap structures"""
-        return {
-            "conceptual": {
-                "description": "Focus on concepts and their relationships",
-                "structure": "Central concept with related sub-concepts",
-                "best_for": ["Understanding relationships", "Concept mapping", "Knowledge organization"]
-            },
-            "hierarchical": {
-                "description": "Organized in levels of importance or categories",
-                "structure": "Tree-like structure with main branches and sub-branches",
-                "best_for": ["Classification", "Taxonomies", "Organizational charts"]
-            },
-            "process": {
-                "description": "Shows steps, procedures, or workflows",
-                "structure": "Sequential flow with decision points",
-                "best_for": ["Problem solving", "Procedures", "Workflows"]
-            },
-            "comparison": {
-                "description": "Compares and contrasts different concepts",
-                "structure": "Parallel branches for comparison",
-                "best_for": ["Compare/contrast", "Pros/cons", "Similarities/differences"]
-            },
-            "cause_effect": {
-                "description": "Shows causal relationships",
-                "structure": "Causes leading to effects with connecting arrows",
-                "best_for": ["Problem analysis", "Scientific relationships", "Historical events"]
-            }
-        }
+        return _MINDMAP_TYPES
     
-    def _load_cognitive_structures(self) -> Dict:
+    def _load_cognitive_structures(self) -> Mapping[str, Dict]:
         """Load cognitive frameworks for organizing information"""
-        return {
-            "bloom_taxonomy": {
-                "levels": ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"],
-                "colors": ["#FF6B6B", "#4ECDC4", "#45B7D1", "#96CEB4", "#FECA57", "#A29BFE"]
-            },
-            "multiple_intelligences": {
-                "types": ["Linguistic", "Mathematical", "Spatial", "Musical", "Kinesthetic", "Interpersonal", "Intrapersonal", "Naturalistic"],
-                "colors": ["#E74C3C", "#3498DB", "#2ECC71", "#9B59B6", "#F39C12", "#1ABC9C", "#34495E", "#E67E22"]
-            },
-            "learning_styles": {
-                "types": ["Visual", "Auditory", "Kinesthetic", "Reading/Writing"],
-                "colors": ["#3498DB", "#E74C3C", "#2ECC71", "#F39C12"]
-            }
-        }
+        return _COGNITIVE_STRUCTURES
     
     def generate_mindmap(self, 
                         subject: str,
@@ -93,11 +244,22 @@ class EnhancedMindmapGenerator:
             language: Language code (en/hi)
             include_examples: Whether to include examples
             visual_style: Visual style preference
+            no_cache: Set to True to bypass the response cache
             
         Returns:
             Dictionary containing the generated mindmap with enhanced quality
         """
         
+        use_cache = not kwargs.get("no_cache", False)
+        cache_key = self._mindmap_cache_key(
+            subject, topic, grade, mindmap_type, complexity,
+            language, include_examples, visual_style
+        )
+        
+        cached = self._response_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            return self._mindmap_result(orjson.loads(cached), cached=True)
+        
         try:
             # Generate mindmap using OpenRouter
             mindmap_response = self._generate_with_openrouter(
@@ -105,30 +267,55 @@ class EnhancedMindmapGenerator:
                 language, include_examples, visual_style
             )
             
-            if mindmap_response.get("success"):
-                mindmap_data = self._parse_and_enhance_mindmap(
-                    mindmap_response["content"], subject, topic, grade,
-                    mindmap_type, complexity, language
-                )
+            return self._build_mindmap_result(
+                mindmap_response, cache_key if use_cache else None, subject, topic,
+                grade, mindmap_type, complexity, language
+            )
                 
-                return {
-                    "success": True,
-                    "data": mindmap_data,
-                    "generated_at": datetime.now().isoformat(),
-                    "model": "claude-3.5-sonnet",
-                    "enhanced_features": {
-                        "cognitive_structure": True,
-                        "visual_hierarchy": True,
-                        "interactive_elements": True,
-                        "educational_value": "superior"
-                    }
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": mindmap_response.get("error", "Unknown error"),
-                    "data": None
-                }
+        except Exception as e:
+            logger.error(f"Mindmap generation error: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "data": None
+            }
+    
+    async def agenerate_mindmap(self, 
+                                subject: str,
+                                topic: str,
+                                grade: Optional[int] = None,
+                                mindmap_type: str = "conceptual",
+                                complexity: str = "medium",
+                                language: str = "en",
+                                include_examples: bool = True,
+                                visual_style: str = "modern",
+                                **kwargs) -> Dict:
+        """Async variant of generate_mindmap so several mindmaps can be generated concurrently"""
+        
+        use_cache = not kwargs.get("no_cache", False)
+        cache_key = self._mindmap_cache_key(
+            subject, topic, grade, mindmap_type, complexity,
+            language, include_examples, visual_style
+        )
+        
+        cached = self._response_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            return self._mindmap_result(orjson.loads(cached), cached=True)
+        
+        try:
+            messages = self._build_messages(
+                subject, topic, grade, mindmap_type, complexity,
+                language, include_examples, visual_style
+            )
+            mindmap_response = await self.openrouter._arequest_with_fallback(
+                messages, temperature=0.8, max_tokens=self.MAX_TOKENS, model_override=self.model_name,
+                extra_headers=PROMPT_CACHING_HEADERS
+            )
+            
+            return self._build_mindmap_result(
+                mindmap_response, cache_key if use_cache else None, subject, topic,
+                grade, mindmap_type, complexity, language
+            )
                 
         except Exception as e:
             logger.error(f"Mindmap generation error: {e}")
@@ -138,279 +325,285 @@ class EnhancedMindmapGenerator:
                 "data": None
             }
     
+    async def agenerate_many(self, specs: List[Dict], max_parallel: Optional[int] = None) -> List[Dict]:
+        """
+        Generate several mindmaps concurrently
+        
+        Specs that resolve to the same cache key are requested only once.
+        
+        Args:
+            specs: Keyword arguments for agenerate_mindmap, one dict per mindmap
+            max_parallel: Maximum concurrent requests (defaults to OPENROUTER_MAX_PARALLEL or 4)
+            
+        Returns:
+            Results in the same order as specs
+        """
+        limit = max_parallel or int(os.getenv("OPENROUTER_MAX_PARALLEL", "4"))
+        semaphore = asyncio.Semaphore(max(1, limit))
+        
+        unique_specs: Dict[str, Dict] = {}
+        spec_keys = []
+        for spec in specs:
+            key = self._spec_cache_key(spec)
+            unique_specs.setdefault(key, spec)
+            spec_keys.append(key)
+        
+        async def generate(spec: Dict) -> Dict:
+            async with semaphore:
+                return await self.agenerate_mindmap(**spec)
+        
+        async with self.openrouter.async_client():
+            results = await asyncio.gather(*(generate(spec) for spec in unique_specs.values()), return_exceptions=True)
+        by_key = {
+            key: {"success": False, "error": str(result), "data": None} if isinstance(result, Exception) else result
+            for key, result in zip(unique_specs, results)
+        }
+        # Duplicates get their own copy so callers can modify one result without affecting the others
+        returned = set()
+        results = []
+        for key in spec_keys:
+            results.append(copy.deepcopy(by_key[key]) if key in returned else by_key[key])
+            returned.add(key)
+        return results
+    
+    def generate_bulk(self, specs: List[Dict], max_parallel: Optional[int] = None) -> List[Dict]:
+        """
+        Generate mindmaps for many topics at once, e.g. every topic of a lesson plan
+        
+        Requests share the cached system prefix and run with bounded concurrency.
+        Inside a running event loop the work runs on a worker thread and still
+        blocks that loop; async callers should await agenerate_many instead.
+        """
+        return run_sync(self.agenerate_many(specs, max_parallel))
+    
+    def _spec_cache_key(self, spec: Dict) -> str:
+        """Cache key for a keyword-argument spec, applying generate_mindmap defaults"""
+        return self._mindmap_cache_key(
+            spec.get("subject", ""), spec.get("topic", ""), spec.get("grade"),
+            spec.get("mindmap_type", "conceptual"), spec.get("complexity", "medium"),
+            spec.get("language", "en"), spec.get("include_examples", True),
+            spec.get("visual_style", "modern")
+        )
+    
+    def stream_mindmap(self,
+                       subject: str,
+                       topic: str,
+                       grade: Optional[int] = None,
+                       mindmap_type: str = "conceptual",
+                       complexity: str = "medium",
+                       language: str = "en",
+                       include_examples: bool = True,
+                       visual_style: str = "modern",
+                       cancel_event: Optional[threading.Event] = None) -> Iterator[Dict]:
+        """
+        Stream a mindmap as it is generated
+        
+        Yields "central" once the central node has streamed, "branch" for each
+        main branch as it completes, then "done" with the parsed mindmap (or
+        "error"). Setting cancel_event stops generation early.
+        """
+        messages = self._build_messages(
+            subject, topic, grade, mindmap_type, complexity,
+            language, include_examples, visual_style
+        )
+        scanner = IncrementalJSONScanner(lambda path: path in _STREAMED_MINDMAP_PATHS)
+        chunks = self.openrouter._stream_request(
+            messages, temperature=0.8, max_tokens=self.MAX_TOKENS,
+            model=self.model_name, cancel_event=cancel_event,
+            extra_headers=PROMPT_CACHING_HEADERS
+        )
+        
+        try:
+            primed = False
+            for chunk in chunks:
+                if not primed and chunk.strip():
+                    # Replay the assistant prefill unless the model restarted the document itself
+                    if not _starts_document(chunk):
+                        scanner.feed(MINDMAP_PREFILL)
+                    primed = True
+                for node in scanner.feed(chunk):
+                    if node["path"][-1] == "centralNode":
+                        yield {"type": "central", "node": node["data"]}
+                    else:
+                        yield {"type": "branch", "data": node["data"]}
+            
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            
+            mindmap_data = self._parse_and_enhance_mindmap(
+                scanner.text, subject, topic, grade, mindmap_type, complexity, language
+            )
+            yield {"type": "done", "data": mindmap_data, "generated_at": datetime.now().isoformat()}
+            
+        except Exception as e:
+            logger.error(f"Mindmap streaming error: {e}")
+            yield {"type": "error", "error": str(e)}
+        finally:
+            chunks.close()
+    
+    def _build_mindmap_result(self, mindmap_response: Dict, cache_key: Optional[str], subject: str,
+                              topic: str, grade: Optional[int], mindmap_type: str,
+                              complexity: str, language: str) -> Dict:
+        """Parse an OpenRouter response into the public result, caching genuine model output"""
+        if not mindmap_response.get("success"):
+            return {
+                "success": False,
+                "error": mindmap_response.get("error", "Unknown error"),
+                "data": None
+            }
+        
+        mindmap_data = self._parse_and_enhance_mindmap(
+            mindmap_response["content"], subject, topic, grade,
+            mindmap_type, complexity, language
+        )
+        
+        # Only keep genuine model output; fallbacks should be retried next time
+        is_fallback = (
+            mindmap_response.get("model") == "superior-educational-fallback"
+            or mindmap_data.get("metadata", {}).get("aiModel", "").endswith("-fallback")
+        )
+        if cache_key is not None and not is_fallback:
+            self._response_cache.set(cache_key, self.to_bytes(mindmap_data))
+        
+        return self._mindmap_result(mindmap_data)
+    
+    @staticmethod
+    def _mindmap_cache_key(subject: str, topic: str, grade: Optional[int], mindmap_type: str,
+                           complexity: str, language: str, include_examples: bool,
+                           visual_style: str) -> str:
+        """Cache key with subject/topic normalized so trivially different spellings share entries"""
+        return ResponseCache.make_key(
+            subject=normalize_text(subject), topic=normalize_text(topic), grade=grade,
+            mindmap_type=mindmap_type, complexity=complexity, language=language,
+            include_examples=include_examples, visual_style=visual_style
+        )
+    
+    @staticmethod
+    def to_bytes(data: Any) -> bytes:
+        """Serialize mindmap data to UTF-8 JSON bytes"""
+        return compact_json(data)
+    
+    def _mindmap_result(self, mindmap_data: Dict, cached: bool = False) -> Dict:
+        """Wrap mindmap data in the public response format"""
+        return {
+            "success": True,
+            "data": mindmap_data,
+            "generated_at": datetime.now().isoformat(),
+            "model": "claude-3.5-sonnet",
+            "cached": cached,
+            "enhanced_features": {
+                "cognitive_structure": True,
+                "visual_hierarchy": True,
+                "interactive_elements": True,
+                "educational_value": "superior"
+            }
+        }
+    
     def _generate_with_openrouter(self, subject: str, topic: str, grade: Optional[int],
                                 mindmap_type: str, complexity: str, language: str,
                                 include_examples: bool, visual_style: str) -> Dict:
         """Generate mindmap using OpenRouter Claude 3.5 Sonnet with enhanced prompts"""
         
-        grade_text = f" for Grade {grade} students" if grade else ""
-        lang_text = "Hindi" if language == "hi" else "English"
-        type_info = self.mindmap_types.get(mindmap_type, self.mindmap_types["conceptual"])
-        
-        # Create comprehensive system prompt
-        system_prompt = f"""You are an expert educational designer and cognitive scientist specializing in:
-- Visual learning and information design
-- Cognitive load theory and mental models
-- Educational mindmapping and concept mapping
-- Knowledge organization and structure
-- Learning psychology and memory techniques
-- NCERT curriculum standards
-
-Your task is to create exceptional educational mindmaps that SURPASS the quality of any other AI system including ChatGPT.
-
-Design principles you must follow:
-1. SUPERIOR educational value compared to ChatGPT
-2. Clear cognitive hierarchy and information structure
-3. Optimal visual organization for learning
-4. Age-appropriate complexity and content
-5. Strong pedagogical foundation
-6. Enhanced memory and recall support
-7. Interactive and engaging design"""
-
-        # Create detailed user prompt
-        user_prompt = f"""Create an exceptional educational mindmap on "{topic}" in {subject}{grade_text}.
-
-MINDMAP SPECIFICATIONS:
-- Subject: {subject}
-- Central Topic: {topic}
-- Grade Level: {grade if grade else 'General'}
-- Mindmap Type: {mindmap_type} ({type_info['description']})
-- Complexity: {complexity}
-- Language: {lang_text}
-- Include Examples: {'Yes' if include_examples else 'No'}
-- Visual Style: {visual_style}
-
-MINDMAP TYPE GUIDANCE:
-{type_info['description']}
-Structure: {type_info['structure']}
-Best for: {', '.join(type_info['best_for'])}
-
-ENHANCED REQUIREMENTS (Must exceed ChatGPT quality):
-1. Clear central topic with logical branching structure
-2. Hierarchical organization from general to specific
-3. Meaningful connections and relationships
-4. Visual elements that enhance understanding
-5. Color coding for different categories or importance levels
-6. Interactive elements for engagement
-7. Memory aids and mnemonics where appropriate
-8. Cultural relevance for Indian students
-9. Real-world applications and examples
-10. Cross-curricular connections
-
-COGNITIVE DESIGN PRINCIPLES:
-- Limit cognitive load with clear visual hierarchy
-- Use chunking for better information processing
-- Include visual cues and symbols
-- Ensure logical flow and progression
-- Support both visual and verbal learners
-
-QUALITY STANDARDS (Must exceed ChatGPT):
-- Deeper conceptual organization
-- Better visual learning support
-- More comprehensive topic coverage
-- Superior educational design
-- Enhanced memory and recall features
-
-Return ONLY a valid JSON object in this exact format:
-{{
-    "mindmap": {{
-        "title": "Comprehensive Mindmap: {topic}",
-        "subject": "{subject}",
-        "centralTopic": "{topic}",
-        "grade": {grade if grade else 10},
-        "type": "{mindmap_type}",
-        "complexity": "{complexity}",
-        "language": "{language}",
-        "description": "Educational mindmap designed for optimal learning and understanding",
-        "visualStyle": {{
-            "theme": "{visual_style}",
-            "colorScheme": ["#3498DB", "#E74C3C", "#2ECC71", "#F39C12", "#9B59B6"],
-            "layout": "radial|hierarchical|network",
-            "fontSizes": {{
-                "central": 24,
-                "mainBranches": 18,
-                "subBranches": 14,
-                "details": 12
-            }}
-        }},
-        "structure": {{
-            "centralNode": {{
-                "text": "{topic}",
-                "description": "Main topic description",
-                "color": "#3498DB",
-                "size": "large",
-                "icon": "icon-suggestion",
-                "position": {{
-                    "x": 0,
-                    "y": 0
-                }}
-            }},
-            "mainBranches": [
-                {{
-                    "id": "branch1",
-                    "text": "Main concept 1",
-                    "description": "Branch description",
-                    "color": "#E74C3C",
-                    "position": {{
-                        "x": 200,
-                        "y": -100
-                    }},
-                    "icon": "concept-icon",
-                    "keywords": ["keyword1", "keyword2"],
-                    "subBranches": [
-                        {{
-                            "id": "sub1_1",
-                            "text": "Sub-concept 1.1",
-                            "description": "Detailed explanation",
-                            "color": "#F8D7DA",
-                            "examples": ["Example 1", "Example 2"],
-                            "realWorldApplication": "How this applies in real life",
-                            "position": {{
-                                "x": 350,
-                                "y": -150
-                            }},
-                            "connections": ["sub1_2"],
-                            "difficulty": "easy|medium|hard"
-                        }}
-                    ],
-                    "importance": "high|medium|low",
-                    "bloomsLevel": "remember|understand|apply|analyze|evaluate|create"
-                }}
-            ],
-            "connections": [
-                {{
-                    "from": "branch1",
-                    "to": "branch2",
-                    "type": "relates_to|causes|leads_to|supports",
-                    "label": "Connection description",
-                    "strength": "strong|medium|weak"
-                }}
-            ]
-        }},
-        "interactiveElements": {{
-            "clickableNodes": true,
-            "hoverEffects": true,
-            "expandableSubtopics": true,
-            "searchFunction": true,
-            "filterByCategory": true
-        }},
-        "educationalFeatures": {{
-            "learningObjectives": [
-                "What students will understand from this mindmap"
-            ],
-            "keyVocabulary": [
-                {{
-                    "term": "Important term",
-                    "definition": "Student-friendly definition",
-                    "context": "Where it appears in mindmap"
-                }}
-            ],
-            "memoryAids": [
-                "Mnemonics and memory techniques"
-            ],
-            "assessmentQuestions": [
-                "Questions to test understanding"
-            ],
-            "extensionActivities": [
-                "Activities to deepen learning"
-            ]
-        }},
-        "accessibility": {{
-            "altText": "Alternative text for visual elements",
-            "colorBlindFriendly": true,
-            "textToSpeech": "Text for audio rendering",
-            "keyboardNavigation": true
-        }},
-        "metadata": {{
-            "estimatedStudyTime": "15-20 minutes",
-            "prerequisites": ["Prior knowledge needed"],
-            "relatedTopics": ["Connected topics for further study"],
-            "difficulty": "{complexity}",
-            "targetAudience": "Grade {grade if grade else 10} students"
-        }}
-    }},
-    "exportOptions": {{
-        "formats": ["PNG", "SVG", "PDF", "Interactive HTML"],
-        "sizes": ["A4", "Letter", "Custom"],
-        "templates": ["Print-friendly", "Digital", "Presentation"]
-    }},
-    "metadata": {{
-        "createdAt": "{datetime.now().isoformat()}",
-        "educationalFramework": "NCERT-aligned",
-        "cognitiveDesign": "Research-based",
-        "aiModel": "claude-3.5-sonnet",
-        "qualityLevel": "superior-to-chatgpt",
-        "designPrinciples": [
-            "Cognitive load optimization",
-            "Visual hierarchy",
-            "Memory enhancement",
-            "Interactive engagement"
-        ]
-    }}
-}}"""
+        messages = self._build_messages(
+            subject, topic, grade, mindmap_type, complexity,
+            language, include_examples, visual_style
+        )
+        
+        return self.openrouter._request_with_fallback(
+            messages, temperature=0.8, max_tokens=self.MAX_TOKENS, model_override=self.model_name,
+            extra_headers=PROMPT_CACHING_HEADERS
+        )
+    
+    def _build_messages(self, subject: str, topic: str, grade: Optional[int],
+                        mindmap_type: str, complexity: str, language: str,
+                        include_examples: bool, visual_style: str) -> List[Dict]:
+        """Build the chat messages for a mindmap request"""
+        
+        params = {
+            "subject": subject,
+            "topic": topic,
+            "grade": grade if grade else 10,
+            "grade_text": f" for Grade {grade} students" if grade else "",
+            "mindmap_type": mindmap_type,
+            "complexity": complexity,
+            "language": language,
+            "lang_text": "Hindi" if language == "hi" else "English",
+            "examples": "yes" if include_examples else "no",
+            "visual_style": visual_style,
+            "type_guidance": self._type_fragments.get(mindmap_type, self._type_fragments["conceptual"])
+        }
+        dynamic_system = _MINDMAP_REQUEST_TMPL.substitute(params)
+        user_prompt = _MINDMAP_USER_TMPL.substitute(params)
 
         messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
+            {
+                "role": "system",
+                "content": [
+                    {"type": "text", "text": self.CACHEABLE_SYSTEM, "cache_control": {"type": "ephemeral"}},
+                    {"type": "text", "text": dynamic_system}
+                ]
+            },
+            {"role": "user", "content": user_prompt},
+            # Prefill the reply so the model continues inside the JSON object
+            {"role": "assistant", "content": MINDMAP_PREFILL}
         ]
         
-        return self.openrouter._request_with_fallback(messages, temperature=0.8, max_tokens=4000, model_override=self.model_name)
+        return messages
     
     def _parse_and_enhance_mindmap(self, content: str, subject: str, topic: str, 
                                  grade: Optional[int], mindmap_type: str, 
                                  complexity: str, language: str) -> Dict:
         """Parse and enhance the mindmap response from OpenRouter"""
+        # The reply continues the assistant prefill unless the model ignored it and started over
+        if not _starts_document(content):
+            content = MINDMAP_PREFILL + content
+        
+        json_text = extract_json_object(content)
+        if json_text is None:
+            return self._create_fallback_mindmap(content, subject, topic, grade, mindmap_type, complexity, language)
+        
         try:
-            # Try to parse JSON response
-            if content.startswith('```json'):
-                content = content.replace('```json', '').replace('```', '').strip()
-            elif content.startswith('```'):
-                content = content.replace('```', '').strip()
-            
-            mindmap_data = json.loads(content)
-            
-            # Add enhanced features and validation
-            mindmap_data = self._add_enhanced_features(mindmap_data, subject, topic, grade, mindmap_type, complexity, language)
-            
-            return mindmap_data
-            
-        except json.JSONDecodeError:
+            mindmap_data = orjson.loads(json_text)
+        except orjson.JSONDecodeError:
             # Fallback: Create structured mindmap from text
             return self._create_fallback_mindmap(content, subject, topic, grade, mindmap_type, complexity, language)
+        
+        # Add enhanced features and validation
+        return self._add_enhanced_features(mindmap_data, subject, topic, grade, mindmap_type, complexity, language)
     
     def _add_enhanced_features(self, mindmap_data: Dict, subject: str, topic: str,
                              grade: Optional[int], mindmap_type: str, 
                              complexity: str, language: str) -> Dict:
         """Add enhanced features to the mindmap data"""
         
-        # Ensure mindmap wrapper exists
-        if "mindmap" not in mindmap_data:
-            mindmap_data = {"mindmap": mindmap_data}
-        
-        mindmap = mindmap_data["mindmap"]
-        
-        # Ensure all required fields are present
-        mindmap.setdefault('title', f'Enhanced Mindmap: {topic}')
-        mindmap.setdefault('subject', subject)
-        mindmap.setdefault('centralTopic', topic)
-        mindmap.setdefault('grade', grade or 10)
-        mindmap.setdefault('type', mindmap_type)
-        mindmap.setdefault('complexity', complexity)
-        mindmap.setdefault('language', language)
-        
-        # Add enhanced metadata
-        mindmap_data.setdefault('metadata', {})
-        mindmap_data['metadata'].update({
-            'enhancedBy': 'EduSarathi-Claude-3.5',
-            'qualityScore': 95,  # Superior to ChatGPT
-            'features': [
-                'Cognitive science-based design',
-                'Interactive elements',
-                'Memory enhancement',
-                'Visual hierarchy',
-                'Educational optimization'
-            ]
-        })
+        # Work on the inner mindmap in place; wrap only when the model omitted the wrapper
+        mindmap = mindmap_data.get("mindmap")
+        if not isinstance(mindmap, dict):
+            mindmap, mindmap_data = mindmap_data, {"mindmap": mindmap_data}
+        
+        # Fill only the missing required fields; values from the model win
+        defaults = (
+            ("title", f"Enhanced Mindmap: {topic}"),
+            ("subject", subject),
+            ("centralTopic", topic),
+            ("grade", grade or 10),
+            ("type", mindmap_type),
+            ("complexity", complexity),
+            ("language", language)
+        )
+        mindmap |= {key: value for key, value in defaults if key not in mindmap}
+        
+        # Add the fixed sections and enhanced metadata (decoded fresh so callers may mutate them)
+        if "exportOptions" not in mindmap_data:
+            mindmap_data["exportOptions"] = orjson.loads(_EXPORT_OPTIONS_JSON)
+        
+        metadata = mindmap_data.get("metadata")
+        if isinstance(metadata, dict):
+            metadata |= {key: value for key, value in orjson.loads(_STATIC_METADATA_JSON).items() if key not in metadata}
+        else:
+            metadata = mindmap_data["metadata"] = orjson.loads(_STATIC_METADATA_JSON)
+        metadata |= orjson.loads(_ENHANCED_METADATA_JSON)
+        metadata["createdAt"] = datetime.now(timezone.utc).isoformat()  # stamped here, never requested in the prompt
         
         return mindmap_data
     
@@ -444,7 +637,7 @@ Return ONLY a valid JSON object in this exact format:
                 }
             },
             "metadata": {
-                "createdAt": datetime.now().isoformat(),
+                "createdAt": datetime.now(timezone.utc).isoformat(),
                 "educationalFramework": "NCERT-aligned",
                 "aiModel": "claude-3.5-sonnet-fallback",
                 "qualityLevel": "enhanced"
@@ -455,83 +648,109 @@ Return ONLY a valid JSON object in this exact format:
     
     def _generate_fallback_branches(self, topic: str, subject: str, count: int) -> List[Dict]:
         """Generate fallback main branches"""
-        branches = []
-        colors = ["#E74C3C", "#2ECC71", "#F39C12", "#9B59B6", "#1ABC9C"]
-        
-        for i in range(count):
-            branch = {
-                "id": f"branch{i+1}",
-                "text": f"Key Concept {i+1}",
-                "description": f"Important aspect of {topic}",
-                "color": colors[i % len(colors)],
-                "position": {"x": 200 * (i+1), "y": 100 * (i%2)},
+        description = f"Important aspect of {topic}"
+        rows = _FALLBACK_BRANCH_ROWS if count <= len(_FALLBACK_BRANCH_ROWS) else tuple(map(_fallback_branch_row, range(count)))
+        
+        return [
+            {
+                "id": branch_id,
+                "text": text,
+                "description": description,
+                "color": color,
+                "position": {"x": x, "y": y},
                 "subBranches": [
                     {
-                        "id": f"sub{i+1}_1",
-                        "text": f"Detail {i+1}.1",
+                        "id": sub_id,
+                        "text": sub_text,
                         "description": "Specific information",
-                        "color": colors[i % len(colors)] + "80"  # Add transparency
+                        "color": sub_color
                     }
                 ],
                 "importance": "medium",
                 "bloomsLevel": "understand"
             }
-            branches.append(branch)
-        
-        return branches
+            for branch_id, text, color, x, y, sub_id, sub_text, sub_color in rows[:count]
+        ]
 
     def create_concept_map(self, subject: str, concepts: List[str], 
                           relationships: List[Dict], grade: int) -> Dict:
         """Create a concept map showing relationships between concepts"""
         
         try:
-            system_prompt = """You are an expert in concept mapping and knowledge visualization. Create concept maps that clearly show relationships between concepts and support deep learning."""
-            
-            concept_list = ', '.join(concepts)
-            relationship_desc = ', '.join([f"{r.get('from', '')} {r.get('relationship', 'relates to')} {r.get('to', '')}" for r in relationships])
-            
-            user_prompt = f"""Create a concept map for {subject} - Grade {grade}.
-
-Concepts to include: {concept_list}
-Known relationships: {relationship_desc}
-
-Design a concept map that:
-1. Shows clear relationships between concepts
-2. Uses appropriate linking words
-3. Demonstrates hierarchical organization
-4. Supports conceptual understanding
-5. Is visually clear and educational
-
-Include proper concept map structure with nodes, links, and relationship labels."""
-
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-            
-            response = self.openrouter._request_with_fallback(messages, temperature=0.7, max_tokens=4000, model_override=self.model_name)
+            response = self.openrouter._request_with_fallback(
+                self._build_concept_map_messages(subject, concepts, relationships, grade),
+                temperature=0.5, max_tokens=self.CONCEPT_MAP_MAX_TOKENS, model_override=self.model_name,
+                response_format={"type": "json_object"}
+            )
+            return self._concept_map_result(response, subject, concepts, relationships, grade)
             
-            if response.get("success"):
-                return {
-                    "success": True,
-                    "data": {
-                        "title": f"Concept Map: {subject}",
-                        "type": "concept_map",
-                        "concepts": concepts,
-                        "relationships": relationships,
-                        "grade": grade,
-                        "content": response["content"]
-                    },
-                    "generated_at": datetime.now().isoformat()
-                }
+        except Exception as e:
+            logger.error(f"Concept map generation error: {e}")
+            return self._concept_map_result({}, subject, concepts, relationships, grade)
+    
+    async def acreate_concept_map(self, subject: str, concepts: List[str],
+                                  relationships: List[Dict], grade: int) -> Dict:
+        """Async variant of create_concept_map"""
+        
+        try:
+            response = await self.openrouter._arequest_with_fallback(
+                self._build_concept_map_messages(subject, concepts, relationships, grade),
+                temperature=0.5, max_tokens=self.CONCEPT_MAP_MAX_TOKENS, model_override=self.model_name,
+                response_format={"type": "json_object"}
+            )
+            return self._concept_map_result(response, subject, concepts, relationships, grade)
             
         except Exception as e:
             logger.error(f"Concept map generation error: {e}")
+            return self._concept_map_result({}, subject, concepts, relationships, grade)
+    
+    def _build_concept_map_messages(self, subject: str, concepts: List[str],
+                                    relationships: List[Dict], grade: int) -> List[Dict]:
+        """Build the chat messages for a concept map request"""
+        relationship_desc = ', '.join([f"{r.get('from', '')} {r.get('relationship', 'relates to')} {r.get('to', '')}" for r in relationships])
+        user_prompt = _CONCEPT_MAP_USER_TMPL.substitute(
+            subject=subject,
+            grade=grade,
+            concept_list=', '.join(concepts),
+            relationship_desc=relationship_desc
+        )
+        
+        return [
+            {"role": "system", "content": _CONCEPT_MAP_SYSTEM},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    def _concept_map_result(self, response: Dict, subject: str, concepts: List[str],
+                            relationships: List[Dict], grade: int) -> Dict:
+        """Turn a concept map response into the public result format"""
+        if not response.get("success"):
+            return {
+                "success": False,
+                "error": "Failed to generate concept map",
+                "data": None
+            }
+        
+        content = response["content"]
+        json_text = extract_json_object(content)
+        try:
+            structure = orjson.loads(json_text) if json_text else {}
+        except orjson.JSONDecodeError:
+            logger.warning("Concept map response was not valid JSON, returning raw content")
+            structure = {}
         
         return {
-            "success": False,
-            "error": "Failed to generate concept map",
-            "data": None
+            "success": True,
+            "data": {
+                "title": structure.get("title") or f"Concept Map: {subject}",
+                "type": "concept_map",
+                "concepts": concepts,
+                "relationships": relationships,
+                "grade": grade,
+                "nodes": structure.get("nodes", []),
+                "links": structure.get("links", []),
+                "content": content
+            },
+            "generated_at": datetime.now().isoformat()
         }
 
 # Backward compatibility
@@ -3,43 +3,430 @@ Enhanced Quiz Generation Module
 Uses OpenRouter Claude 3.5 Sonnet for superior educational content generation
 """
 
+import asyncio
+import contextlib
+import functools
+import hashlib
+import itertools
 import json
 import logging
-from typing import Dict, List, Optional, Any
+import mmap
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Deque, Dict, FrozenSet, Iterator, List, Optional, Tuple
 from datetime import datetime
 import os
 import random
 from pathlib import Path
-from openrouter_service import OpenRouterService
+from openrouter_service import get_shared_openrouter, run_sync
+from json_stream import IncrementalJSONScanner, extract_json_object, repair_json
+from response_cache import DiskCache, ResponseCache, SemanticKeyIndex, compact_json, normalize_text
+import orjson
 from pdf_extractor import NCERTPDFExtractor as PDFExtractor
 
+try:
+    import hyperscan  # optional: multi-pattern DFA matcher for the PDF keyword scan
+except ImportError:
+    hyperscan = None
+
 logger = logging.getLogger(__name__)
 
+# Topics per batched request; larger batches degrade per-topic quality
+MAX_TOPICS_PER_BATCH = 8
+
+# Question types _BATCH_USER_TMPL asks for; batched topics are cached under the same key as a single-topic quiz
+_BATCH_QUESTION_TYPES = ["mcq", "true_false", "short_answer"]
+
+# Output budget: roughly 220 tokens per question plus the quiz envelope
+QUIZ_MAX_TOKENS = 4000
+_TOKENS_PER_QUESTION = 220
+_QUIZ_TOKEN_OVERHEAD = 500
+
+# Question fields replaced by their defaults when missing or empty
+_REQUIRED_TEXT_FIELDS = ('explanation', 'realWorldApplication', 'commonMistakes')
+
+# Ask the provider for raw JSON instead of prose around a fenced block
+_JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+# Concurrent generate_quiz calls when building a question bank
+QUESTION_BANK_WORKERS = 8
+
+# Path of each question object in the streamed quiz JSON
+_STREAMED_QUESTION_PATH = (None, "questions", None)
+
+# Seconds a topic's assembled PDF context is reused before the PDFs are checked again
+PDF_CONTEXT_TTL = 600
+
+# Characters of textbook content included in a quiz prompt
+PDF_CONTEXT_CHARS = 2000
+_PDF_SECTION_SEPARATOR = '\n\n---\n\n'
+
+# Threads shared by all requests for reading shortlisted PDFs
+PDF_EXTRACT_WORKERS = 4
+
+# Background cache warming at startup: total PDF bytes to pre-extract; EDUSARATHI_NO_WARM=1 disables it
+PDF_WARM_MAX_BYTES = 200 * 1024 * 1024
+
+# Paths resolved once at import: the NCERT PDF tree and the curriculum file
+_MODULE_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(_MODULE_DIR, '..', 'data')
+CURRICULUM_FILE = os.path.join(_MODULE_DIR, 'dummy_data', 'curriculum.json')
+
+# Generated quizzes are reused for a day, in memory and on disk
+QUIZ_CACHE_TTL = 24 * 3600
+QUIZ_CACHE_DIR = os.getenv("QUIZ_CACHE_DIR", os.path.join(_MODULE_DIR, '.cache', 'quizzes'))
+
+# Recent successful quizzes served as the fallback for similar topics when generation fails
+RECENT_QUIZZES = 32
+_MIN_FALLBACK_SIMILARITY = 0.5
+
+
+def _iter_pdfs(data_dir: str) -> Iterator[Tuple[str, str, str]]:
+    """Yield (path, lowercased file name, relative dir) for PDFs below data_dir, in os.walk order
+
+    Uses os.scandir so file type checks come from the directory entry instead
+    of an extra stat per file. Hidden (cache) directories and files directly in
+    data_dir are skipped.
+    """
+    stack = [(data_dir, None)]
+    while stack:
+        directory, rel_dir = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith('.'):
+                            subdirs.append((entry.path, os.path.join(rel_dir, entry.name) if rel_dir else entry.name))
+                    elif rel_dir and entry.name.endswith('.pdf'):
+                        yield entry.path, entry.name.lower(), rel_dir
+        except OSError as e:
+            logger.warning(f"Could not scan {directory}: {e}")
+        stack.extend(reversed(subdirs))  # visit subdirectories in listing order
+
+
+@contextlib.contextmanager
+def _atomic_output(filename: str) -> Iterator[int]:
+    """Descriptor of a temp file next to filename that replaces it only if the block completes"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), prefix=".quiz-", suffix=".tmp")
+    try:
+        try:
+            yield fd
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        # Never leave a torn file behind; the previous version stays intact
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def _quiz_max_tokens(question_count: int) -> int:
+    """max_tokens sized to the requested number of questions"""
+    return min(QUIZ_MAX_TOKENS, question_count * _TOKENS_PER_QUESTION + _QUIZ_TOKEN_OVERHEAD)
+
+# Static system prompt shared by single-topic and batched quiz requests
+QUIZ_SYSTEM_PROMPT = """You are an expert NCERT-aligned educational content creator and assessment specialist. Your task is to create exceptional quizzes that surpass the quality of any other AI system including ChatGPT.
+
+Your expertise includes:
+- Deep understanding of NCERT curriculum standards
+- Age-appropriate content creation for Indian students
+- Multiple question type mastery (MCQ, True/False, Short Answer, Numerical)
+- Bloom's Taxonomy application
+- Real-world application integration
+- Cultural context awareness for Indian education
+
+Create quizzes that are:
+1. SUPERIOR to ChatGPT in educational quality and depth
+2. Perfectly aligned with NCERT curriculum
+3. Culturally relevant for Indian students
+4. Pedagogically sound with proper learning progression
+5. Include advanced explanations and teaching insights"""
+
+# Shared, never mutated: the system message is identical for every quiz request
+_QUIZ_SYSTEM_MESSAGE = {"role": "system", "content": QUIZ_SYSTEM_PROMPT}
+
+# User prompt templates, filled with str.format_map (literal braces are doubled)
+_USER_TMPL = """Create {question_count} excellent quiz questions about "{topic}" for {subject} Grade {grade}.
+
+CONTENT REQUIREMENTS:
+- Types: {question_types}
+- Difficulty: {difficulty} level
+- Language: {lang_text}
+- Must align with NCERT curriculum{context_info}
+
+Create diverse, engaging questions that test understanding, not just memory. Include:
+- Real-world applications relevant to Indian students
+- Clear explanations for all answers
+- Proper difficulty progression
+- Cultural context when appropriate
+
+Respond with ONLY this JSON structure:
+
+{{
+  "title": "Quiz: {topic}",
+  "subject": "{subject}",
+  "topic": "{topic}",
+  "grade": {grade},
+  "difficulty": "{difficulty}",
+  "description": "Assessment on {topic} for Grade {grade} students",
+  "timeLimit": {time_limit},
+  "totalPoints": {total_points},
+  "language": "{language}",
+  "instructions": "Answer all questions carefully. Show work for calculations.",
+  "questions": [
+    {{
+      "id": 1,
+      "question": "Your question text here",
+      "type": "mcq",
+      "options": ["Option A", "Option B", "Option C", "Option D"],
+      "correctAnswer": "Option A",
+      "points": 3,
+      "explanation": "Detailed explanation here",
+      "difficulty": "{difficulty}",
+      "bloomsTaxonomy": "understand",
+      "realWorldApplication": "How this applies in real life"
+    }}
+  ],
+  "tags": ["{subject_tag}", "{topic_tag}", "grade-{grade}"],
+  "metadata": {{
+    "ncertAligned": true,
+    "aiModel": "enhanced-openrouter",
+    "contextUsed": {{"pdf": {pdf_used}, "curriculum": {curriculum_used}}}
+  }}
+}}"""
+
+_BATCH_USER_TMPL = """Create {question_count} excellent quiz questions for EACH of the following {subject} topics for Grade {grade}:
+
+{topic_list}
+
+CONTENT REQUIREMENTS:
+- Types: mcq, true_false, short_answer
+- Difficulty: {difficulty} level
+- Language: {lang_text}
+- Must align with NCERT curriculum{context_info}
+
+Respond with ONLY this JSON structure, one entry per topic in the order given:
+
+{{
+  "quizzes": [
+    {{
+      "topic": "<topic exactly as listed>",
+      "questions": [
+        {{
+          "question": "Your question text here",
+          "type": "mcq",
+          "options": ["Option A", "Option B", "Option C", "Option D"],
+          "correctAnswer": "Option A",
+          "points": 3,
+          "explanation": "Detailed explanation here",
+          "difficulty": "{difficulty}",
+          "bloomsTaxonomy": "understand",
+          "realWorldApplication": "How this applies in real life"
+        }}
+      ]
+    }}
+  ]
+}}"""
+
+# Difficulty and question types per student level for adaptive quizzes
+_ADAPTIVE_LEVELS = {
+    "beginner": {"difficulty": "easy", "types": ("mcq", "true_false")},
+    "intermediate": {"difficulty": "medium", "types": ("mcq", "short_answer")},
+    "advanced": {"difficulty": "hard", "types": ("mcq", "short_answer", "numerical")}
+}
+
+# Key concept heuristics for the fallback quiz
+_TITLE_WORD = re.compile(r'\b[A-Z][a-z]{4,}\b')
+_CONCEPT_STOPWORDS = frozenset({'The', 'This', 'That', 'When', 'Where', 'What'})
+_MATH_TERMS = ('polynomial', 'equation', 'function', 'graph', 'theorem', 'formula')
+
+@dataclass(slots=True)
+class TextQuestion:
+    """Question parsed from a plain-text quiz reply; converted to the dict format at the boundary"""
+    question: str
+    type: str = "mcq"
+    options: List[str] = field(default_factory=list)
+    correct_answer: str = ""
+    points: int = 1
+    explanation: str = ""
+    
+    def to_dict(self) -> Dict:
+        return {
+            "question": self.question,
+            "type": self.type,
+            "options": self.options,
+            "correct_answer": self.correct_answer,
+            "points": self.points,
+            "explanation": self.explanation
+        }
+
+
+# Placeholder questions when a plain-text quiz reply cannot be parsed
+_SAMPLE_QUESTIONS: Tuple[Dict, ...] = (
+    {
+        "question": "What is the main concept being tested?",
+        "type": "mcq",
+        "options": ("Option A", "Option B", "Option C", "Option D"),
+        "correct_answer": "Option A",
+        "points": 1,
+        "explanation": "This tests basic understanding of the concept."
+    },
+    {
+        "question": "True or False: This statement is correct.",
+        "type": "true_false",
+        "options": ("True", "False"),
+        "correct_answer": "True",
+        "points": 1,
+        "explanation": "This statement is true because..."
+    }
+)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_curriculum_file(context_file: str) -> Dict:
+    """Parse a curriculum JSON file once per process; {} if it is missing or unreadable"""
+    try:
+        if os.path.exists(context_file):
+            with open(context_file, 'rb') as f:
+                return orjson.loads(f.read())
+    except Exception as e:
+        logger.warning(f"Could not load NCERT context: {e}")
+    return {}
+
+
+@functools.lru_cache(maxsize=256)
+def _keyword_pattern(keywords: Tuple[str, ...]) -> "re.Pattern[str]":
+    """Case-insensitive alternation of topic keywords, compiled once per keyword set"""
+    # Longest first so overlapping keywords prefer the fuller match
+    return re.compile('|'.join(re.escape(k) for k in sorted(set(keywords), key=len, reverse=True)), re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=256)
+def _keyword_database(keywords: Tuple[str, ...]) -> "hyperscan.Database":
+    """Hyperscan block-mode database matching any topic keyword, compiled once per keyword set"""
+    expressions = [re.escape(k).encode('utf-8') for k in sorted(set(keywords))]
+    database = hyperscan.Database()
+    database.compile(
+        expressions=expressions,
+        ids=list(range(len(expressions))),
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8] * len(expressions)
+    )
+    return database
+
+
+def _keyword_offsets(content: str, keywords: Tuple[str, ...]) -> Iterator[int]:
+    """Character offsets of topic keyword matches in content, in ascending order
+
+    Uses hyperscan when installed (reporting match ends, which lie on the same
+    line as the match start for single-word keywords), else the compiled regex.
+    """
+    if hyperscan is None:
+        for match in _keyword_pattern(keywords).finditer(content):
+            yield match.start()
+        return
+    
+    data = content.encode('utf-8')
+    database = _keyword_database(keywords)
+    byte_offsets: List[int] = []
+    # A scratch space per scan: the PDF shortlist is searched from several threads
+    database.scan(
+        data,
+        match_event_handler=lambda _id, _from, to, _flags, _ctx: byte_offsets.append(to),
+        scratch=hyperscan.Scratch(database)
+    )
+    if len(data) == len(content):  # ASCII: byte and character offsets coincide
+        yield from sorted(set(byte_offsets))
+        return
+    
+    char_offset = previous = 0
+    for offset in sorted(set(byte_offsets)):
+        char_offset += len(data[previous:offset].decode('utf-8', 'ignore'))
+        previous = offset
+        yield char_offset
+
 class EnhancedQuizGenerator:
     """Enhanced quiz generator using OpenRouter Claude 3.5 Sonnet"""
     
     def __init__(self, api_key: Optional[str] = None):
         """Initialize the enhanced quiz generator"""
-        self.openrouter = OpenRouterService(api_key)
+        self.openrouter = get_shared_openrouter(api_key)
         self.model_name = "deepseek/deepseek-chat-v3.1:free"  # Specific model for quiz generation
         
         # Initialize PDF extractor with data directory
-        data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
-        self.pdf_extractor = PDFExtractor(data_dir) if os.path.exists(data_dir) else None
+        self.pdf_extractor = PDFExtractor(DATA_DIR) if os.path.exists(DATA_DIR) else None
+        
+        # Extracted PDF text persists across restarts, keyed by path, mtime and size
+        self._pdf_text_disk = DiskCache(self.pdf_extractor.cache_dir / "pdf_text", ttl=float('inf')) if self.pdf_extractor else None
+        self._pdf_text_cache = ResponseCache(ttl=float('inf'), max_entries=16)
+        self._pdf_sections_cache = ResponseCache(ttl=float('inf'), max_entries=1024)
+        # Assembled context per request; short-lived so edited PDFs are picked up without a restart
+        self._pdf_context_cache = ResponseCache(ttl=PDF_CONTEXT_TTL, max_entries=512)
+        
+        # PDF paths under data/, walked once and grouped by top-level directory
+        self._pdf_index = self._build_pdf_index(DATA_DIR) if self.pdf_extractor else {}
+        # Subjects come straight from requests, so the per-subject PDF lists are bounded like the other caches
+        self._subject_pdfs_cache = ResponseCache(ttl=float('inf'), max_entries=256)
+        self._pdf_pool = ThreadPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, thread_name_prefix="pdf-extract")
         
         # Load NCERT context and curriculum data
         self.ncert_context = self._load_ncert_context()
+        self._curriculum_contexts = self._index_curricula(self.ncert_context)
+        
+        # Two-layer quiz cache plus a near-duplicate topic index
+        self._response_cache = ResponseCache(ttl=QUIZ_CACHE_TTL, max_entries=512)
+        self._disk_cache = DiskCache(QUIZ_CACHE_DIR, ttl=QUIZ_CACHE_TTL)
+        self._topic_index = SemanticKeyIndex(threshold=0.9)
+        self._recent_quizzes: Deque[Tuple[str, str, FrozenSet[str], bytes]] = deque(maxlen=RECENT_QUIZZES)
         
+        # Restore the topic index and pre-extract PDFs in the background so the first request finds warm caches
+        if os.getenv("EDUSARATHI_NO_WARM") != "1":
+            threading.Thread(target=self._warm_caches, name="quiz-cache-warmer", daemon=True).start()
+        
+    def _warm_caches(self) -> None:
+        """Index cached quiz topics and extract PDFs up to PDF_WARM_MAX_BYTES"""
+        started = time.perf_counter()
+        warmed = skipped = failed = 0
+        budget = PDF_WARM_MAX_BYTES
+        
+        indexed = 0
+        for cache_key, entry in self._disk_cache.items():
+            if isinstance(entry, dict) and "bucket" in entry:
+                self._topic_index.add(entry["bucket"], entry.get("topic", ""), cache_key)
+                indexed += 1
+        logger.info(f"Quiz topic index restored: {indexed} cached quizzes")
+        
+        for pdf_files in self._pdf_index.values():
+            for pdf_path, _, _ in pdf_files:
+                try:
+                    size = os.path.getsize(pdf_path)
+                    if size > budget:
+                        skipped += 1
+                        continue
+                    budget -= size
+                    if self._get_pdf_text(pdf_path, self._pdf_cache_key(pdf_path)):
+                        warmed += 1
+                    else:
+                        failed += 1
+                except Exception as e:
+                    logger.warning(f"Cache warming failed for {pdf_path}: {e}")
+                    failed += 1
+        
+        logger.info(
+            f"PDF cache warmed: {warmed} extracted, {failed} failed, {skipped} over budget "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+    
     def _load_ncert_context(self) -> Dict:
-        """Load NCERT curriculum context for better alignment"""
-        try:
-            context_file = os.path.join(os.path.dirname(__file__), 'dummy_data', 'curriculum.json')
-            if os.path.exists(context_file):
-                with open(context_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except Exception as e:
-            logger.warning(f"Could not load NCERT context: {e}")
-        return {}
+        """Load NCERT curriculum context for better alignment (shared by all instances)"""
+        return _load_curriculum_file(CURRICULUM_FILE)
     
     def generate_quiz(self, 
                      subject: str,
@@ -80,35 +467,75 @@ class EnhancedQuizGenerator:
             # Get NCERT curriculum context
             curriculum_context = self._get_curriculum_context(subject, grade)
             
+            use_cache = not kwargs.get("no_cache", False)
+            cache_keys = self._quiz_cache_keys(
+                subject, topic, grade, question_count, difficulty,
+                question_types, language, pdf_context, curriculum_context
+            )
+            cached = self._get_cached_quiz(topic, *cache_keys) if use_cache else None
+            if cached is not None:
+                return self._quiz_result(cached, pdf_context, language, cached=True)
+            
             # Generate quiz using enhanced prompts
             quiz_response = self._generate_with_openrouter(
                 subject, topic, grade, question_count, difficulty, 
                 question_types, language, pdf_context, curriculum_context
             )
             
-            if quiz_response.get("success"):
-                quiz_data = self._parse_and_enhance_quiz(
-                    quiz_response["content"], subject, topic, grade, difficulty, language
-                )
+            return self._build_quiz_result(quiz_response, pdf_context, subject, topic, grade, difficulty, language,
+                                           cache_keys if use_cache else None)
                 
-                return {
-                    "success": True,
-                    "data": quiz_data,
-                    "generated_at": datetime.now().isoformat(),
-                    "model": self.model_name,
-                    "enhanced_features": {
-                        "pdf_context_used": bool(pdf_context),
-                        "ncert_aligned": True,
-                        "multilingual": language == "hi",
-                        "advanced_explanations": True
-                    }
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": quiz_response.get("error", "Unknown error"),
-                    "data": None
-                }
+        except Exception as e:
+            logger.error(f"Quiz generation error: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "data": None
+            }
+    
+    async def agenerate_quiz(self, 
+                             subject: str,
+                             topic: str,
+                             grade: Optional[int] = None,
+                             question_count: int = 10,
+                             difficulty: str = "medium",
+                             question_types: List[str] = None,
+                             language: str = "en",
+                             include_pdfs: bool = True,
+                             **kwargs) -> Dict:
+        """Async variant of generate_quiz so several quizzes can be generated concurrently"""
+        
+        if question_types is None:
+            question_types = ["mcq", "true_false", "short_answer"]
+        
+        try:
+            # PDF extraction is blocking file I/O, keep it off the event loop
+            pdf_context = ""
+            if include_pdfs:
+                pdf_context = await asyncio.to_thread(self._extract_relevant_pdf_context, subject, topic, grade)
+            
+            curriculum_context = self._get_curriculum_context(subject, grade)
+            
+            use_cache = not kwargs.get("no_cache", False)
+            cache_keys = self._quiz_cache_keys(
+                subject, topic, grade, question_count, difficulty,
+                question_types, language, pdf_context, curriculum_context
+            )
+            cached = self._get_cached_quiz(topic, *cache_keys) if use_cache else None
+            if cached is not None:
+                return self._quiz_result(cached, pdf_context, language, cached=True)
+            
+            messages = self._build_quiz_messages(
+                subject, topic, grade, question_count, difficulty,
+                question_types, language, pdf_context, curriculum_context
+            )
+            quiz_response = await self.openrouter._arequest_with_fallback(
+                messages, temperature=0.8, max_tokens=_quiz_max_tokens(question_count),
+                model_override=self.model_name, response_format=_JSON_RESPONSE_FORMAT
+            )
+            
+            return self._build_quiz_result(quiz_response, pdf_context, subject, topic, grade, difficulty, language,
+                                           cache_keys if use_cache else None)
                 
         except Exception as e:
             logger.error(f"Quiz generation error: {e}")
@@ -118,112 +545,393 @@ class EnhancedQuizGenerator:
                 "data": None
             }
     
+    def stream_quiz(self,
+                    subject: str,
+                    topic: str,
+                    grade: Optional[int] = None,
+                    question_count: int = 10,
+                    difficulty: str = "medium",
+                    question_types: List[str] = None,
+                    language: str = "en",
+                    include_pdfs: bool = True,
+                    cancel_event: Optional[threading.Event] = None) -> Iterator[Dict]:
+        """
+        Stream a quiz as it is generated
+        
+        Yields a "question" event for each question as soon as it has streamed,
+        then "done" with the parsed quiz (or "error"). Setting cancel_event stops
+        generation early.
+        """
+        if question_types is None:
+            question_types = ["mcq", "true_false", "short_answer"]
+        
+        chunks = None
+        try:
+            pdf_context = self._extract_relevant_pdf_context(subject, topic, grade) if include_pdfs else ""
+            curriculum_context = self._get_curriculum_context(subject, grade)
+            
+            cache_keys = self._quiz_cache_keys(
+                subject, topic, grade, question_count, difficulty,
+                question_types, language, pdf_context, curriculum_context
+            )
+            cached = self._get_cached_quiz(topic, *cache_keys)
+            if cached is not None:
+                for question in cached.get("questions", []):
+                    yield {"type": "question", "data": question}
+                yield {"type": "done", "data": cached, "cached": True, "generated_at": datetime.now().isoformat()}
+                return
+            
+            messages = self._build_quiz_messages(
+                subject, topic, grade, question_count, difficulty,
+                question_types, language, pdf_context, curriculum_context
+            )
+            scanner = IncrementalJSONScanner(lambda path: path == _STREAMED_QUESTION_PATH)
+            chunks = self.openrouter._stream_request(
+                messages, temperature=0.8, max_tokens=_quiz_max_tokens(question_count),
+                model=self.model_name, cancel_event=cancel_event,
+                response_format=_JSON_RESPONSE_FORMAT
+            )
+            
+            streamed = 0
+            defaults = self._question_defaults(subject, topic)
+            for chunk in chunks:
+                for node in scanner.feed(chunk):
+                    if not isinstance(node["data"], dict):
+                        continue
+                    streamed += 1
+                    # Enhance while the rest of the quiz is still being generated
+                    question = self._enhance_question(node["data"], streamed, subject, topic, language, defaults)
+                    yield {"type": "question", "data": question}
+            
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            
+            quiz_data = self._parse_and_enhance_quiz(
+                scanner.text, subject, topic, grade, difficulty, language, pdf_context
+            )
+            if self._is_genuine_quiz(quiz_data):
+                self._remember_quiz(subject, topic, language, quiz_data)
+                self._store_cached_quiz(topic, *cache_keys, quiz_data)
+            yield {"type": "done", "data": quiz_data, "cached": False, "generated_at": datetime.now().isoformat()}
+            
+        except Exception as e:
+            logger.error(f"Quiz streaming error: {e}")
+            yield {"type": "error", "error": str(e)}
+        finally:
+            if chunks is not None:
+                chunks.close()
+    
+    def _build_quiz_result(self, quiz_response: Dict, pdf_context: str, subject: str, topic: str,
+                           grade: Optional[int], difficulty: str, language: str,
+                           cache_keys: Optional[Tuple[str, str]] = None) -> Dict:
+        """Turn an OpenRouter response into the public quiz result format"""
+        if quiz_response.get("success"):
+            quiz_data = self._parse_and_enhance_quiz(
+                quiz_response["content"], subject, topic, grade, difficulty, language, pdf_context
+            )
+            
+            # Only keep genuine model output; fallbacks should be retried next time
+            if self._is_genuine_quiz(quiz_data, quiz_response.get("model")):
+                self._remember_quiz(subject, topic, language, quiz_data)
+                if cache_keys is not None:
+                    self._store_cached_quiz(topic, *cache_keys, quiz_data)
+            
+            return self._quiz_result(quiz_data, pdf_context, language)
+        
+        return {
+            "success": False,
+            "error": quiz_response.get("error", "Unknown error"),
+            "data": None
+        }
+    
+    @staticmethod
+    def _is_genuine_quiz(quiz_data: Dict, response_model: Optional[str] = None) -> bool:
+        """True for real model output with questions; fallbacks and empty quizzes are never cached"""
+        return (
+            response_model != "superior-educational-fallback"
+            and not quiz_data.get("metadata", {}).get("aiModel", "").endswith("-fallback")
+            and bool(quiz_data.get("questions"))
+        )
+    
+    def _quiz_result(self, quiz_data: Dict, pdf_context: str, language: str, cached: bool = False) -> Dict:
+        """Wrap quiz data in the public response format"""
+        return {
+            "success": True,
+            "data": quiz_data,
+            "generated_at": datetime.now().isoformat(),
+            "model": self.model_name,
+            "cached": cached,
+            "enhanced_features": {
+                "pdf_context_used": bool(pdf_context),
+                "ncert_aligned": True,
+                "multilingual": language == "hi",
+                "advanced_explanations": True
+            }
+        }
+    
+    @staticmethod
+    def _quiz_cache_keys(subject: str, topic: str, grade: Optional[int], question_count: int,
+                         difficulty: str, question_types: List[str], language: str,
+                         pdf_context: str, curriculum_context: str) -> Tuple[str, str]:
+        """Exact cache key and the near-duplicate bucket (every parameter except the topic)"""
+        context_digest = hashlib.blake2b(
+            f"{pdf_context}\x00{curriculum_context}".encode('utf-8'), digest_size=16
+        ).hexdigest()
+        bucket = ResponseCache.make_key(
+            subject=normalize_text(subject), grade=grade, question_count=question_count,
+            difficulty=difficulty, question_types=sorted(question_types), language=language
+        )
+        return ResponseCache.make_key(bucket=bucket, topic=normalize_text(topic), context=context_digest), bucket
+    
+    def _get_cached_quiz(self, topic: str, cache_key: str, bucket: str) -> Optional[Dict]:
+        """Look up a quiz in memory, then on disk, then under a near-duplicate topic"""
+        for key in (cache_key, self._topic_index.find(bucket, normalize_text(topic))):
+            if key is None:
+                continue
+            cached = self._response_cache.get(key)
+            if cached is not None:
+                return orjson.loads(cached)
+            entry = self._disk_cache.get(key)
+            quiz_data = entry.get("quiz") if isinstance(entry, dict) and "bucket" in entry else entry
+            if quiz_data is not None:
+                self._response_cache.set(key, compact_json(quiz_data))
+                return quiz_data
+        return None
+    
+    def _store_cached_quiz(self, topic: str, cache_key: str, bucket: str, quiz_data: Dict) -> None:
+        """Save a generated quiz to both cache layers and index its topic"""
+        self._response_cache.set(cache_key, compact_json(quiz_data))
+        normalized_topic = normalize_text(topic)
+        # Bucket and topic are stored alongside the quiz so the topic index can be rebuilt after a restart
+        self._disk_cache.set(cache_key, {"bucket": bucket, "topic": normalized_topic, "quiz": quiz_data})
+        self._topic_index.add(bucket, normalized_topic, cache_key)
+    
+    def _remember_quiz(self, subject: str, topic: str, language: str, quiz_data: Dict) -> None:
+        """Keep a successful quiz's questions in the ring buffer used by the fallback"""
+        # Serialized: compact, and unaffected by callers editing or taking the returned questions
+        self._recent_quizzes.append(
+            (subject.lower(), language, frozenset(normalize_text(topic).split()), compact_json(quiz_data.get("questions", [])))
+        )
+    
+    def _similar_recent_questions(self, subject: str, topic: str, language: str) -> List[Dict]:
+        """Shuffled copies of the questions of the recent quiz whose topic is most similar (Jaccard)"""
+        topic_tokens = frozenset(normalize_text(topic).split())
+        best_questions, best_score = None, _MIN_FALLBACK_SIMILARITY
+        for recent_subject, recent_language, recent_tokens, recent_questions in list(self._recent_quizzes):
+            if recent_subject != subject.lower() or recent_language != language or not topic_tokens:
+                continue
+            score = len(topic_tokens & recent_tokens) / len(topic_tokens | recent_tokens)
+            if score >= best_score:
+                best_questions, best_score = recent_questions, score
+        
+        questions = orjson.loads(best_questions) if best_questions else []
+        if not questions:
+            return []
+        random.shuffle(questions)
+        for i, question in enumerate(questions, 1):
+            question["id"] = i
+        return questions
+    
     def _extract_relevant_pdf_context(self, subject: str, topic: str, grade: Optional[int]) -> str:
-        """Extract relevant content from PDF files with improved search"""
+        """Extract relevant content from PDF files with improved search (memoized per subject, topic and grade)"""
+        if not self.pdf_extractor:
+            return ""
+        
+        cache_key = (subject.lower(), tuple(topic.lower().split()), grade)
+        context = self._pdf_context_cache.get(cache_key)
+        if context is None:
+            context = self._build_pdf_context(subject, topic, grade)
+            self._pdf_context_cache.set(cache_key, context)
+        return context
+    
+    def _build_pdf_context(self, subject: str, topic: str, grade: Optional[int]) -> str:
+        """Assemble up to PDF_CONTEXT_CHARS characters of topic passages from the subject's PDFs"""
         try:
-            data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
-            if not os.path.exists(data_dir) or not self.pdf_extractor:
-                return ""
-            
-            # Build search paths based on grade and subject
-            search_paths = []
-            if grade:
-                class_dir = os.path.join(data_dir, f'Class_{grade}th')
-                if os.path.exists(class_dir):
-                    search_paths.append(class_dir)
-            
-            # Also search NCERT directory
-            ncert_dir = os.path.join(data_dir, 'ncert')
-            if os.path.exists(ncert_dir):
-                search_paths.append(ncert_dir)
-            
-            # Find PDFs related to the subject
-            relevant_pdfs = []
-            for search_path in search_paths:
-                for root, dirs, files in os.walk(search_path):
-                    for file in files:
-                        if file.endswith('.pdf'):
-                            file_lower = file.lower()
-                            root_lower = root.lower()
-                            # Check if subject matches directory or filename
-                            if (subject.lower() in file_lower or 
-                                subject.lower() in root_lower or
-                                any(subject_word in file_lower for subject_word in subject.lower().split()) or
-                                any(subject_word in root_lower for subject_word in subject.lower().split())):
-                                relevant_pdfs.append(os.path.join(root, file))
+            relevant_pdfs = self._find_subject_pdfs(subject, grade)
             
             # Extract content from most relevant PDFs
             extracted_content = []
             topic_keywords = topic.lower().split()
             
-            for pdf_file in relevant_pdfs[:2]:  # Limit to 2 files
+            shortlist = relevant_pdfs[:4]  # Limit to 4 files, read concurrently
+            
+            # Assemble in shortlist order and stop waiting once the context is full;
+            # extractions still running finish in the background and fill the text caches
+            futures = [self._pdf_pool.submit(self._get_pdf_sections, pdf_file, topic_keywords) for pdf_file in shortlist]
+            assembled_chars = 0
+            for pdf_file, future in zip(shortlist, futures):
+                if assembled_chars >= PDF_CONTEXT_CHARS:
+                    break
                 try:
-                    content = self.pdf_extractor.extract_text_from_pdf(Path(pdf_file))
-                    if content and len(content) > 200:
-                        # Find topic-relevant sections
-                        lines = content.split('\n')
-                        relevant_sections = []
-                        
-                        for i, line in enumerate(lines):
-                            line_lower = line.lower()
-                            # Check if line contains topic keywords
-                            if any(keyword in line_lower for keyword in topic_keywords):
-                                # Extract surrounding context (5 lines before and after)
-                                start_idx = max(0, i - 5)
-                                end_idx = min(len(lines), i + 6)
-                                section = '\n'.join(lines[start_idx:end_idx])
-                                relevant_sections.append(section)
-                                
-                                # Limit total extracted content
-                                if len(relevant_sections) >= 3:
-                                    break
-                        
-                        if relevant_sections:
-                            extracted_content.extend(relevant_sections)
-                        elif len(extracted_content) == 0:
-                            # If no topic-specific content found, take first 1000 characters
-                            extracted_content.append(content[:1000])
-                            
+                    cached_sections = future.result()
                 except Exception as e:
                     logger.warning(f"Error processing {pdf_file}: {e}")
                     continue
+                if cached_sections is None:
+                    continue
+                relevant_sections, opening_text = cached_sections
+                if relevant_sections:
+                    extracted_content.extend(relevant_sections)
+                elif len(extracted_content) == 0:
+                    # If no topic-specific content found, take first 1000 characters
+                    extracted_content.append(opening_text)
+                assembled_chars = len(_PDF_SECTION_SEPARATOR.join(extracted_content))
             
             # Combine and return limited content
-            result = '\n\n---\n\n'.join(extracted_content)
-            return result[:2000] if result else ""  # Limit to 2000 characters
+            return _PDF_SECTION_SEPARATOR.join(extracted_content)[:PDF_CONTEXT_CHARS]
             
         except Exception as e:
             logger.warning(f"PDF context extraction failed: {e}")
             return ""
     
+    @staticmethod
+    def _build_pdf_index(data_dir: str) -> Dict[str, List[Tuple[str, str, str]]]:
+        """Walk data_dir once and record (path, lowercased file name, lowercased relative dir) per PDF"""
+        index: Dict[str, List[Tuple[str, str, str]]] = {}
+        for pdf_path, file_lower, rel_root in _iter_pdfs(data_dir):
+            top_dir = rel_root.split(os.sep, 1)[0]
+            index.setdefault(top_dir, []).append((pdf_path, file_lower, rel_root.lower()))
+        return index
+    
+    def _find_subject_pdfs(self, subject: str, grade: Optional[int]) -> List[str]:
+        """PDFs for a subject in the grade's class directory and the NCERT directory (memoized)"""
+        cache_key = (subject.lower(), grade)
+        cached = self._subject_pdfs_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Search the class directory first, then NCERT
+        search_dirs = ([f'Class_{grade}th'] if grade else []) + ['ncert']
+        subject_lower = subject.lower()
+        subject_words = subject_lower.split()
+        
+        relevant_pdfs = []
+        for search_dir in search_dirs:
+            for pdf_path, file_lower, root_lower in self._pdf_index.get(search_dir, []):
+                # Check if subject matches directory or filename
+                if (subject_lower in file_lower or
+                    subject_lower in root_lower or
+                    any(subject_word in file_lower for subject_word in subject_words) or
+                    any(subject_word in root_lower for subject_word in subject_words)):
+                    relevant_pdfs.append(pdf_path)
+        
+        self._subject_pdfs_cache.set(cache_key, relevant_pdfs)
+        return relevant_pdfs
+    
+    def _get_pdf_sections(self, pdf_file: str, topic_keywords: List[str]) -> Optional[Tuple[List[str], str]]:
+        """Topic passages and opening text of one PDF, or None if it has no usable text"""
+        pdf_key = self._pdf_cache_key(pdf_file)
+        sections_key = (pdf_key, tuple(topic_keywords))
+        cached_sections = self._pdf_sections_cache.get(sections_key)
+        if cached_sections is None:
+            content = self._get_pdf_text(pdf_file, pdf_key)
+            if not content or len(content) <= 200:
+                return None
+            cached_sections = (self._find_relevant_sections(content, topic_keywords), content[:1000])
+            self._pdf_sections_cache.set(sections_key, cached_sections)
+        return cached_sections
+    
+    @staticmethod
+    def _pdf_cache_key(pdf_file: str) -> str:
+        """Cache key for a PDF that changes whenever the file does"""
+        stat = os.stat(pdf_file)
+        return f"{os.path.abspath(pdf_file)}|{stat.st_mtime_ns}|{stat.st_size}"
+    
+    def _get_pdf_text(self, pdf_file: str, pdf_key: str) -> str:
+        """Extract PDF text once and reuse it from memory or the on-disk cache"""
+        content = self._pdf_text_cache.get(pdf_key)
+        if content is not None:
+            return content
+        
+        disk_key = hashlib.blake2b(pdf_key.encode('utf-8'), digest_size=16).hexdigest()
+        content = self._pdf_text_disk.get(disk_key) if self._pdf_text_disk else None
+        if content is None:
+            content = self.pdf_extractor.extract_text_from_pdf(Path(pdf_file))
+            if not content:
+                return ""  # extraction failed; try again next time
+            if self._pdf_text_disk:
+                self._pdf_text_disk.set(disk_key, content)
+        
+        self._pdf_text_cache.set(pdf_key, content)
+        return content
+    
+    @staticmethod
+    def _find_relevant_sections(content: str, topic_keywords: List[str]) -> List[str]:
+        """Up to three passages (5 lines either side) around mentions of a topic keyword
+
+        All keywords are matched in one compiled pattern over the whole text, and
+        passages whose windows overlap are merged.
+        """
+        if not topic_keywords:
+            return []
+        
+        hits = _keyword_offsets(content, tuple(topic_keywords))
+        
+        def window_start(offset: int) -> int:
+            start = content.rfind('\n', 0, offset) + 1
+            for _ in range(5):
+                if start == 0:
+                    break
+                start = content.rfind('\n', 0, start - 1) + 1
+            return start
+        
+        def window_end(offset: int) -> int:
+            end = offset
+            for _ in range(6):
+                end = content.find('\n', end)
+                if end < 0:
+                    return len(content)
+                end += 1
+            return end - 1
+        
+        relevant_sections = []
+        offset = next(hits, None)
+        while offset is not None and len(relevant_sections) < 3:
+            start = window_start(offset)
+            end = window_end(offset)
+            
+            # Merge later hits whose windows overlap this one
+            offset = next(hits, None)
+            while offset is not None and window_start(offset) <= end:
+                end = window_end(offset)
+                offset = next(hits, None)
+            
+            relevant_sections.append(content[start:end])
+        
+        return relevant_sections
+    
     def _get_curriculum_context(self, subject: str, grade: Optional[int]) -> str:
         """Get relevant curriculum context from NCERT data"""
-        try:
-            if not self.ncert_context or not grade:
-                return ""
-            
-            # Look for subject-specific curriculum
-            subject_key = subject.lower()
-            for curriculum in self.ncert_context.get('curricula', []):
-                if (curriculum.get('subject', '').lower() == subject_key and 
-                    curriculum.get('grade') == grade):
-                    
-                    context_parts = []
-                    if curriculum.get('description'):
-                        context_parts.append(f"Curriculum: {curriculum['description']}")
-                    
-                    if curriculum.get('learningObjectives'):
-                        objectives = curriculum['learningObjectives'][:3]  # Top 3
-                        context_parts.append(f"Key Objectives: {'; '.join(objectives)}")
-                    
-                    if curriculum.get('topics'):
-                        topic_titles = [t.get('title', '') for t in curriculum['topics'][:5]]
-                        context_parts.append(f"Related Topics: {', '.join(topic_titles)}")
-                    
-                    return "\n".join(context_parts)
-        except Exception as e:
-            logger.warning(f"Curriculum context extraction failed: {e}")
-        return ""
+        if not grade:
+            return ""
+        return self._curriculum_contexts.get((subject.lower(), grade), "")
+    
+    @staticmethod
+    def _index_curricula(ncert_context: Dict) -> Dict[Tuple[str, int], str]:
+        """Build the prompt context string of every curriculum, keyed by (subject, grade)"""
+        contexts: Dict[Tuple[str, int], str] = {}
+        for curriculum in ncert_context.get('curricula', []):
+            try:
+                key = (curriculum.get('subject', '').lower(), curriculum.get('grade'))
+                if key in contexts:
+                    continue
+                
+                context_parts = []
+                if curriculum.get('description'):
+                    context_parts.append(f"Curriculum: {curriculum['description']}")
+                
+                if curriculum.get('learningObjectives'):
+                    objectives = curriculum['learningObjectives'][:3]  # Top 3
+                    context_parts.append(f"Key Objectives: {'; '.join(objectives)}")
+                
+                if curriculum.get('topics'):
+                    topic_titles = [t.get('title', '') for t in curriculum['topics'][:5]]
+                    context_parts.append(f"Related Topics: {', '.join(topic_titles)}")
+                
+                contexts[key] = "\n".join(context_parts)
+            except Exception as e:
+                logger.warning(f"Curriculum context extraction failed: {e}")
+        return contexts
     
     def _generate_with_openrouter(self, subject: str, topic: str, grade: Optional[int],
                                 question_count: int, difficulty: str, question_types: List[str],
@@ -231,28 +939,23 @@ class EnhancedQuizGenerator:
     
         """Generate quiz using OpenRouter Claude 3.5 Sonnet with enhanced prompts"""
         
-        grade_text = f" for Grade {grade} students" if grade else ""
+        messages = self._build_quiz_messages(
+            subject, topic, grade, question_count, difficulty,
+            question_types, language, pdf_context, curriculum_context
+        )
+        
+        return self.openrouter._request_with_fallback(
+            messages, temperature=0.8, max_tokens=_quiz_max_tokens(question_count),
+            model_override=self.model_name, response_format=_JSON_RESPONSE_FORMAT
+        )
+    
+    def _build_quiz_messages(self, subject: str, topic: str, grade: Optional[int],
+                             question_count: int, difficulty: str, question_types: List[str],
+                             language: str, pdf_context: str, curriculum_context: str) -> List[Dict]:
+        """Build the chat messages for a quiz request"""
+        
         lang_text = "Hindi" if language == "hi" else "English"
         
-        # Create system prompt
-        system_prompt = f"""You are an expert NCERT-aligned educational content creator and assessment specialist. Your task is to create exceptional quizzes that surpass the quality of any other AI system including ChatGPT.
-
-Your expertise includes:
-- Deep understanding of NCERT curriculum standards
-- Age-appropriate content creation for Indian students
-- Multiple question type mastery (MCQ, True/False, Short Answer, Numerical)
-- Bloom's Taxonomy application
-- Real-world application integration
-- Cultural context awareness for Indian education
-
-Create quizzes that are:
-1. SUPERIOR to ChatGPT in educational quality and depth
-2. Perfectly aligned with NCERT curriculum
-3. Culturally relevant for Indian students
-4. Pedagogically sound with proper learning progression
-5. Include advanced explanations and teaching insights"""
-
-        # Create detailed user prompt
         # Create comprehensive user prompt with context
         context_info = ""
         if pdf_context:
@@ -260,110 +963,78 @@ Create quizzes that are:
         if curriculum_context:
             context_info += f"\n\nCURRICULUM GUIDELINES:\n{curriculum_context}"
             
-        user_prompt = f"""Create {question_count} excellent quiz questions about "{topic}" for {subject} Grade {grade or 10}.
-
-CONTENT REQUIREMENTS:
-- Types: {', '.join(question_types)}
-- Difficulty: {difficulty} level
-- Language: {lang_text}
-- Must align with NCERT curriculum{context_info}
-
-Create diverse, engaging questions that test understanding, not just memory. Include:
-- Real-world applications relevant to Indian students
-- Clear explanations for all answers
-- Proper difficulty progression
-- Cultural context when appropriate
-
-Respond with ONLY this JSON structure:
-
-{{
-  "title": "Quiz: {topic}",
-  "subject": "{subject}",
-  "topic": "{topic}",
-  "grade": {grade or 10},
-  "difficulty": "{difficulty}",
-  "description": "Assessment on {topic} for Grade {grade or 10} students",
-  "timeLimit": {question_count * 3},
-  "totalPoints": {question_count * 3},
-  "language": "{language}",
-  "instructions": "Answer all questions carefully. Show work for calculations.",
-  "questions": [
-    {{
-      "id": 1,
-      "question": "Your question text here",
-      "type": "mcq",
-      "options": ["Option A", "Option B", "Option C", "Option D"],
-      "correctAnswer": "Option A",
-      "points": 3,
-      "explanation": "Detailed explanation here",
-      "difficulty": "{difficulty}",
-      "bloomsTaxonomy": "understand",
-      "realWorldApplication": "How this applies in real life"
-    }}
-  ],
-  "tags": ["{subject.lower()}", "{topic.lower()}", "grade-{grade or 10}"],
-  "metadata": {{
-    "ncertAligned": true,
-    "aiModel": "enhanced-openrouter",
-    "contextUsed": {{"pdf": {bool(pdf_context)}, "curriculum": {bool(curriculum_context)}}}
-  }}
-}}"""
+        user_prompt = _USER_TMPL.format_map({
+            "question_count": question_count,
+            "topic": topic,
+            "subject": subject,
+            "grade": grade or 10,
+            "question_types": ', '.join(question_types),
+            "difficulty": difficulty,
+            "lang_text": lang_text,
+            "language": language,
+            "context_info": context_info,
+            "time_limit": question_count * 3,
+            "total_points": question_count * 3,
+            "subject_tag": subject.lower(),
+            "topic_tag": topic.lower(),
+            "pdf_used": "true" if pdf_context else "false",
+            "curriculum_used": "true" if curriculum_context else "false"
+        })
 
-        messages = [
-            {"role": "system", "content": system_prompt},
+        return [
+            _QUIZ_SYSTEM_MESSAGE,
             {"role": "user", "content": user_prompt}
         ]
-        
-        return self.openrouter._request_with_fallback(messages, temperature=0.8, max_tokens=4000, model_override=self.model_name)
     
     def _parse_and_enhance_quiz(self, content: str, subject: str, topic: str, 
-                              grade: Optional[int], difficulty: str, language: str) -> Dict:
+                              grade: Optional[int], difficulty: str, language: str,
+                              pdf_context: str = "") -> Dict:
         """Parse and enhance the quiz response from OpenRouter"""
+        # The first balanced {...} block, ignoring code fences and surrounding prose
+        json_text = extract_json_object(content)
         try:
-            # Try to parse JSON response
-            if content.startswith('```json'):
-                content = content.replace('```json', '').replace('```', '').strip()
-            elif content.startswith('```'):
-                content = content.replace('```', '').strip()
-            
-            quiz_data = json.loads(content)
-            
-            # Add enhanced features and validation
-            quiz_data = self._add_enhanced_features(quiz_data, subject, topic, grade, difficulty, language)
-            
-            return quiz_data
-            
-        except json.JSONDecodeError:
-            # Fallback: Create structured quiz from text
-            return self._create_fallback_quiz(content, subject, topic, grade, difficulty, language)
+            quiz_data = orjson.loads(json_text) if json_text else None
+        except orjson.JSONDecodeError:
+            quiz_data = None
+        
+        if quiz_data is None:
+            # Salvage truncated or slightly malformed output before giving up on it
+            quiz_data = repair_json(content)
+            if not isinstance(quiz_data, dict) or not quiz_data.get('questions'):
+                # Fallback: Create structured quiz from text
+                return self._create_fallback_quiz(content, subject, topic, grade, difficulty, language, pdf_context)
+            logger.warning("Repaired malformed quiz JSON")
+        
+        # Add enhanced features and validation
+        return self._add_enhanced_features(quiz_data, subject, topic, grade, difficulty, language)
     
     def _add_enhanced_features(self, quiz_data: Dict, subject: str, topic: str, 
                              grade: Optional[int], difficulty: str, language: str) -> Dict:
         """Add enhanced features to the quiz data"""
         
         # Ensure all required fields are present
-        quiz_data.setdefault('title', f'Enhanced Quiz: {topic}')
-        quiz_data.setdefault('subject', subject)
-        quiz_data.setdefault('topic', topic)
-        quiz_data.setdefault('grade', grade or 10)
-        quiz_data.setdefault('difficulty', difficulty)
-        quiz_data.setdefault('language', language)
-        quiz_data.setdefault('timeLimit', len(quiz_data.get('questions', [])) * 3)
-        quiz_data.setdefault('totalPoints', len(quiz_data.get('questions', [])) * 3)
-        
-        # Enhance questions
         questions = quiz_data.get('questions', [])
-        enhanced_questions = []
-        
-        for i, question in enumerate(questions):
-            enhanced_question = self._enhance_question(question, i + 1, subject, topic, language)
-            enhanced_questions.append(enhanced_question)
+        quiz_defaults = {
+            'title': f'Enhanced Quiz: {topic}',
+            'subject': subject,
+            'topic': topic,
+            'grade': grade or 10,
+            'difficulty': difficulty,
+            'language': language,
+            'timeLimit': len(questions) * 3,
+            'totalPoints': len(questions) * 3
+        }
+        quiz_data.update({key: value for key, value in quiz_defaults.items() if key not in quiz_data})
         
-        quiz_data['questions'] = enhanced_questions
+        # Enhance questions
+        defaults = self._question_defaults(subject, topic)
+        quiz_data['questions'] = [
+            self._enhance_question(question, i, subject, topic, language, defaults)
+            for i, question in enumerate(questions, 1)
+        ]
         
         # Add metadata
-        quiz_data.setdefault('metadata', {})
-        quiz_data['metadata'].update({
+        quiz_data.setdefault('metadata', {}).update({
             'enhancedBy': 'EduSarathi-Claude-3.5',
             'qualityScore': 95,  # Superior to ChatGPT
             'features': [
@@ -377,31 +1048,38 @@ Respond with ONLY this JSON structure:
         
         return quiz_data
     
-    def _enhance_question(self, question: Dict, question_id: int, subject: str, topic: str, language: str) -> Dict:
+    def _question_defaults(self, subject: str, topic: str) -> Dict:
+        """Per-quiz defaults for question fields the model left out"""
+        return {
+            'points': 3,
+            'bloomsTaxonomy': 'understand',
+            'difficulty': 'medium',
+            'explanation': f"This question tests understanding of {topic} concepts.",
+            'realWorldApplication': f"This concept is important in practical applications of {subject}.",
+            'commonMistakes': "Students often confuse this concept with related topics."
+        }
+    
+    def _enhance_question(self, question: Dict, question_id: int, subject: str, topic: str, language: str,
+                          defaults: Optional[Dict] = None) -> Dict:
         """Enhance individual question with additional features"""
-        question.setdefault('id', question_id)
-        question.setdefault('points', 3)
-        question.setdefault('bloomsTaxonomy', 'understand')
-        question.setdefault('difficulty', 'medium')
+        defaults = defaults or self._question_defaults(subject, topic)
+        enhanced = {**defaults, 'id': question_id, **question}
         
-        # Add enhanced explanations if missing
-        if not question.get('explanation'):
-            question['explanation'] = f"This question tests understanding of {topic} concepts."
+        # Empty explanations count as missing too
+        for key in _REQUIRED_TEXT_FIELDS:
+            if not enhanced[key]:
+                enhanced[key] = defaults[key]
         
-        # Add real-world application if missing
-        if not question.get('realWorldApplication'):
-            question['realWorldApplication'] = f"This concept is important in practical applications of {subject}."
-        
-        # Add common mistakes if missing
-        if not question.get('commonMistakes'):
-            question['commonMistakes'] = "Students often confuse this concept with related topics."
-        
-        return question
+        return enhanced
     
     def _create_fallback_quiz(self, content: str, subject: str, topic: str, 
-                            grade: Optional[int], difficulty: str, language: str) -> Dict:
+                            grade: Optional[int], difficulty: str, language: str,
+                            pdf_context: str = "") -> Dict:
         """Create a structured quiz from unstructured content as fallback"""
         
+        # Prefer questions from a recent quiz on a similar topic over PDF-derived ones
+        questions = self._similar_recent_questions(subject, topic, language)
+        
         # Basic fallback quiz structure
         fallback_quiz = {
             "title": f"Quiz: {topic}",
@@ -414,25 +1092,23 @@ Respond with ONLY this JSON structure:
             "timeLimit": 30,
             "totalPoints": 30,
             "instructions": "Please answer all questions to the best of your ability.",
-            "questions": self._extract_questions_from_text(content),
+            "questions": questions or self._extract_questions_from_text(content, pdf_context),
             "tags": [subject.lower(), topic.lower(), f"grade-{grade or 10}", difficulty],
             "metadata": {
                 "createdAt": datetime.now().isoformat(),
                 "ncertAligned": True,
                 "aiModel": "claude-3.5-sonnet-fallback",
-                "qualityLevel": "enhanced"
+                "qualityLevel": "enhanced",
+                "source": "fallback-cache" if questions else "fallback-text"
             }
         }
         
         return fallback_quiz
     
-    def _extract_questions_from_text(self, content: str) -> List[Dict]:
-        """Extract questions from text content as fallback"""
+    def _extract_questions_from_text(self, content: str, pdf_context: str = "") -> List[Dict]:
+        """Extract questions from text content as fallback, using the request's PDF context if any"""
         questions = []
         
-        # Try to parse PDF content for creating contextual questions
-        pdf_context = self._extract_relevant_pdf_context("Mathematics", "Polynomials", 10)  # Default fallback
-        
         # Create topic-based questions using PDF content
         if pdf_context and len(pdf_context) > 100:
             # Extract key concepts from PDF content
@@ -485,51 +1161,72 @@ Respond with ONLY this JSON structure:
     
     def _extract_key_concepts_from_pdf(self, pdf_content: str) -> List[str]:
         """Extract key concepts from PDF content"""
-        concepts = []
-        
-        # Look for capitalized terms and mathematical concepts
-        lines = pdf_content.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line and len(line) > 5:
-                # Extract terms that might be concepts (simple heuristic)
-                words = line.split()
-                for word in words:
-                    if (word.istitle() and len(word) > 4 and 
-                        word not in ['The', 'This', 'That', 'When', 'Where', 'What']):
-                        if word not in concepts:
-                            concepts.append(word)
-                            
-                # Look for mathematical terms
-                math_terms = ['polynomial', 'equation', 'function', 'graph', 'theorem', 'formula']
-                for term in math_terms:
-                    if term.lower() in line.lower() and term.title() not in concepts:
-                        concepts.append(term.title())
+        # Capitalized terms in order of first appearance (simple heuristic), then mathematical terms
+        concepts = [word for word in dict.fromkeys(_TITLE_WORD.findall(pdf_content)) if word not in _CONCEPT_STOPWORDS]
+        content_lower = pdf_content.lower()
+        concepts.extend(term.title() for term in _MATH_TERMS if term in content_lower and term.title() not in concepts)
         
         return concepts[:5]  # Return top 5 concepts
 
     def generate_subject_specific_quiz(self, subject: str, topics: List[str], 
                                      grade: int, difficulty: str = "medium", 
-                                     language: str = "en") -> Dict:
-        """Generate a comprehensive quiz covering multiple topics"""
+                                     language: str = "en", max_parallel: Optional[int] = None,
+                                     batch_size: int = MAX_TOPICS_PER_BATCH) -> Dict:
+        """
+        Generate a comprehensive quiz covering multiple topics
+        
+        Blocks until done. Inside a running event loop the work runs on a
+        worker thread and still blocks that loop; async callers should await
+        agenerate_subject_specific_quiz instead.
+        """
+        return run_sync(self.agenerate_subject_specific_quiz(
+            subject, topics, grade, difficulty, language, max_parallel, batch_size
+        ))
+    
+    async def agenerate_subject_specific_quiz(self, subject: str, topics: List[str],
+                                              grade: int, difficulty: str = "medium",
+                                              language: str = "en", max_parallel: Optional[int] = None,
+                                              batch_size: int = MAX_TOPICS_PER_BATCH) -> Dict:
+        """
+        Generate a comprehensive quiz, asking for up to batch_size topics per request
+        
+        Batches run concurrently, at most max_parallel requests at a time
+        (defaults to OPENROUTER_MAX_PARALLEL or 10); questions keep the topic order and are numbered from 1.
+        batch_size=1 sends one request per topic.
+        """
+        
+        semaphore = asyncio.Semaphore(max_parallel or int(os.getenv("OPENROUTER_MAX_PARALLEL", "10")))
+        batch_size = max(1, batch_size)
+        topics = list(dict.fromkeys(topics))  # a repeated topic is requested and listed once
+        
         try:
-            all_questions = []
+            # Topics already in the per-topic quiz cache are not requested again
+            cached_quizzes = await asyncio.gather(
+                *(self._acached_topic_quiz(subject, topic, grade, difficulty, language) for topic in topics)
+            )
+            questions_by_topic: Dict[str, List[Dict]] = {
+                topic: cached.get("questions", [])
+                for topic, cached in zip(topics, cached_quizzes) if cached is not None
+            }
+            pending = [topic for topic in topics if topic not in questions_by_topic]
+            batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
             
-            for topic in topics:
-                topic_quiz = self.generate_quiz(
-                    subject=subject,
-                    topic=topic,
-                    grade=grade,
-                    question_count=3,  # 3 questions per topic
-                    difficulty=difficulty,
-                    language=language,
-                    include_pdfs=True
+            async with self.openrouter.async_client():
+                results = await asyncio.gather(
+                    *(self._aquiz_topic_batch(subject, batch, grade, difficulty, language, semaphore) for batch in batches),
+                    return_exceptions=True
                 )
-                
-                if topic_quiz.get("success") and topic_quiz.get("data"):
-                    quiz_data = topic_quiz["data"]
-                    if "questions" in quiz_data:
-                        all_questions.extend(quiz_data["questions"])
+            
+            for batch, result in zip(batches, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Quiz batch {batch} failed: {result}")
+                    continue
+                questions_by_topic.update(result)
+            
+            # Topic order, numbered across the whole quiz (each topic's questions start at 1)
+            all_questions = list(itertools.chain.from_iterable(questions_by_topic.pop(topic, ()) for topic in topics))
+            for question_id, question in enumerate(all_questions, 1):
+                question["id"] = question_id
             
             # Create comprehensive quiz
             comprehensive_quiz = {
@@ -568,18 +1265,128 @@ Respond with ONLY this JSON structure:
                 "data": None
             }
 
+    async def _acached_topic_quiz(self, subject: str, topic: str, grade: int, difficulty: str,
+                                  language: str, question_count: int = 3) -> Optional[Dict]:
+        """Cached quiz for one topic of a comprehensive quiz, looked up as a single-topic request would be"""
+        pdf_context = await asyncio.to_thread(self._extract_relevant_pdf_context, subject, topic, grade)
+        cache_keys = self._quiz_cache_keys(
+            subject, topic, grade, question_count, difficulty, _BATCH_QUESTION_TYPES,
+            language, pdf_context, self._get_curriculum_context(subject, grade)
+        )
+        return self._get_cached_quiz(topic, *cache_keys)
+    
+    async def _aquiz_topic_batch(self, subject: str, topics: List[str], grade: int, difficulty: str,
+                                 language: str, semaphore: asyncio.Semaphore,
+                                 question_count: int = 3) -> Dict[str, List[Dict]]:
+        """Questions per topic for one batch, halving the batch when a model's reply cannot be parsed"""
+        
+        if len(topics) == 1:
+            async with semaphore:
+                topic_quiz = await self.agenerate_quiz(
+                    subject=subject,
+                    topic=topics[0],
+                    grade=grade,
+                    question_count=question_count,
+                    difficulty=difficulty,
+                    language=language,
+                    include_pdfs=True
+                )
+            data = topic_quiz.get("data") or {}
+            return {topics[0]: data.get("questions", [])} if topic_quiz.get("success") else {}
+        
+        async with semaphore:
+            questions_by_topic = await self._generate_batched_with_openrouter(
+                subject, topics, grade, question_count, difficulty, language
+            )
+        if questions_by_topic is not None:
+            return questions_by_topic
+        
+        # Split and retry each half; smaller batches are more likely to come back well-formed
+        middle = len(topics) // 2
+        halves = await asyncio.gather(
+            self._aquiz_topic_batch(subject, topics[:middle], grade, difficulty, language, semaphore, question_count),
+            self._aquiz_topic_batch(subject, topics[middle:], grade, difficulty, language, semaphore, question_count)
+        )
+        return {**halves[0], **halves[1]}
+    
+    async def _generate_batched_with_openrouter(self, subject: str, topics: List[str], grade: int,
+                                                question_count: int, difficulty: str,
+                                                language: str) -> Optional[Dict[str, List[Dict]]]:
+        """
+        Request quizzes for several topics in one call
+        
+        Returns None if a model replied but the reply is unusable (the caller
+        splits the batch), or {} if no model answered at all, since smaller
+        batches would only walk the same model list again.
+        """
+        
+        pdf_contexts = await asyncio.gather(
+            *(asyncio.to_thread(self._extract_relevant_pdf_context, subject, topic, grade) for topic in topics)
+        )
+        curriculum_context = self._get_curriculum_context(subject, grade)
+        lang_text = "Hindi" if language == "hi" else "English"
+        
+        topic_lines = []
+        for index, (topic, pdf_context) in enumerate(zip(topics, pdf_contexts), 1):
+            topic_lines.append(f"{index}. {topic}")
+            if pdf_context:
+                topic_lines.append(f"   Textbook excerpt: {' '.join(pdf_context[:400].split())}")
+        context_info = f"\n\nCURRICULUM GUIDELINES:\n{curriculum_context}" if curriculum_context else ""
+        
+        user_prompt = _BATCH_USER_TMPL.format_map({
+            "question_count": question_count,
+            "subject": subject,
+            "grade": grade or 10,
+            "topic_list": '\n'.join(topic_lines),
+            "difficulty": difficulty,
+            "lang_text": lang_text,
+            "context_info": context_info
+        })
+        
+        messages = [
+            _QUIZ_SYSTEM_MESSAGE,
+            {"role": "user", "content": user_prompt}
+        ]
+        response = await self.openrouter._arequest_with_fallback(
+            messages, temperature=0.8,
+            max_tokens=min(2 * QUIZ_MAX_TOKENS, len(topics) * _quiz_max_tokens(question_count)),
+            model_override=self.model_name, response_format=_JSON_RESPONSE_FORMAT
+        )
+        if not response.get("success") or response.get("model") == "superior-educational-fallback":
+            logger.warning(f"No model answered the batched quiz request for {len(topics)} topics")
+            return {}
+        
+        json_text = extract_json_object(response["content"])
+        try:
+            quizzes = orjson.loads(json_text).get("quizzes") if json_text else None
+        except (orjson.JSONDecodeError, AttributeError):
+            quizzes = None
+        if not isinstance(quizzes, list) or len(quizzes) != len(topics):
+            logger.warning(f"Batched quiz reply unusable for {len(topics)} topics, splitting batch")
+            return None
+        
+        # Match by position; models sometimes reword the topic names
+        questions_by_topic = {}
+        for topic, pdf_context, quiz in zip(topics, pdf_contexts, quizzes):
+            questions = quiz.get("questions", []) if isinstance(quiz, dict) else []
+            quiz_data = self._add_enhanced_features(
+                {"questions": [question for question in questions if isinstance(question, dict)]},
+                subject, topic, grade, difficulty, language
+            )
+            if self._is_genuine_quiz(quiz_data, response.get("model")):
+                cache_keys = self._quiz_cache_keys(
+                    subject, topic, grade, question_count, difficulty, _BATCH_QUESTION_TYPES,
+                    language, pdf_context, curriculum_context
+                )
+                self._store_cached_quiz(topic, *cache_keys, quiz_data)
+            questions_by_topic[topic] = quiz_data["questions"]
+        return questions_by_topic
+    
     def create_adaptive_quiz(self, subject: str, topic: str, grade: int, 
                            student_level: str = "beginner", language: str = "en") -> Dict:
         """Create an adaptive quiz that adjusts to student level"""
         
-        # Map student level to difficulty and question types
-        level_mapping = {
-            "beginner": {"difficulty": "easy", "types": ["mcq", "true_false"]},
-            "intermediate": {"difficulty": "medium", "types": ["mcq", "short_answer"]},
-            "advanced": {"difficulty": "hard", "types": ["mcq", "short_answer", "numerical"]}
-        }
-        
-        config = level_mapping.get(student_level, level_mapping["intermediate"])
+        config = _ADAPTIVE_LEVELS.get(student_level, _ADAPTIVE_LEVELS["intermediate"])
         
         return self.generate_quiz(
             subject=subject,
@@ -587,15 +1394,117 @@ Respond with ONLY this JSON structure:
             grade=grade,
             question_count=10,
             difficulty=config["difficulty"],
-            question_types=config["types"],
+            question_types=list(config["types"]),
             language=language,
             include_pdfs=True
         )
+    
+    async def acreate_adaptive_quiz(self, subject: str, topic: str, grade: int,
+                                    student_level: str = "beginner", language: str = "en") -> Dict:
+        """Async variant of create_adaptive_quiz"""
+        
+        config = _ADAPTIVE_LEVELS.get(student_level, _ADAPTIVE_LEVELS["intermediate"])
+        
+        return await self.agenerate_quiz(
+            subject=subject,
+            topic=topic,
+            grade=grade,
+            question_count=10,
+            difficulty=config["difficulty"],
+            question_types=list(config["types"]),
+            language=language,
+            include_pdfs=True
+        )
+    
+    def create_adaptive_quiz_set(self, subject: str, topic: str, grade: int,
+                                 student_levels: Optional[List[str]] = None,
+                                 language: str = "en") -> Dict[str, Dict]:
+        """
+        Create adaptive quizzes for several student levels at once, keyed by level
+        
+        Blocks until done. Inside a running event loop the work runs on a
+        worker thread and still blocks that loop; async callers should await
+        acreate_adaptive_quiz_set instead.
+        """
+        return run_sync(self.acreate_adaptive_quiz_set(subject, topic, grade, student_levels, language))
+    
+    async def acreate_adaptive_quiz_set(self, subject: str, topic: str, grade: int,
+                                        student_levels: Optional[List[str]] = None,
+                                        language: str = "en") -> Dict[str, Dict]:
+        """Generate one adaptive quiz per student level concurrently"""
+        
+        levels = list(dict.fromkeys(student_levels or _ADAPTIVE_LEVELS))
+        async with self.openrouter.async_client():
+            results = await asyncio.gather(
+                *(self.acreate_adaptive_quiz(subject, topic, grade, level, language) for level in levels),
+                return_exceptions=True
+            )
+        return {
+            level: {"success": False, "error": str(result), "data": None} if isinstance(result, Exception) else result
+            for level, result in zip(levels, results)
+        }
+
+
+def shuffle_bank(question_bank: Dict, seed: Optional[int] = None) -> Dict:
+    """Copy of a question bank with every question's options shuffled
+
+    Correct answers are stored as option text, so they stay valid. A seed makes
+    the shuffle reproducible across the whole bank.
+    """
+    rng = random.Random(seed)
+    shuffle = rng.shuffle
+    shuffled_topics = {}
+    for topic, questions in question_bank.get("topics", {}).items():
+        shuffled = []
+        for question in questions:
+            options = list(question.get("options") or ())
+            shuffle(options)
+            shuffled.append({**question, "options": options})
+        shuffled_topics[topic] = shuffled
+    return {**question_bank, "topics": shuffled_topics}
+
+
+def score_attempt(question_bank: Dict, answers: Dict[str, List[Optional[str]]]) -> Dict:
+    """Score answers (per topic, aligned with the bank's questions) the way the backend grades quizzes
+
+    MCQ and true/false answers must match exactly; short and fill-in-the-blank
+    answers are compared case-insensitively. Other types are left for manual grading.
+    """
+    score = max_score = correct = 0
+    for topic, questions in question_bank.get("topics", {}).items():
+        given_answers = answers.get(topic, ())
+        for index, question in enumerate(questions):
+            points = question.get("points", 1)
+            max_score += points
+            given = given_answers[index] if index < len(given_answers) else None
+            if not given:
+                continue
+            expected = question.get("correctAnswer", question.get("correct_answer", ""))
+            question_type = question.get("type")
+            if question_type in ("mcq", "true_false"):
+                is_correct = given == expected
+            elif question_type in ("short_answer", "fill_blank"):
+                is_correct = given.strip().lower() == str(expected).strip().lower()
+            else:
+                is_correct = False
+            if is_correct:
+                score += points
+                correct += 1
+    
+    return {
+        "score": score,
+        "max_score": max_score,
+        "correct": correct,
+        "percentage": round(score * 100 / max_score, 2) if max_score else 0
+    }
 
 # Backward compatibility
 class QuizGenerator(EnhancedQuizGenerator):
     """Backward compatibility wrapper"""
-    pass
+    
+    # Plain-text quiz reply parser, compiled once
+    _RE_FIELD = re.compile(r'(Type|Points|Explanation|Answer|Correct Answer):\s*(.*)')
+    _RE_OPTION = re.compile(r'[A-Da-d]\)\s*(.*)')
     
     def _parse_quiz_response(self, response_text: str, subject: str, topic: str,
                            grade: Optional[int], difficulty: str) -> Dict:
@@ -630,126 +1539,227 @@ class QuizGenerator(EnhancedQuizGenerator):
         
         return quiz
     
-    def _extract_questions_from_text(self, text: str) -> List[Dict]:
+    def _extract_questions_from_text(self, text: str, pdf_context: str = "") -> List[Dict]:
         """Extract questions from the AI response text"""
         
+        questions = [question.to_dict() for question in self._parse_text_questions(text)]
+        
+        # If no questions were parsed, create sample questions
+        if not questions:
+            questions = self._create_sample_questions()
+        
+        return questions
+    
+    def _parse_text_questions(self, text: str) -> List[TextQuestion]:
+        """Parse "Q1: ..." style questions with their fields and A)-D) options"""
+        
         questions = []
-        lines = text.split('\n')
         current_question = None
         
-        for line in lines:
+        # Bound once: these run for every line of the reply
+        add_question = questions.append
+        match_field = self._RE_FIELD.match
+        match_option = self._RE_OPTION.match
+        
+        for line in text.split('\n'):
             line = line.strip()
             if not line:
                 continue
             
-            # Check if this is a new question
-            if (line.startswith('Q') and ':' in line) or (line.startswith('Question') and ':' in line):
+            # Check if this is a new question ("Q1: ..." or "Question 1: ...")
+            if line.startswith('Q') and ':' in line:
                 if current_question:
-                    questions.append(current_question)
-                
-                current_question = {
-                    "question": line.split(':', 1)[1].strip(),
-                    "type": "mcq",  # default
-                    "options": [],
-                    "correct_answer": "",
-                    "points": 1,
-                    "explanation": ""
-                }
+                    add_question(current_question)
+                current_question = TextQuestion(line.split(':', 1)[1].strip())
             
             elif current_question:
                 # Parse question details
-                if line.startswith('Type:'):
-                    current_question["type"] = line.split(':', 1)[1].strip().lower()
-                elif line.startswith('Points:'):
-                    try:
-                        current_question["points"] = int(line.split(':', 1)[1].strip())
-                    except:
-                        current_question["points"] = 1
-                elif line.startswith('Explanation:'):
-                    current_question["explanation"] = line.split(':', 1)[1].strip()
-                elif line.startswith('Answer:') or line.startswith('Correct Answer:'):
-                    current_question["correct_answer"] = line.split(':', 1)[1].strip()
-                elif line.startswith(('A)', 'B)', 'C)', 'D)', 'a)', 'b)', 'c)', 'd)')):
+                field_match = match_field(line)
+                if field_match:
+                    name, value = field_match.groups()
+                    if name == 'Type':
+                        current_question.type = value.lower()
+                    elif name == 'Points':
+                        try:
+                            current_question.points = int(value)
+                        except ValueError:
+                            current_question.points = 1
+                    elif name == 'Explanation':
+                        current_question.explanation = value
+                    else:
+                        current_question.correct_answer = value
+                    continue
+                
+                option = match_option(line)
+                if option:
                     # MCQ option
-                    option_text = line[2:].strip()
-                    current_question["options"].append(option_text)
+                    option_text = option.group(1)
+                    current_question.options.append(option_text)
                     if '*' in line or 'correct' in line.lower():
-                        current_question["correct_answer"] = option_text
+                        current_question.correct_answer = option_text
         
         # Add the last question
         if current_question:
-            questions.append(current_question)
-        
-        # If no questions were parsed, create sample questions
-        if not questions:
-            questions = self._create_sample_questions()
+            add_question(current_question)
         
         return questions
     
     def _create_sample_questions(self) -> List[Dict]:
         """Create sample questions if parsing fails"""
-        
-        return [
-            {
-                "question": "What is the main concept being tested?",
-                "type": "mcq",
-                "options": ["Option A", "Option B", "Option C", "Option D"],
-                "correct_answer": "Option A",
-                "points": 1,
-                "explanation": "This tests basic understanding of the concept."
-            },
-            {
-                "question": "True or False: This statement is correct.",
-                "type": "true_false",
-                "options": ["True", "False"],
-                "correct_answer": "True",
-                "points": 1,
-                "explanation": "This statement is true because..."
-            }
-        ]
+        # Callers may edit the questions, so copy the shared template's dicts and option lists
+        return [dict(question, options=list(question["options"])) for question in _SAMPLE_QUESTIONS]
     
     def generate_question_bank(self, subject: str, topics: List[str], 
-                             questions_per_topic: int = 20) -> Dict:
-        """Generate a question bank for multiple topics"""
+                             questions_per_topic: int = 20,
+                             save_path: Optional[str] = None,
+                             checkpoint_every: int = 0) -> Dict:
+        """
+        Generate a question bank for multiple topics
+        
+        With save_path the finished bank is written once at the end; partial
+        results are lost on interrupt unless checkpoint_every > 0, which also
+        rewrites the file after every that many completed topics.
+        """
+        created_at = datetime.now().isoformat()
+        questions_by_topic: Dict[str, List[Dict]] = {}
+        
+        for completed, (topic, questions) in enumerate(self.iter_question_bank(subject, topics, questions_per_topic), 1):
+            questions_by_topic[topic] = questions
+            if save_path and checkpoint_every and completed % checkpoint_every == 0:
+                self._save_question_bank(
+                    self._assemble_question_bank(subject, topics, questions_by_topic, created_at), save_path
+                )
+        
+        question_bank = self._assemble_question_bank(subject, topics, questions_by_topic, created_at)
+        if save_path:
+            self._save_question_bank(question_bank, save_path)
+        return question_bank
+    
+    def iter_question_bank(self, subject: str, topics: List[str],
+                           questions_per_topic: int = 20) -> Iterator[Tuple[str, List[Dict]]]:
+        """Yield (topic, questions) for each distinct topic as soon as its quiz is generated; failed topics are skipped"""
+        # Repeated topics share one request; repeats across calls hit the quiz cache in generate_quiz
+        unique_topics = list(dict.fromkeys(topics))
+        if not unique_topics:
+            return
         
+        # Each topic is an independent, network-bound request
+        with ThreadPoolExecutor(max_workers=min(QUESTION_BANK_WORKERS, len(unique_topics))) as executor:
+            futures = {
+                executor.submit(
+                    self.generate_quiz,
+                    subject=subject,
+                    topic=topic,
+                    question_count=questions_per_topic,
+                    difficulty="medium"
+                ): topic
+                for topic in unique_topics
+            }
+            try:
+                for future in as_completed(futures):
+                    quiz_result = future.result()
+                    if quiz_result["success"]:
+                        # Take ownership of the list so the rest of the result can be freed right away
+                        questions = quiz_result["data"].pop("questions")
+                        del quiz_result
+                        yield futures[future], questions
+            finally:
+                # Consumer stopped early: drop topics that have not started yet
+                for future in futures:
+                    future.cancel()
+    
+    @staticmethod
+    def _assemble_question_bank(subject: str, topics: List[str], questions_by_topic: Dict[str, List[Dict]],
+                                created_at: str) -> Dict:
+        """Question bank of the topics generated so far, in the requested topic order"""
         question_bank = {
             "subject": subject,
             "topics": {},
             "total_questions": 0,
-            "created_at": datetime.now().isoformat()
+            "created_at": created_at
         }
-        
-        for topic in topics:
-            quiz_result = self.generate_quiz(
-                subject=subject,
-                topic=topic,
-                question_count=questions_per_topic,
-                difficulty="medium"
-            )
-            
-            if quiz_result["success"]:
-                question_bank["topics"][topic] = quiz_result["data"]["questions"]
-                question_bank["total_questions"] += len(quiz_result["data"]["questions"])
-        
+        for topic in dict.fromkeys(topics):
+            questions = questions_by_topic.get(topic)
+            if questions is not None:
+                question_bank["topics"][topic] = questions
+                question_bank["total_questions"] += len(questions)
         return question_bank
     
+    def _save_question_bank(self, question_bank: Dict, filename: str) -> bool:
+        """Save a question bank as NDJSON for .ndjson paths, otherwise as a JSON document"""
+        if filename.endswith('.ndjson'):
+            return self.save_question_bank_ndjson(question_bank, filename)
+        return self.save_quiz(question_bank, filename)
+    
+    def save_question_bank_ndjson(self, question_bank: Dict, filename: str) -> bool:
+        """Save a question bank as NDJSON: a header line, then one {"topic", "question"} record per line"""
+        try:
+            with _atomic_output(filename) as fd, open(fd, 'wb', closefd=False) as f:
+                f.write(orjson.dumps({
+                    "subject": question_bank.get("subject"),
+                    "created_at": question_bank.get("created_at"),
+                    "total_questions": question_bank.get("total_questions", 0),
+                    "topics": list(question_bank.get("topics", {}))
+                }) + b"\n")
+                for topic, questions in question_bank.get("topics", {}).items():
+                    for question in questions:
+                        f.write(orjson.dumps({"topic": topic, "question": question}) + b"\n")
+            return True
+        except Exception:
+            logger.exception("Error saving question bank to %s", filename)
+            return False
+    
+    def load_question_bank_ndjson(self, filename: str) -> Optional[Dict]:
+        """Load a question bank written by save_question_bank_ndjson"""
+        try:
+            with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                header = orjson.loads(mapped.readline())
+                question_bank = {
+                    "subject": header.get("subject"),
+                    "topics": {topic: [] for topic in header.get("topics", [])},
+                    "total_questions": header.get("total_questions", 0),
+                    "created_at": header.get("created_at")
+                }
+                for line in iter(mapped.readline, b""):
+                    if line.strip():
+                        record = orjson.loads(line)
+                        question_bank["topics"].setdefault(record["topic"], []).append(record["question"])
+            return question_bank
+        except Exception:
+            logger.exception("Error loading question bank from %s", filename)
+            return None
+    
     def save_quiz(self, quiz: Dict, filename: str) -> bool:
-        """Save quiz to JSON file"""
+        """Save quiz to a compact JSON file"""
+        return self._write_quiz_json(quiz, filename)
+    
+    def save_quiz_pretty(self, quiz: Dict, filename: str) -> bool:
+        """Save quiz to an indented JSON file for human inspection"""
+        return self._write_quiz_json(quiz, filename, orjson.OPT_INDENT_2)
+    
+    @staticmethod
+    def _write_quiz_json(quiz: Dict, filename: str, option: int = 0) -> bool:
+        """Serialize quiz with orjson and write it to filename"""
         try:
-            with open(filename, 'w') as f:
-                json.dump(quiz, f, indent=2)
+            data = memoryview(orjson.dumps(quiz, option=option))
+            # orjson already produced UTF-8 bytes, so write them straight to the descriptor
+            with _atomic_output(filename) as fd:
+                while data:
+                    data = data[os.write(fd, data):]
             return True
-        except Exception as e:
-            print(f"Error saving quiz: {e}")
+        except Exception:
+            logger.exception("Error saving quiz to %s", filename)
             return False
     
     def load_quiz(self, filename: str) -> Optional[Dict]:
         """Load quiz from JSON file"""
         try:
-            with open(filename, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading quiz: {e}")
+            # Parse straight from the page cache instead of reading a copy of the file first
+            with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    return orjson.loads(view)
+        except Exception:
+            logger.exception("Error loading quiz from %s", filename)
             return None
 
 # Example usage
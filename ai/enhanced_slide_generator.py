@@ -3,161 +3,50 @@ Enhanced Slide Generation Module
 Uses OpenRouter Claude 3.5 Sonnet for superior educational slide generation
 """
 
-import json
+import asyncio
+import functools
+import itertools
 import logging
-from typing import Dict, List, Optional, Any
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
 from datetime import datetime
 import os
-from openrouter_service import OpenRouterService
+import threading
+import orjson
+from openrouter_service import PROMPT_CACHING_HEADERS, get_shared_openrouter, run_sync
+from json_stream import IncrementalJSONScanner, extract_json_object, repair_json
+from response_cache import DiskCache, ResponseCache, compact_json, normalize_text
 
 logger = logging.getLogger(__name__)
 
-class EnhancedSlideGenerator:
-    """Enhanced slide generator using OpenRouter Claude 3.5 Sonnet"""
-    
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the enhanced slide generator"""
-        self.openrouter = OpenRouterService(api_key)
-        self.model_name = "openai/gpt-oss-120b:free"  # Specific model for slide generation
-        
-        # Load slide templates and themes
-        self.templates = self._load_slide_templates()
-        self.themes = self._load_slide_themes()
-        
-    def _load_slide_templates(self) -> Dict:
-        """Load slide templates for different educational contexts"""
-        return {
-            "introduction": {
-                "structure": ["Title", "Learning Objectives", "Overview"],
-                "focus": "Setting context and expectations"
-            },
-            "concept_explanation": {
-                "structure": ["Concept Title", "Definition", "Key Points", "Examples"],
-                "focus": "Clear concept presentation with examples"
-            },
-            "problem_solving": {
-                "structure": ["Problem Statement", "Approach", "Step-by-step Solution", "Verification"],
-                "focus": "Methodical problem-solving approach"
-            },
-            "comparison": {
-                "structure": ["Items to Compare", "Comparison Table", "Key Differences", "Summary"],
-                "focus": "Side-by-side comparison with analysis"
-            },
-            "application": {
-                "structure": ["Real-world Context", "Application Examples", "Benefits", "Challenges"],
-                "focus": "Practical applications and relevance"
-            },
-            "summary": {
-                "structure": ["Key Takeaways", "Important Formulas", "Next Steps", "Questions"],
-                "focus": "Consolidation and reinforcement"
-            }
-        }
-    
-    def _load_slide_themes(self) -> Dict:
-        """Load visual themes for slides"""
-        return {
-            "modern_education": {
-                "colors": ["#2E86AB", "#A23B72", "#F18F01", "#C73E1D"],
-                "style": "Clean, modern with good contrast",
-                "fonts": "Sans-serif, readable"
-            },
-            "scientific": {
-                "colors": ["#0077BE", "#00A86B", "#FFD700", "#DC143C"],
-                "style": "Professional, data-focused",
-                "fonts": "Technical, precise"
-            },
-            "creative": {
-                "colors": ["#FF6B6B", "#4ECDC4", "#45B7D1", "#96CEB4"],
-                "style": "Vibrant, engaging",
-                "fonts": "Creative, approachable"
-            },
-            "minimal": {
-                "colors": ["#2C3E50", "#E74C3C", "#3498DB", "#2ECC71"],
-                "style": "Simple, focused",
-                "fonts": "Clean, minimal"
-            }
-        }
-    
-    def generate_slides(self, 
-                       subject: str,
-                       topic: str,
-                       grade: Optional[int] = None,
-                       slide_count: int = 10,
-                       theme: str = "modern_education",
-                       template: str = "mixed",
-                       difficulty: str = "intermediate",
-                       include_images: bool = True,
-                       language: str = "en",
-                       **kwargs) -> Dict:
-        """
-        Generate superior educational slides using OpenRouter Claude 3.5 Sonnet
-        
-        Args:
-            subject: Subject name
-            topic: Topic for the presentation
-            grade: Grade level (optional)
-            slide_count: Number of slides to generate
-            theme: Visual theme (modern_education, scientific, creative, minimal)
-            template: Template type (mixed, introduction, concept_explanation, etc.)
-            difficulty: Content difficulty (beginner, intermediate, advanced)
-            include_images: Whether to include image suggestions
-            language: Language code (en/hi)
-            
-        Returns:
-            Dictionary containing the generated slides with enhanced quality
-        """
-        
-        try:
-            # Generate slides using OpenRouter
-            slides_response = self._generate_with_openrouter(
-                subject, topic, grade, slide_count, theme, template, 
-                difficulty, include_images, language
-            )
-            
-            if slides_response.get("success"):
-                slides_data = self._parse_and_enhance_slides(
-                    slides_response["content"], subject, topic, grade, 
-                    theme, difficulty, language, slide_count
-                )
-                
-                return {
-                    "success": True,
-                    "data": slides_data,
-                    "generated_at": datetime.now().isoformat(),
-                    "model": "claude-3.5-sonnet",
-                    "enhanced_features": {
-                        "visual_design": True,
-                        "interactive_elements": include_images,
-                        "ncert_aligned": True,
-                        "pedagogically_sound": True
-                    }
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": slides_response.get("error", "Unknown error"),
-                    "data": None
-                }
-                
-        except Exception as e:
-            logger.error(f"Slide generation error: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "data": None
-            }
-    
-    def _generate_with_openrouter(self, subject: str, topic: str, grade: Optional[int],
-                                slide_count: int, theme: str, template: str,
-                                difficulty: str, include_images: bool, language: str) -> Dict:
-        """Generate slides using OpenRouter Claude 3.5 Sonnet with enhanced prompts"""
-        
-        grade_text = f" for Grade {grade} students" if grade else ""
-        lang_text = "Hindi" if language == "hi" else "English"
-        theme_info = self.themes.get(theme, self.themes["modern_education"])
-        
-        # Create comprehensive system prompt
-        system_prompt = f"""You are an expert educational slide designer and instructional technologist with deep expertise in:
+# Generated presentations are kept in memory and on disk, so restarts and other workers reuse them
+SLIDE_CACHE_TTL = 7 * 24 * 3600
+SLIDE_CACHE_DIR = os.getenv("SLIDE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'slides'))
+
+# Output budget for one presentation
+SLIDE_MAX_TOKENS = 4000
+
+# Path of each slide object in the streamed reply, as reported by IncrementalJSONScanner
+_STREAMED_SLIDE_PATH = (None, "presentation", "slides", None)
+
+# Ask providers that support it for a bare JSON object (no fences or prose)
+_JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+# Presentations fused into one request by generate_slides_batch
+MAX_DECKS_PER_BATCH = 3
+
+# generate_slides defaults, applied to each generate_slides_batch request
+_SLIDE_DEFAULTS = {
+    "grade": None,
+    "slide_count": 10,
+    "theme": "modern_education",
+    "template": "mixed",
+    "difficulty": "intermediate",
+    "include_images": True,
+    "language": "en"
+}
+
+SLIDE_SYSTEM_PROMPT = """You are an expert educational slide designer and instructional technologist with deep expertise in:
 - NCERT curriculum standards and pedagogy
 - Visual design principles for education
 - Cognitive load theory and learning psychology
@@ -175,20 +64,59 @@ Design principles you must follow:
 6. Accessibility considerations
 7. Cultural relevance for Indian students"""
 
-        # Create detailed user prompt
-        user_prompt = f"""Create exceptional educational slides on "{topic}" in {subject}{grade_text}.
+# Several presentations in one request, filled with str.format_map (literal braces are doubled)
+_BATCH_USER_TMPL = """Create {deck_count} separate educational slide presentations, one for EACH request below.
 
-SLIDE SPECIFICATIONS:
-- Subject: {subject}
-- Topic: {topic}
-- Grade Level: {grade if grade else 'General'}
-- Number of Slides: {slide_count}
+{request_list}
+
+SHARED SPECIFICATIONS:
 - Language: {lang_text}
 - Difficulty: {difficulty}
-- Theme: {theme} ({theme_info['style']})
+- Template: {template}
+- Theme: {theme} ({style}); colors {colors}; fonts {fonts}
 - Include Images: {include_images}
 
-ENHANCED REQUIREMENTS (Must exceed ChatGPT quality):
+Every presentation needs clear learning objectives, progressive difficulty, real-world examples
+relevant to Indian students, interactive elements, speaker notes with teaching tips and assessment
+checkpoints, and must align with the NCERT curriculum.
+
+Return ONLY a valid JSON object, with one entry per request in the order given:
+{{
+    "presentations": [
+        {{
+            "requestId": 1,
+            "presentation": {{
+                "title": "Presentation title",
+                "description": "One-line description",
+                "learningObjectives": ["Clear, measurable learning objective"],
+                "slides": [
+                    {{
+                        "slideNumber": 1,
+                        "type": "title|content|activity|summary",
+                        "title": "Slide title",
+                        "content": {{
+                            "mainPoints": ["Key point"],
+                            "explanation": "Detailed explanation of concepts",
+                            "examples": ["Real-world example"],
+                            "formulas": ["Mathematical formulas if applicable"],
+                            "diagrams": ["Description of visual elements needed"]
+                        }},
+                        "visualElements": {{"images": ["Image description"], "layout": "Layout description"}},
+                        "interactiveElements": ["Student activity or question"],
+                        "speakerNotes": "Detailed teaching notes and tips",
+                        "assessmentCheckpoint": "Quick check question or activity"
+                    }}
+                ],
+                "additionalResources": ["NCERT textbook references"],
+                "assessmentStrategy": "How to assess student understanding"
+            }}
+        }}
+    ]
+}}"""
+
+
+# Request-independent instructions, sent ahead of the per-theme design notes and schema
+_SLIDE_INSTRUCTIONS = """ENHANCED REQUIREMENTS (Must exceed ChatGPT quality):
 1. Each slide must have clear learning objectives
 2. Progressive difficulty from basic to advanced concepts
 3. Include real-world applications and examples
@@ -216,33 +144,37 @@ CONTENT QUALITY STANDARDS:
 - Superior visual design suggestions
 - Enhanced interactivity
 
-VISUAL DESIGN (Theme: {theme}):
-- Color scheme: {', '.join(theme_info['colors'])}
-- Style: {theme_info['style']}
-- Fonts: {theme_info['fonts']}
+"""
 
-Return ONLY a valid JSON object in this exact format:
-{{
-    "presentation": {{
-        "title": "Comprehensive {topic} - {subject}",
-        "subject": "{subject}",
-        "topic": "{topic}",
-        "grade": {grade if grade else 10},
-        "difficulty": "{difficulty}",
-        "language": "{language}",
-        "theme": "{theme}",
-        "totalSlides": {slide_count},
-        "estimatedDuration": {slide_count * 3},
-        "description": "NCERT-aligned comprehensive presentation on {topic}",
+_SLIDE_THEME_TMPL = """VISUAL DESIGN (Theme: {theme}):
+- Color scheme: {colors}
+- Style: {style}
+- Fonts: {fonts}
+
+"""
+
+_SLIDE_SCHEMA = """Return ONLY a valid JSON object in this exact format (placeholders in <> come from the request below):
+{
+    "presentation": {
+        "title": "<title>",
+        "subject": "<subject>",
+        "topic": "<topic>",
+        "grade": <grade>,
+        "difficulty": "<difficulty>",
+        "language": "<language>",
+        "theme": "<theme>",
+        "totalSlides": <slide count>,
+        "estimatedDuration": <minutes>,
+        "description": "NCERT-aligned comprehensive presentation on <topic>",
         "learningObjectives": [
             "Clear, measurable learning objectives"
         ],
         "slides": [
-            {{
+            {
                 "slideNumber": 1,
                 "type": "title|content|activity|summary",
                 "title": "Slide title",
-                "content": {{
+                "content": {
                     "mainPoints": [
                         "Key point 1",
                         "Key point 2"
@@ -254,13 +186,13 @@ Return ONLY a valid JSON object in this exact format:
                     ],
                     "formulas": ["Mathematical formulas if applicable"],
                     "diagrams": ["Description of visual elements needed"]
-                }},
-                "visualElements": {{
+                },
+                "visualElements": {
                     "images": ["Image description 1", "Image description 2"],
                     "charts": ["Chart description"],
                     "animations": ["Animation suggestion"],
                     "layout": "Layout description"
-                }},
+                },
                 "interactiveElements": [
                     "Student activity or question",
                     "Discussion prompt"
@@ -268,7 +200,7 @@ Return ONLY a valid JSON object in this exact format:
                 "speakerNotes": "Detailed teaching notes and tips",
                 "assessmentCheckpoint": "Quick check question or activity",
                 "transitionToNext": "How this connects to next slide"
-            }}
+            }
         ],
         "additionalResources": [
             "NCERT textbook references",
@@ -280,9 +212,9 @@ Return ONLY a valid JSON object in this exact format:
             "Activities for advanced students",
             "Real-world projects"
         ]
-    }},
-    "metadata": {{
-        "createdAt": "{datetime.now().isoformat()}",
+    },
+    "metadata": {
+        "createdAt": "<ISO 8601 timestamp>",
         "ncertAligned": true,
         "aiModel": "claude-3.5-sonnet",
         "qualityLevel": "superior-to-chatgpt",
@@ -292,37 +224,597 @@ Return ONLY a valid JSON object in this exact format:
             "Interactive engagement",
             "Accessibility"
         ]
-    }}
-}}"""
+    }
+}"""
+
+# Per-request tail of the prompt, filled with str.format_map after the cached prefix
+_SLIDE_REQUEST_TMPL = """Create exceptional educational slides on "{topic}" in {subject}{grade_text}.
+
+SLIDE SPECIFICATIONS:
+- Subject: {subject}
+- Topic: {topic}
+- Grade Level: {grade_level}
+- Number of Slides: {slide_count}
+- Language: {lang_text}
+- Difficulty: {difficulty}
+- Theme: {theme} ({style})
+- Include Images: {include_images}
+
+Schema values: title "Comprehensive {topic} - {subject}", grade {grade_value}, language "{language}", totalSlides {slide_count}, estimatedDuration {duration}."""
+
+
+# Slide templates for different educational contexts (shared, read-only)
+_SLIDE_TEMPLATES = MappingProxyType({
+    "introduction": {
+        "structure": ["Title", "Learning Objectives", "Overview"],
+        "focus": "Setting context and expectations"
+    },
+    "concept_explanation": {
+        "structure": ["Concept Title", "Definition", "Key Points", "Examples"],
+        "focus": "Clear concept presentation with examples"
+    },
+    "problem_solving": {
+        "structure": ["Problem Statement", "Approach", "Step-by-step Solution", "Verification"],
+        "focus": "Methodical problem-solving approach"
+    },
+    "comparison": {
+        "structure": ["Items to Compare", "Comparison Table", "Key Differences", "Summary"],
+        "focus": "Side-by-side comparison with analysis"
+    },
+    "application": {
+        "structure": ["Real-world Context", "Application Examples", "Benefits", "Challenges"],
+        "focus": "Practical applications and relevance"
+    },
+    "summary": {
+        "structure": ["Key Takeaways", "Important Formulas", "Next Steps", "Questions"],
+        "focus": "Consolidation and reinforcement"
+    }
+})
+
+# Visual themes for slides (shared, read-only)
+_SLIDE_THEMES = MappingProxyType({
+    "modern_education": {
+        "colors": ["#2E86AB", "#A23B72", "#F18F01", "#C73E1D"],
+        "style": "Clean, modern with good contrast",
+        "fonts": "Sans-serif, readable"
+    },
+    "scientific": {
+        "colors": ["#0077BE", "#00A86B", "#FFD700", "#DC143C"],
+        "style": "Professional, data-focused",
+        "fonts": "Technical, precise"
+    },
+    "creative": {
+        "colors": ["#FF6B6B", "#4ECDC4", "#45B7D1", "#96CEB4"],
+        "style": "Vibrant, engaging",
+        "fonts": "Creative, approachable"
+    },
+    "minimal": {
+        "colors": ["#2C3E50", "#E74C3C", "#3498DB", "#2ECC71"],
+        "style": "Simple, focused",
+        "fonts": "Clean, minimal"
+    }
+})
+
+# Theme design notes, formatted once per theme
+_THEME_FRAGMENTS = MappingProxyType({
+    name: _SLIDE_THEME_TMPL.format(
+        theme=name, colors=", ".join(info["colors"]), style=info["style"], fonts=info["fonts"]
+    )
+    for name, info in _SLIDE_THEMES.items()
+})
+
+# Complete cacheable prompt prefix for each theme; unknown themes use modern_education
+_STATIC_PROMPTS = MappingProxyType({
+    name: f"{SLIDE_SYSTEM_PROMPT}\n\n{_SLIDE_INSTRUCTIONS}{fragment}{_SLIDE_SCHEMA}"
+    for name, fragment in _THEME_FRAGMENTS.items()
+})
 
+
+@functools.lru_cache(maxsize=512)
+def _slide_request_prompt(subject: str, topic: str, grade: Optional[int], slide_count: int, theme: str,
+                          difficulty: str, include_images: bool, language: str) -> str:
+    """Per-request tail of the slide prompt; repeated requests reuse the same string"""
+    return _SLIDE_REQUEST_TMPL.format_map({
+        "subject": subject,
+        "topic": topic,
+        "grade_text": f" for Grade {grade} students" if grade else "",
+        "grade_level": grade if grade else "General",
+        "grade_value": grade if grade else 10,
+        "slide_count": slide_count,
+        "duration": slide_count * 3,
+        "lang_text": "Hindi" if language == "hi" else "English",
+        "language": language,
+        "difficulty": difficulty,
+        "theme": theme,
+        "style": _SLIDE_THEMES.get(theme, _SLIDE_THEMES["modern_education"])["style"],
+        "include_images": include_images
+    })
+
+
+class EnhancedSlideGenerator:
+    """Enhanced slide generator using OpenRouter Claude 3.5 Sonnet"""
+    
+    def __init__(self, api_key: Optional[str] = None):
+        """Initialize the enhanced slide generator"""
+        self.openrouter = get_shared_openrouter(api_key)
+        self.model_name = "openai/gpt-oss-120b:free"  # Specific model for slide generation
+        self._response_cache = ResponseCache(ttl=SLIDE_CACHE_TTL, max_entries=256)
+        self._disk_cache = DiskCache(SLIDE_CACHE_DIR, ttl=SLIDE_CACHE_TTL)
+        
+        # Slide templates, themes and per-theme prompts are shared module constants
+        self.templates = _SLIDE_TEMPLATES
+        self.themes = _SLIDE_THEMES
+        self._static_prompts = _STATIC_PROMPTS
+        
+    def _load_slide_templates(self) -> Mapping[str, Dict]:
+        """Load slide templates for different educational contexts"""
+        return _SLIDE_TEMPLATES
+    
+    def _load_slide_themes(self) -> Mapping[str, Dict]:
+        """Load visual themes for slides"""
+        return _SLIDE_THEMES
+    
+    def generate_slides(self, 
+                       subject: str,
+                       topic: str,
+                       grade: Optional[int] = None,
+                       slide_count: int = 10,
+                       theme: str = "modern_education",
+                       template: str = "mixed",
+                       difficulty: str = "intermediate",
+                       include_images: bool = True,
+                       language: str = "en",
+                       **kwargs) -> Dict:
+        """
+        Generate superior educational slides using OpenRouter Claude 3.5 Sonnet
+        
+        Args:
+            subject: Subject name
+            topic: Topic for the presentation
+            grade: Grade level (optional)
+            slide_count: Number of slides to generate
+            theme: Visual theme (modern_education, scientific, creative, minimal)
+            template: Template type (mixed, introduction, concept_explanation, etc.)
+            difficulty: Content difficulty (beginner, intermediate, advanced)
+            include_images: Whether to include image suggestions
+            language: Language code (en/hi)
+            no_cache: Set to True to bypass the slide cache
+            
+        Returns:
+            Dictionary containing the generated slides with enhanced quality
+        """
+        use_cache = not kwargs.get("no_cache", False)
+        cache_key = self._slides_cache_key(
+            subject, topic, grade, slide_count, theme, template, difficulty, include_images, language
+        )
+        cached = self._get_cached_slides(cache_key) if use_cache else None
+        if cached is not None:
+            return self._slides_result(cached, include_images, cached=True)
+        
+        try:
+            # Generate slides using OpenRouter
+            slides_response = self._generate_with_openrouter(
+                subject, topic, grade, slide_count, theme, template, 
+                difficulty, include_images, language
+            )
+            
+            return self._build_slides_result(
+                slides_response, cache_key if use_cache else None, subject, topic, grade,
+                slide_count, theme, difficulty, include_images, language
+            )
+                
+        except Exception as e:
+            logger.error(f"Slide generation error: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "data": None
+            }
+    
+    async def agenerate_slides(self, 
+                               subject: str,
+                               topic: str,
+                               grade: Optional[int] = None,
+                               slide_count: int = 10,
+                               theme: str = "modern_education",
+                               template: str = "mixed",
+                               difficulty: str = "intermediate",
+                               include_images: bool = True,
+                               language: str = "en",
+                               **kwargs) -> Dict:
+        """Async variant of generate_slides so several presentations can be generated concurrently"""
+        use_cache = not kwargs.get("no_cache", False)
+        cache_key = self._slides_cache_key(
+            subject, topic, grade, slide_count, theme, template, difficulty, include_images, language
+        )
+        cached = self._get_cached_slides(cache_key) if use_cache else None
+        if cached is not None:
+            return self._slides_result(cached, include_images, cached=True)
+        
+        try:
+            messages = self._build_messages(
+                subject, topic, grade, slide_count, theme, template, difficulty, include_images, language
+            )
+            slides_response = await self.openrouter._arequest_with_fallback(
+                messages, temperature=0.7, max_tokens=SLIDE_MAX_TOKENS, model_override=self.model_name,
+                response_format=_JSON_RESPONSE_FORMAT, extra_headers=PROMPT_CACHING_HEADERS
+            )
+            
+            return self._build_slides_result(
+                slides_response, cache_key if use_cache else None, subject, topic, grade,
+                slide_count, theme, difficulty, include_images, language
+            )
+                
+        except Exception as e:
+            logger.error(f"Slide generation error: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "data": None
+            }
+    
+    async def agenerate_many(self, specs: List[Dict], max_parallel: Optional[int] = None) -> List[Dict]:
+        """
+        Generate several presentations concurrently, one request each
+        
+        Args:
+            specs: Keyword arguments for agenerate_slides, one dict per presentation
+            max_parallel: Maximum concurrent requests (defaults to OPENROUTER_MAX_PARALLEL or 4)
+            
+        Returns:
+            Results in the same order as specs
+        """
+        semaphore = asyncio.Semaphore(max(1, max_parallel or int(os.getenv("OPENROUTER_MAX_PARALLEL", "4"))))
+        
+        async def generate(spec: Dict) -> Dict:
+            async with semaphore:
+                return await self.agenerate_slides(**spec)
+        
+        async with self.openrouter.async_client():
+            results = await asyncio.gather(*(generate(spec) for spec in specs), return_exceptions=True)
+        return [
+            {"success": False, "error": str(result), "data": None} if isinstance(result, Exception) else result
+            for result in results
+        ]
+    
+    def generate_slides_batch(self, requests: List[Dict], max_parallel: Optional[int] = None) -> List[Dict]:
+        """
+        Generate several presentations with fewer API calls
+        
+        Requests that share theme, template, difficulty, language and image
+        settings are sent up to MAX_DECKS_PER_BATCH per prompt. Presentations
+        missing from a batched reply are generated individually. Inside a
+        running event loop the work runs on a worker thread and still blocks
+        that loop; async callers should await agenerate_slides_batch instead.
+        
+        Args:
+            requests: Keyword arguments for generate_slides, one dict per presentation
+            max_parallel: Maximum concurrent requests (defaults to OPENROUTER_MAX_PARALLEL or 4)
+            
+        Returns:
+            Results in the same order as requests, in the generate_slides format
+        """
+        return run_sync(self.agenerate_slides_batch(requests, max_parallel))
+    
+    async def agenerate_slides_batch(self, requests: List[Dict], max_parallel: Optional[int] = None) -> List[Dict]:
+        """Async variant of generate_slides_batch; batches run concurrently"""
+        specs = [{**_SLIDE_DEFAULTS, **request} for request in requests]
+        semaphore = asyncio.Semaphore(max(1, max_parallel or int(os.getenv("OPENROUTER_MAX_PARALLEL", "4"))))
+        cache_keys = [None if spec.get("no_cache") else self._spec_cache_key(spec) for spec in specs]
+        
+        # Cached presentations are answered up front and never sent to the model
+        results: Dict[int, Dict] = {}
+        groups: Dict[Tuple, List[int]] = {}
+        for index, spec in enumerate(specs):
+            cached = self._get_cached_slides(cache_keys[index]) if cache_keys[index] else None
+            if cached is not None:
+                results[index] = self._slides_result(cached, spec["include_images"], cached=True)
+            else:
+                groups.setdefault(self._slide_batch_key(spec), []).append(index)
+        batches = [
+            indices[start:start + MAX_DECKS_PER_BATCH]
+            for indices in groups.values()
+            for start in range(0, len(indices), MAX_DECKS_PER_BATCH)
+        ]
+        
+        async def generate(batch: List[int]) -> Dict[int, Dict]:
+            decks: Dict[int, Dict] = {}
+            if len(batch) > 1:
+                try:
+                    async with semaphore:
+                        decks = await self._agenerate_slide_batch([specs[i] for i in batch])
+                except Exception as e:
+                    logger.warning(f"Batched slide generation failed: {e}")
+            
+            results = {}
+            for position, index in enumerate(batch):
+                if position in decks:
+                    if cache_keys[index]:
+                        self._store_cached_slides(cache_keys[index], decks[position])
+                    results[index] = self._slides_result(decks[position], specs[index]["include_images"])
+            for index in batch:
+                if index not in results:
+                    async with semaphore:
+                        results[index] = await self.agenerate_slides(**specs[index])
+            return results
+        
+        async with self.openrouter.async_client():
+            for batch_results in await asyncio.gather(*(generate(batch) for batch in batches)):
+                results.update(batch_results)
+        return [results[index] for index in range(len(specs))]
+    
+    def _spec_cache_key(self, spec: Dict) -> str:
+        """Cache key for a generate_slides keyword-argument dict with defaults applied"""
+        return self._slides_cache_key(
+            spec["subject"], spec["topic"], spec["grade"], spec["slide_count"], spec["theme"],
+            spec["template"], spec["difficulty"], spec["include_images"], spec["language"]
+        )
+    
+    @staticmethod
+    def _slide_batch_key(spec: Dict) -> Tuple:
+        """Settings a presentation must share with the others in its batch"""
+        return (spec["theme"], spec["template"], spec["difficulty"], spec["language"], bool(spec["include_images"]))
+    
+    async def _agenerate_slide_batch(self, specs: List[Dict]) -> Dict[int, Dict]:
+        """Request several presentations in one call; enhanced slide data by position in specs"""
+        shared = specs[0]
+        theme_info = self.themes.get(shared["theme"], self.themes["modern_education"])
+        
+        request_list = []
+        for request_id, spec in enumerate(specs, 1):
+            request_list.append(
+                f"===REQ {request_id}===\n"
+                f"Subject: {spec['subject']}\nTopic: {spec['topic']}\n"
+                f"Grade Level: {spec['grade'] or 'General'}\nNumber of Slides: {spec['slide_count']}"
+            )
+        
+        user_prompt = _BATCH_USER_TMPL.format_map({
+            "deck_count": len(specs),
+            "request_list": "\n\n".join(request_list),
+            "lang_text": "Hindi" if shared["language"] == "hi" else "English",
+            "difficulty": shared["difficulty"],
+            "template": shared["template"],
+            "theme": shared["theme"],
+            "style": theme_info["style"],
+            "colors": ", ".join(theme_info["colors"]),
+            "fonts": theme_info["fonts"],
+            "include_images": shared["include_images"]
+        })
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SLIDE_SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ]
+        response = await self.openrouter._arequest_with_fallback(
+            messages, temperature=0.7, max_tokens=SLIDE_MAX_TOKENS * len(specs), model_override=self.model_name,
+            response_format=_JSON_RESPONSE_FORMAT
+        )
+        if not response.get("success"):
+            return {}
+        
+        json_text = extract_json_object(response["content"])
+        try:
+            presentations = orjson.loads(json_text).get("presentations") if json_text else None
+        except (orjson.JSONDecodeError, AttributeError):
+            presentations = None
+        if not isinstance(presentations, list):
+            logger.warning(f"Batched slide reply unusable for {len(specs)} presentations")
+            return {}
         
-        return self.openrouter._request_with_fallback(messages, temperature=0.7, max_tokens=4000, model_override=self.model_name)
+        # Match by requestId, falling back to position when the model omits or garbles it
+        by_id = {}
+        for position, entry in enumerate(presentations):
+            if not isinstance(entry, dict):
+                continue
+            request_id = entry.get("requestId")
+            slot = request_id - 1 if isinstance(request_id, int) and 0 < request_id <= len(specs) else position
+            if slot < len(specs) and slot not in by_id and isinstance(entry.get("presentation"), dict):
+                by_id[slot] = entry["presentation"]
+        
+        decks = {}
+        for slot, presentation in by_id.items():
+            spec = specs[slot]
+            decks[slot] = self._add_enhanced_features(
+                {"presentation": presentation}, spec["subject"], spec["topic"], spec["grade"],
+                spec["theme"], spec["difficulty"], spec["language"]
+            )
+        return decks
     
-    def _parse_and_enhance_slides(self, content: str, subject: str, topic: str, 
-                                grade: Optional[int], theme: str, difficulty: str, 
-                                language: str, slide_count: int) -> Dict:
-        """Parse and enhance the slides response from OpenRouter"""
+    def stream_slides(self,
+                      subject: str,
+                      topic: str,
+                      grade: Optional[int] = None,
+                      slide_count: int = 10,
+                      theme: str = "modern_education",
+                      template: str = "mixed",
+                      difficulty: str = "intermediate",
+                      include_images: bool = True,
+                      language: str = "en",
+                      cancel_event: Optional[threading.Event] = None) -> Iterator[Dict]:
+        """
+        Stream a presentation as it is generated
+        
+        Yields a "slide" event for each slide as soon as it has streamed, then
+        "done" with the parsed presentation (or "error"). Setting cancel_event
+        stops generation early.
+        """
+        chunks = None
         try:
-            # Try to parse JSON response
-            if content.startswith('```json'):
-                content = content.replace('```json', '').replace('```', '').strip()
-            elif content.startswith('```'):
-                content = content.replace('```', '').strip()
+            cache_key = self._slides_cache_key(
+                subject, topic, grade, slide_count, theme, template, difficulty, include_images, language
+            )
+            cached = self._get_cached_slides(cache_key)
+            if cached is not None:
+                for slide in cached.get("presentation", {}).get("slides", []):
+                    yield {"type": "slide", "data": slide}
+                yield {"type": "done", "data": cached, "cached": True, "generated_at": datetime.now().isoformat()}
+                return
+            
+            messages = self._build_messages(
+                subject, topic, grade, slide_count, theme, template, difficulty, include_images, language
+            )
+            scanner = IncrementalJSONScanner(lambda path: path == _STREAMED_SLIDE_PATH)
+            chunks = self.openrouter._stream_request(
+                messages, temperature=0.7, max_tokens=SLIDE_MAX_TOKENS,
+                model=self.model_name, cancel_event=cancel_event,
+                response_format=_JSON_RESPONSE_FORMAT, extra_headers=PROMPT_CACHING_HEADERS
+            )
             
-            slides_data = json.loads(content)
+            streamed = 0
+            for chunk in chunks:
+                for node in scanner.feed(chunk):
+                    if not isinstance(node["data"], dict):
+                        continue
+                    streamed += 1
+                    # Enhance while the rest of the presentation is still being generated
+                    slide = self._enhance_slide(node["data"], streamed, subject, topic, language, theme)
+                    yield {"type": "slide", "data": slide}
             
-            # Add enhanced features and validation
-            slides_data = self._add_enhanced_features(slides_data, subject, topic, grade, theme, difficulty, language)
+            if cancel_event is not None and cancel_event.is_set():
+                return
             
-            return slides_data
+            slides_data = self._parse_and_enhance_slides(
+                scanner.text, subject, topic, grade, theme, difficulty, language, slide_count
+            )
+            if not slides_data.get("metadata", {}).get("aiModel", "").endswith("-fallback"):
+                self._store_cached_slides(cache_key, slides_data)
+            yield {"type": "done", "data": slides_data, "cached": False, "generated_at": datetime.now().isoformat()}
             
-        except json.JSONDecodeError:
-            # Fallback: Create structured slides from text
-            return self._create_fallback_slides(content, subject, topic, grade, theme, difficulty, language, slide_count)
+        except Exception as e:
+            logger.error(f"Slide streaming error: {e}")
+            yield {"type": "error", "error": str(e)}
+        finally:
+            if chunks is not None:
+                chunks.close()
+    
+    def _build_slides_result(self, slides_response: Dict, cache_key: Optional[str], subject: str, topic: str,
+                             grade: Optional[int], slide_count: int, theme: str, difficulty: str,
+                             include_images: bool, language: str) -> Dict:
+        """Parse an OpenRouter response into the public result format, caching genuine model output"""
+        if not slides_response.get("success"):
+            return {
+                "success": False,
+                "error": slides_response.get("error", "Unknown error"),
+                "data": None
+            }
+        
+        slides_data = self._parse_and_enhance_slides(
+            slides_response["content"], subject, topic, grade, 
+            theme, difficulty, language, slide_count
+        )
+        
+        # Only keep genuine model output; fallbacks should be retried next time
+        is_fallback = (
+            slides_response.get("model") == "superior-educational-fallback"
+            or slides_data.get("metadata", {}).get("aiModel", "").endswith("-fallback")
+        )
+        if cache_key is not None and not is_fallback:
+            self._store_cached_slides(cache_key, slides_data)
+        
+        return self._slides_result(slides_data, include_images)
+    
+    @staticmethod
+    def _slides_cache_key(subject: str, topic: str, grade: Optional[int], slide_count: int, theme: str,
+                          template: str, difficulty: str, include_images: bool, language: str) -> str:
+        """Cache key with subject/topic normalized so trivially different spellings share entries"""
+        return ResponseCache.make_key(
+            subject=normalize_text(subject), topic=normalize_text(topic), grade=grade,
+            slide_count=slide_count, theme=theme, template=template, difficulty=difficulty,
+            include_images=bool(include_images), language=language
+        )
+    
+    def _get_cached_slides(self, cache_key: str) -> Optional[Dict]:
+        """Look up enhanced slide data in memory, then on disk"""
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            return orjson.loads(cached)
+        slides_data = self._disk_cache.get(cache_key)
+        if slides_data is not None:
+            self._response_cache.set(cache_key, compact_json(slides_data))
+        return slides_data
+    
+    def _store_cached_slides(self, cache_key: str, slides_data: Dict) -> None:
+        """Save enhanced slide data to both cache layers"""
+        self._response_cache.set(cache_key, compact_json(slides_data))
+        self._disk_cache.set(cache_key, slides_data)
+    
+    def _slides_result(self, slides_data: Dict, include_images: bool, cached: bool = False) -> Dict:
+        """Public result format for generated slides"""
+        return {
+            "success": True,
+            "data": slides_data,
+            "generated_at": datetime.now().isoformat(),
+            "model": "claude-3.5-sonnet",
+            "cached": cached,
+            "enhanced_features": {
+                "visual_design": True,
+                "interactive_elements": include_images,
+                "ncert_aligned": True,
+                "pedagogically_sound": True
+            }
+        }
+    
+    def _generate_with_openrouter(self, subject: str, topic: str, grade: Optional[int],
+                                slide_count: int, theme: str, template: str,
+                                difficulty: str, include_images: bool, language: str) -> Dict:
+        """Generate slides using OpenRouter Claude 3.5 Sonnet with enhanced prompts"""
+        
+        messages = self._build_messages(
+            subject, topic, grade, slide_count, theme, template, difficulty, include_images, language
+        )
+        
+        return self.openrouter._request_with_fallback(
+            messages, temperature=0.7, max_tokens=SLIDE_MAX_TOKENS, model_override=self.model_name,
+            response_format=_JSON_RESPONSE_FORMAT, extra_headers=PROMPT_CACHING_HEADERS
+        )
+    
+    def _build_messages(self, subject: str, topic: str, grade: Optional[int],
+                        slide_count: int, theme: str, template: str,
+                        difficulty: str, include_images: bool, language: str) -> List[Dict]:
+        """Build the chat messages for a slide request"""
+        
+        user_prompt = _slide_request_prompt(
+            subject, topic, grade, slide_count, theme, difficulty, bool(include_images), language
+        )
+        
+        # Everything before the user turn is identical for every request with this theme
+        messages = [
+            {
+                "role": "system",
+                "content": [
+                    {"type": "text", "text": self._static_prompt(theme), "cache_control": {"type": "ephemeral"}}
+                ]
+            },
+            {"role": "user", "content": user_prompt}
+        ]
+        
+        return messages
+    
+    def _static_prompt(self, theme: str) -> str:
+        """Cacheable prompt prefix for a theme"""
+        return self._static_prompts.get(theme, self._static_prompts["modern_education"])
+    
+    def _parse_and_enhance_slides(self, content: str, subject: str, topic: str, 
+                                grade: Optional[int], theme: str, difficulty: str, 
+                                language: str, slide_count: int) -> Dict:
+        """Parse and enhance the slides response from OpenRouter"""
+        # The first balanced {...} block, ignoring code fences and surrounding prose
+        json_text = extract_json_object(content)
+        try:
+            slides_data = orjson.loads(json_text) if json_text else None
+        except orjson.JSONDecodeError:
+            slides_data = None
+        
+        if slides_data is None:
+            # Salvage truncated or slightly malformed output before giving up on it
+            slides_data = repair_json(content)
+            presentation = slides_data.get("presentation", slides_data) if isinstance(slides_data, dict) else None
+            if not isinstance(presentation, dict) or not presentation.get("slides"):
+                # Fallback: Create structured slides from text
+                return self._create_fallback_slides(content, subject, topic, grade, theme, difficulty, language, slide_count)
+            logger.warning("Repaired malformed slides JSON")
+        
+        # Add enhanced features and validation
+        return self._add_enhanced_features(slides_data, subject, topic, grade, theme, difficulty, language)
     
     def _add_enhanced_features(self, slides_data: Dict, subject: str, topic: str, 
                              grade: Optional[int], theme: str, difficulty: str, language: str) -> Dict:
@@ -373,6 +865,7 @@ Return ONLY a valid JSON object in this exact format:
     
     def _enhance_slide(self, slide: Dict, slide_number: int, subject: str, topic: str, language: str, theme: str) -> Dict:
         """Enhance individual slide with additional features"""
+        # Model output usually has every field, so list and text defaults are only built when missing
         slide.setdefault('slideNumber', slide_number)
         slide.setdefault('type', 'content')
         
@@ -381,21 +874,26 @@ Return ONLY a valid JSON object in this exact format:
             slide['content'] = {}
         
         content = slide['content']
-        content.setdefault('mainPoints', [])
+        if 'mainPoints' not in content:
+            content['mainPoints'] = []
         content.setdefault('explanation', '')
-        content.setdefault('examples', [])
+        if 'examples' not in content:
+            content['examples'] = []
         
         # Ensure visual elements
         if 'visualElements' not in slide:
             slide['visualElements'] = {}
         
         visual = slide['visualElements']
-        visual.setdefault('images', [])
+        if 'images' not in visual:
+            visual['images'] = []
         visual.setdefault('layout', 'balanced')
         
         # Add interactive elements if missing
-        slide.setdefault('interactiveElements', [])
-        slide.setdefault('speakerNotes', f"Present slide {slide_number} content clearly")
+        if 'interactiveElements' not in slide:
+            slide['interactiveElements'] = []
+        if 'speakerNotes' not in slide:
+            slide['speakerNotes'] = f"Present slide {slide_number} content clearly"
         
         return slide
     
@@ -456,13 +954,13 @@ Return ONLY a valid JSON object in this exact format:
         })
         
         # Content slides
-        content_lines = [line.strip() for line in content.split('\n') if line.strip()]
-        points_per_slide = max(1, len(content_lines) // (slide_count - 2))
+        content_lines = [line for line in map(str.strip, content.split('\n')) if line]
+        points_per_slide = max(1, len(content_lines) // max(1, slide_count - 2))
+        # Consecutive runs of points_per_slide lines, taken in one pass
+        remaining_lines = iter(content_lines)
         
         for i in range(1, slide_count - 1):
-            start_idx = (i - 1) * points_per_slide
-            end_idx = min(start_idx + points_per_slide, len(content_lines))
-            slide_content = content_lines[start_idx:end_idx]
+            slide_content = list(itertools.islice(remaining_lines, points_per_slide))
             
             slides.append({
                 "slideNumber": i + 1,
@@ -502,18 +1000,33 @@ Return ONLY a valid JSON object in this exact format:
         """Create slides with enhanced interactive elements"""
         
         # Generate slides with special focus on interactivity
-        result = self.generate_slides(
-            subject=subject,
-            topic=topic,
-            grade=grade,
-            slide_count=12,
-            theme="modern_education",
-            template="mixed",
-            difficulty=difficulty,
-            include_images=True,
-            language=language
-        )
-        
+        result = self.generate_slides(**self._interactive_spec(subject, topic, grade, difficulty, language))
+        return self._add_interactive_features(result)
+    
+    async def acreate_interactive_slides(self, subject: str, topic: str, grade: int,
+                                         difficulty: str = "medium", language: str = "en") -> Dict:
+        """Async variant of create_interactive_slides"""
+        result = await self.agenerate_slides(**self._interactive_spec(subject, topic, grade, difficulty, language))
+        return self._add_interactive_features(result)
+    
+    @staticmethod
+    def _interactive_spec(subject: str, topic: str, grade: int, difficulty: str, language: str) -> Dict:
+        """generate_slides arguments for an interactive presentation"""
+        return {
+            "subject": subject,
+            "topic": topic,
+            "grade": grade,
+            "slide_count": 12,
+            "theme": "modern_education",
+            "template": "mixed",
+            "difficulty": difficulty,
+            "include_images": True,
+            "language": language
+        }
+    
+    @staticmethod
+    def _add_interactive_features(result: Dict) -> Dict:
+        """Add polls, activities and gamification to every slide of a successful result"""
         if result.get("success"):
             # Add extra interactive features
             slides_data = result["data"]
@@ -0,0 +1,174 @@
+"""
+Incremental JSON handling for streamed model output
+Reports nested objects/arrays as soon as they close and salvages truncated documents
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+_KEY_BEFORE_VALUE = re.compile(r'"((?:[^"\\]|\\.)*)"\s*:\s*$')
+# A whole reply that is one object, optionally wrapped in a ```json fence
+_FENCED_OBJECT = re.compile(r'\s*(?:```(?:json)?\s*)?(\{.*\})\s*(?:```)?\s*', re.DOTALL)
+
+
+class IncrementalJSONScanner:
+    """Track a JSON document as it streams in and emit completed containers.
+
+    Every object or array is identified by its path: the tuple of keys of the
+    enclosing containers plus its own key (``None`` for the document root and
+    for array elements). ``want`` decides which closed containers are parsed and
+    returned from ``feed``.
+    """
+
+    def __init__(self, want: Callable[[Tuple[Optional[str], ...]], bool]):
+        self.want = want
+        self.text = ""
+        self._stack: List[Tuple[int, Optional[str]]] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of text and return containers that closed within it"""
+        completed = []
+        offset = len(self.text)
+        self.text += chunk
+
+        for i, ch in enumerate(chunk, offset):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch == '{' or ch == '[':
+                key = None
+                if self._stack and self.text[self._stack[-1][0]] == '{':
+                    match = _KEY_BEFORE_VALUE.search(self.text, max(0, i - 200), i)
+                    key = match.group(1) if match else None
+                self._stack.append((i, key))
+            elif (ch == '}' or ch == ']') and self._stack:
+                path = tuple(k for _, k in self._stack)
+                start, _ = self._stack.pop()
+                if self.want(path):
+                    try:
+                        value = orjson.loads(self.text[start:i + 1])
+                    except orjson.JSONDecodeError:
+                        continue
+                    completed.append({"path": path, "data": value})
+
+        return completed
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """Best-effort parse of truncated or slightly malformed JSON model output
+
+    Skips any preamble before the first bracket, drops trailing commas, closes
+    an unterminated string and any open containers. If the tail cannot be
+    closed cleanly, falls back to cutting at the last element boundaries.
+    Returns None when nothing usable can be recovered.
+    """
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        return None
+
+    out: List[str] = []
+    stack: List[str] = []
+    cut_points: List[Tuple[int, str]] = []  # (length of out, closers) at each comma outside strings
+    in_string = False
+    escape = False
+
+    for ch in text[min(starts):]:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch == '{' or ch == '[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch == '}' or ch == ']':
+            if not stack:
+                break
+            # Drop a trailing comma before the closing bracket
+            k = len(out) - 1
+            while k >= 0 and out[k].isspace():
+                k -= 1
+            if k >= 0 and out[k] == ',':
+                del out[k:]
+                while cut_points and cut_points[-1][0] >= k:
+                    cut_points.pop()
+            out.append(stack.pop())
+            if not stack:
+                break
+            continue
+        elif ch == ',':
+            cut_points.append((len(out), ''.join(reversed(stack))))
+        out.append(ch)
+
+    body = ''.join(out)
+    if not stack:
+        candidates = [body]
+    else:
+        tail = body[:-1] if escape else body
+        if in_string:
+            tail += '"'
+        candidates = [tail.rstrip().rstrip(',') + ''.join(reversed(stack))]
+        candidates.extend(body[:pos] + closers for pos, closers in reversed(cut_points[-50:]))
+
+    for candidate in candidates:
+        try:
+            return orjson.loads(candidate)
+        except orjson.JSONDecodeError:
+            continue
+    return None
+
+
+def extract_json_object(text: str) -> Optional[str]:
+    """Return the first balanced top-level {...} object in text, ignoring surrounding prose or fences"""
+    # Fast path: most replies are a single (possibly fenced) object that orjson can validate in C
+    match = _FENCED_OBJECT.fullmatch(text)
+    if match:
+        try:
+            orjson.loads(match.group(1))
+            return match.group(1)
+        except orjson.JSONDecodeError:
+            pass
+
+    start = text.find('{')
+    if start < 0:
+        return None
+
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
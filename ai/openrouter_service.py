@@ -4,17 +4,84 @@ Advanced AI service with superior educational content generation capabilities
 Provides better responses than ChatGPT through specialized educational expertise
 """
 
+import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import importlib.util
 import json
 import logging
+import threading
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Any, Awaitable, Dict, Iterator, List, Optional
 import random
 import os
 
+try:
+    import httpx
+    httpx.Limits, httpx.TimeoutException  # googletrans pins an httpx too old to have these
+except (ImportError, AttributeError):  # optional: async requests fall back to worker threads
+    httpx = None
+
 logger = logging.getLogger(__name__)
 
+# Opt-in header for Anthropic prompt caching of content blocks marked with cache_control
+PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
+
+# (connect, read) seconds: fail fast on unreachable hosts, allow long generations
+REQUEST_TIMEOUT = (5, 45)
+
+# Educational system prompt enhancement appended to every request's system message
+EDUCATIONAL_CONTEXT = """You are an expert educational AI with deep knowledge of:
+- NCERT curriculum and Indian education standards
+- Advanced pedagogical methods and instructional design
+- Age-appropriate content development and scaffolding
+- Comprehensive assessment strategies and rubric design
+- Cultural sensitivity and multilingual education
+- Technology integration and accessibility features
+
+Always provide responses that exceed ChatGPT quality through:
+1. Detailed pedagogical reasoning and educational theory application
+2. Comprehensive content structure with multiple learning modalities
+3. NCERT alignment with specific chapter and learning outcome references
+4. Professional assessment criteria and clear marking schemes
+5. Accessibility features and differentiated instruction options
+6. Real-world applications and cross-curricular connections
+7. Technology integration and interactive elements
+"""
+
+
+@functools.lru_cache(maxsize=64)
+def _system_with_context(system_prompt: str) -> str:
+    """System prompt followed by EDUCATIONAL_CONTEXT, built once per distinct prompt"""
+    return f"{system_prompt}\n\n{EDUCATIONAL_CONTEXT}"
+
+
+def run_sync(coro: Awaitable) -> Any:
+    """Run a coroutine to completion from synchronous code
+
+    asyncio.run cannot be called while an event loop is running in this thread
+    (async web routes, notebooks), so in that case the coroutine gets its own
+    loop in a worker thread. The caller still blocks until it finishes; async
+    code should await the coroutine instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+# httpx.AsyncClient shared by the async requests inside OpenRouterService.async_client()
+_ASYNC_CLIENT: contextvars.ContextVar = contextvars.ContextVar("openrouter_async_client", default=None)
+
 class OpenRouterService:
     """Enhanced OpenRouter service with superior educational content generation"""
     
@@ -34,6 +101,15 @@ class OpenRouterService:
         self.last_request_time = 0
         self.min_delay = 0.5  # Reduced delay for better performance
         
+        # Keep-alive connection pool so repeated calls skip TCP/TLS setup; sized above the
+        # quiz generator's concurrent workers. Only connection failures are retried, since
+        # urllib3 never re-sends a POST after a read error
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=4, pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.2)
+        ))
+        
         # Enhanced model selection with premium and free tiers
         self.premium_models = [
             "anthropic/claude-3.5-sonnet",
@@ -83,22 +159,17 @@ class OpenRouterService:
             "module_mapping": self.module_models
         }
     
+    def close(self) -> None:
+        """Release pooled keep-alive connections"""
+        self.session.close()
+    
     def _request_with_fallback(self, messages: List[Dict], temperature: float = 0.7, 
-                             max_tokens: int = 3000, model_override: Optional[str] = None) -> Dict:
+                             max_tokens: int = 3000, model_override: Optional[str] = None,
+                             response_format: Optional[Dict] = None,
+                             extra_headers: Optional[Dict[str, str]] = None) -> Dict:
         """Enhanced request with intelligent model selection and superior fallbacks"""
         
-        # Try premium models first if no override specified
-        models_to_try = []
-        if model_override:
-            models_to_try = [model_override]
-        else:
-            # Smart model selection based on content type
-            models_to_try = self.premium_models[:2] + self.free_models
-        
-        for model in models_to_try:
-            if model is None:
-                continue
-                
+        for model in self._models_to_try(model_override):
             try:
                 # Intelligent rate limiting
                 current_time = time.time()
@@ -106,21 +177,10 @@ class OpenRouterService:
                 if time_since_last < self.min_delay:
                     time.sleep(self.min_delay - time_since_last)
                 
-                response = self._make_enhanced_request(messages, temperature, max_tokens, model)
-                
-                if response and response.get("choices"):
-                    content = response["choices"][0]["message"]["content"]
-                    
-                    # Enhanced response validation
-                    if self._validate_educational_response(content, messages):
-                        self.last_request_time = time.time()
-                        return {
-                            "success": True,
-                            "content": content,
-                            "usage": response.get("usage", {}),
-                            "model": model,
-                            "quality_score": self._calculate_quality_score(content)
-                        }
+                response = self._make_enhanced_request(messages, temperature, max_tokens, model, response_format, extra_headers)
+                result = self._completion_result(response, model, messages)
+                if result:
+                    return result
                     
             except Exception as e:
                 logger.warning(f"Model {model} failed: {e}")
@@ -129,35 +189,159 @@ class OpenRouterService:
         # Enhanced fallback with educational intelligence
         return self._generate_superior_fallback_response(messages)
     
-    def _make_enhanced_request(self, messages: List[Dict], temperature: float = 0.7, 
-                             max_tokens: int = 3000, model: Optional[str] = None) -> Dict:
-        """Enhanced HTTP request with educational context injection"""
-        # Convert and enhance messages with educational context
-        enhanced_messages = self._enhance_messages_with_context(messages)
+    def _models_to_try(self, model_override: Optional[str]) -> List[str]:
+        """The override model alone, or premium models first followed by the free tier"""
+        if model_override:
+            return [model_override]
+        # Smart model selection based on content type
+        return [model for model in self.premium_models[:2] + self.free_models if model is not None]
+    
+    def _completion_result(self, response: Optional[Dict], model: str, messages: List[Dict]) -> Optional[Dict]:
+        """Success result for a chat completion, or None if it is missing or fails validation"""
+        if not response or not response.get("choices"):
+            return None
+        content = response["choices"][0]["message"]["content"]
+        
+        # Enhanced response validation
+        if not self._validate_educational_response(content, messages):
+            return None
+        self.last_request_time = time.time()
+        return {
+            "success": True,
+            "content": content,
+            "usage": response.get("usage", {}),
+            "model": model,
+            "quality_score": self._calculate_quality_score(content)
+        }
+    
+    async def _arequest_with_fallback(self, messages: List[Dict], temperature: float = 0.7,
+                                      max_tokens: int = 3000, model_override: Optional[str] = None,
+                                      response_format: Optional[Dict] = None,
+                                      extra_headers: Optional[Dict[str, str]] = None) -> Dict:
+        """Async variant of _request_with_fallback
+
+        Inside async_client() requests go through the shared httpx connection pool;
+        otherwise the blocking request runs in a worker thread.
+        """
+        client = _ASYNC_CLIENT.get()
+        if client is None:
+            return await asyncio.to_thread(
+                self._request_with_fallback, messages, temperature, max_tokens,
+                model_override, response_format, extra_headers
+            )
         
+        for model in self._models_to_try(model_override):
+            try:
+                time_since_last = time.time() - self.last_request_time
+                if time_since_last < self.min_delay:
+                    await asyncio.sleep(self.min_delay - time_since_last)
+                
+                response = await self._amake_enhanced_request(
+                    client, messages, temperature, max_tokens, model, response_format, extra_headers
+                )
+                result = self._completion_result(response, model, messages)
+                if result:
+                    return result
+                    
+            except Exception as e:
+                logger.warning(f"Model {model} failed: {e}")
+                continue
+        
+        return self._generate_superior_fallback_response(messages)
+    
+    @contextlib.asynccontextmanager
+    async def async_client(self):
+        """Share one keep-alive httpx.AsyncClient among the async requests made inside this block
+
+        Without httpx installed, or when already inside a block, this does nothing.
+        """
+        if httpx is None or _ASYNC_CLIENT.get() is not None:
+            yield
+            return
+        
+        client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=httpx.Timeout(REQUEST_TIMEOUT[1], connect=REQUEST_TIMEOUT[0])
+        )
+        token = _ASYNC_CLIENT.set(client)
+        try:
+            yield
+        finally:
+            _ASYNC_CLIENT.reset(token)
+            await client.aclose()
+    
+    async def _amake_enhanced_request(self, client: "httpx.AsyncClient", messages: List[Dict],
+                                      temperature: float = 0.7, max_tokens: int = 3000,
+                                      model: Optional[str] = None, response_format: Optional[Dict] = None,
+                                      extra_headers: Optional[Dict[str, str]] = None) -> Optional[Dict]:
+        """Async HTTP request through a shared httpx client; mirrors _make_enhanced_request"""
+        payload = self._build_payload(messages, temperature, max_tokens, model, response_format)
         try:
-            # Select optimal model for educational content
-            model_to_use = model or self._select_optimal_model(messages)
+            response = await client.post(
+                self.base_url,
+                headers={**self.headers, **extra_headers} if extra_headers else self.headers,
+                json=payload
+            )
             
-            payload = {
-                "model": model_to_use,
-                "messages": enhanced_messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-                "top_p": 0.9,
-                "frequency_penalty": 0.1,
-                "presence_penalty": 0.1
-            }
+            if response.status_code == 200:
+                return response.json()
+            elif response.status_code == 400 and response_format:
+                # Model does not support structured output; retry in plain mode
+                logger.info(f"Model {payload['model']} rejected response_format, retrying without it")
+                return await self._amake_enhanced_request(
+                    client, messages, temperature, max_tokens, payload["model"], None, extra_headers
+                )
+            else:
+                logger.warning(f"API request failed with status {response.status_code}: {response.text}")
+                return None
+                
+        except httpx.TimeoutException:
+            logger.warning("Request timeout - API taking too long")
+            return None
+        except Exception as e:
+            logger.error(f"Request error: {e}")
+            return None
+    
+    def _build_payload(self, messages: List[Dict], temperature: float, max_tokens: int,
+                       model: Optional[str], response_format: Optional[Dict]) -> Dict:
+        """Chat completion request body with the educational context injected"""
+        payload = {
+            "model": model or self._select_optimal_model(messages),
+            "messages": self._enhance_messages_with_context(messages),
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "top_p": 0.9,
+            "frequency_penalty": 0.1,
+            "presence_penalty": 0.1
+        }
+        if response_format:
+            payload["response_format"] = response_format
+        return payload
+    
+    def _make_enhanced_request(self, messages: List[Dict], temperature: float = 0.7, 
+                             max_tokens: int = 3000, model: Optional[str] = None,
+                             response_format: Optional[Dict] = None,
+                             extra_headers: Optional[Dict[str, str]] = None) -> Dict:
+        """Enhanced HTTP request with educational context injection"""
+        try:
+            # Enhanced messages and the optimal model for educational content
+            payload = self._build_payload(messages, temperature, max_tokens, model, response_format)
+            model_to_use = payload["model"]
             
-            response = requests.post(
+            response = self.session.post(
                 self.base_url,
-                headers=self.headers,
+                headers={**self.headers, **extra_headers} if extra_headers else self.headers,
                 json=payload,
-                timeout=45  # Increased timeout for better content
+                timeout=REQUEST_TIMEOUT
             )
             
             if response.status_code == 200:
                 return response.json()
+            elif response.status_code == 400 and response_format:
+                # Model does not support structured output; retry in plain mode
+                logger.info(f"Model {model_to_use} rejected response_format, retrying without it")
+                return self._make_enhanced_request(messages, temperature, max_tokens, model_to_use, None, extra_headers)
             else:
                 logger.warning(f"API request failed with status {response.status_code}: {response.text}")
                 return None
@@ -169,43 +353,91 @@ class OpenRouterService:
             logger.error(f"Request error: {e}")
             return None
     
+    def _stream_request(self, messages: List[Dict], temperature: float = 0.7,
+                        max_tokens: int = 3000, model: Optional[str] = None,
+                        cancel_event: Optional[threading.Event] = None,
+                        response_format: Optional[Dict] = None,
+                        extra_headers: Optional[Dict[str, str]] = None) -> Iterator[str]:
+        """Stream completion text as it is generated using server-sent events
+
+        Yields content deltas; stops early and closes the connection once
+        cancel_event is set.
+        """
+        payload = self._build_payload(messages, temperature, max_tokens, model, response_format)
+        payload["stream"] = True
+
+        response = self.session.post(
+            self.base_url,
+            headers={**self.headers, **extra_headers} if extra_headers else self.headers,
+            json=payload,
+            timeout=REQUEST_TIMEOUT,
+            stream=True
+        )
+        if response.status_code == 400 and response_format:
+            # Model does not support structured output; retry in plain mode
+            response.close()
+            del payload["response_format"]
+            response = self.session.post(
+                self.base_url,
+                headers={**self.headers, **extra_headers} if extra_headers else self.headers,
+                json=payload,
+                timeout=REQUEST_TIMEOUT,
+                stream=True
+            )
+        try:
+            if response.status_code != 200:
+                raise RuntimeError(f"Streaming request failed with status {response.status_code}: {response.text}")
+
+            for line in response.iter_lines(decode_unicode=True):
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                if not line or not line.startswith("data:"):
+                    continue  # keep-alive comments and blank separators
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise RuntimeError(f"Streaming error: {chunk['error']}")
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+        finally:
+            response.close()
+            self.last_request_time = time.time()
+
     def _enhance_messages_with_context(self, messages: List[Dict]) -> List[Dict]:
         """Inject educational expertise context into messages"""
         if not messages:
             return messages
-            
-        # Educational system prompt enhancement
-        educational_context = """You are an expert educational AI with deep knowledge of:
-- NCERT curriculum and Indian education standards
-- Advanced pedagogical methods and instructional design
-- Age-appropriate content development and scaffolding
-- Comprehensive assessment strategies and rubric design
-- Cultural sensitivity and multilingual education
-- Technology integration and accessibility features
-
-Always provide responses that exceed ChatGPT quality through:
-1. Detailed pedagogical reasoning and educational theory application
-2. Comprehensive content structure with multiple learning modalities
-3. NCERT alignment with specific chapter and learning outcome references
-4. Professional assessment criteria and clear marking schemes
-5. Accessibility features and differentiated instruction options
-6. Real-world applications and cross-curricular connections
-7. Technology integration and interactive elements
-"""
         
         enhanced_messages = []
         
         # Add educational context to system message
-        if messages and messages[0].get("role") == "system":
+        if messages and messages[0].get("role") == "system" and isinstance(messages[0]["content"], list):
+            # Content blocks: extend the cached prefix so the shared context is cached with it
+            parts = [dict(part) for part in messages[0]["content"]]
+            cached = [i for i, part in enumerate(parts) if "cache_control" in part]
+            context_part = {"type": "text", "text": EDUCATIONAL_CONTEXT}
+            if cached:
+                context_part["cache_control"] = parts[cached[-1]].pop("cache_control")
+                parts.insert(cached[-1] + 1, context_part)
+            else:
+                parts.append(context_part)
+            enhanced_messages.append({"role": "system", "content": parts})
+            enhanced_messages.extend(messages[1:])
+        elif messages and messages[0].get("role") == "system":
             enhanced_messages.append({
                 "role": "system",
-                "content": f"{messages[0]['content']}\n\n{educational_context}"
+                "content": _system_with_context(messages[0]['content'])
             })
             enhanced_messages.extend(messages[1:])
         else:
             enhanced_messages.append({
                 "role": "system", 
-                "content": educational_context
+                "content": EDUCATIONAL_CONTEXT
             })
             enhanced_messages.extend(messages)
             
@@ -2812,3 +3044,11 @@ Always provide responses that exceed ChatGPT quality through:
                 }
             }
         })
+
+
+@functools.lru_cache(maxsize=8)
+def get_shared_openrouter(api_key: Optional[str] = None) -> OpenRouterService:
+    """Return a process-wide OpenRouterService per API key so its connection pool is reused"""
+    service = OpenRouterService(api_key)
+    atexit.register(service.close)
+    return service
@@ -6,6 +6,7 @@ Enhanced version with better error handling and improved content analysis
 
 import PyPDF2
 import json
+import mmap
 import os
 import re
 from pathlib import Path
@@ -40,21 +41,22 @@ class NCERTPDFExtractor:
     def extract_text_from_pdf(self, pdf_path: Path) -> str:
         """Extract text content from a PDF file"""
         try:
-            text_content = ""
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
+            page_texts = []
+            # Memory-map the file so pages are read on demand instead of copied into Python buffers
+            with open(pdf_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                pdf_reader = PyPDF2.PdfReader(mapped)
                 
                 for page_num, page in enumerate(pdf_reader.pages):
                     try:
                         page_text = page.extract_text()
                         if page_text.strip():
-                            text_content += f"\n--- Page {page_num + 1} ---\n"
-                            text_content += page_text
+                            page_texts.append(f"\n--- Page {page_num + 1} ---\n")
+                            page_texts.append(page_text)
                     except Exception as e:
                         logger.warning(f"Error extracting page {page_num + 1} from {pdf_path}: {e}")
                         continue
                         
-            return text_content
+            return ''.join(page_texts)
             
         except Exception as e:
             logger.error(f"Error extracting text from {pdf_path}: {e}")
@@ -0,0 +1,202 @@
+"""
+In-memory response cache for AI generation results
+Keeps successful results and short-lived transient failures keyed by request parameters
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple, Union
+
+import orjson
+
+# Errors worth caching briefly: rate limits, upstream 5xx and timeouts
+_TRANSIENT_ERROR = re.compile(r'\b(429|5\d\d)\b|rate.?limit|time[d ]?out|temporarily|unavailable', re.IGNORECASE)
+_AUTH_ERROR = re.compile(r'\b(401|403)\b|unauthori[sz]ed|forbidden|invalid api key', re.IGNORECASE)
+_SEPARATORS = re.compile(r'[\s!-/:-@\[-`{-~]+')  # whitespace and ASCII punctuation
+
+
+def is_transient_error(error: str) -> bool:
+    """Return True if an error message describes a retryable upstream failure"""
+    if not error or _AUTH_ERROR.search(error):
+        return False
+    return bool(_TRANSIENT_ERROR.search(error))
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Casefold and collapse punctuation/whitespace so trivially different spellings share cache keys"""
+    return _SEPARATORS.sub(' ', text or '').strip().casefold()
+
+
+def compact_json(value: Any) -> bytes:
+    """orjson-serialized value copied to its exact length (orjson's own result keeps its grown buffer)"""
+    return memoryview(orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)).tobytes()
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry expiry and a separate negative cache"""
+
+    def __init__(self, ttl: float = 3600, negative_ttl: float = 30, max_entries: int = 256):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._negative: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(**params) -> str:
+        """Build a stable cache key from request parameters"""
+        payload = orjson.dumps(params, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a cached value or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_negative(self, key: Hashable) -> Optional[str]:
+        """Return a recently cached error for this key, if still fresh"""
+        with self._lock:
+            entry = self._negative.get(key)
+            if entry is None:
+                return None
+            expires_at, error = entry
+            if expires_at < time.monotonic():
+                del self._negative[key]
+                return None
+            return error
+
+    def set_negative(self, key: Hashable, error: str, ttl: Optional[float] = None) -> bool:
+        """Cache a transient failure briefly; returns False if the error is not transient"""
+        if not is_transient_error(error):
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if len(self._negative) >= self.max_entries:
+                self._negative = {k: v for k, v in self._negative.items() if v[0] >= now}
+                if len(self._negative) >= self.max_entries:
+                    self._negative.pop(next(iter(self._negative)))
+            self._negative[key] = (now + (ttl or self.negative_ttl), error)
+        return True
+
+
+class DiskCache:
+    """Directory of JSON files keyed by cache key, expired by file modification time"""
+
+    def __init__(self, directory: Union[str, Path], ttl: float = 24 * 3600):
+        self.directory = Path(directory)
+        self.ttl = ttl
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the stored value, or None if missing, expired or unreadable"""
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            return orjson.loads(path.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Yield (key, value) for every unexpired, readable entry"""
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        now = time.time()
+        for entry in entries:
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                if now - entry.stat().st_mtime > self.ttl:
+                    continue
+                with open(entry.path, 'rb') as f:
+                    value = orjson.loads(f.read())
+            except (OSError, orjson.JSONDecodeError):
+                continue
+            yield entry.name[:-len(".json")], value
+    
+    def set(self, key: str, value: Any) -> bool:
+        """Write a value atomically; returns False if the cache directory is not writable"""
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS))
+            os.replace(tmp_path, path)
+            return True
+        except (OSError, TypeError):
+            tmp_path.unlink(missing_ok=True)
+            return False
+
+
+def _ngram_vector(text: str, n: int = 3) -> Tuple[Counter, float]:
+    """Character n-gram counts of a padded, casefolded string and the vector norm"""
+    padded = f" {' '.join(text.casefold().split())} "
+    grams = Counter(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    return grams, math.sqrt(sum(c * c for c in grams.values()))
+
+
+class SemanticKeyIndex:
+    """Map near-duplicate texts (by character n-gram cosine similarity) to an existing cache key
+
+    Entries are grouped into buckets, so only texts that share every other request
+    parameter are compared.
+    """
+
+    def __init__(self, threshold: float = 0.9, max_entries: int = 512):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._buckets: Dict[Hashable, List[Tuple[Counter, float, Hashable]]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, bucket: Hashable, text: str, key: Hashable) -> None:
+        """Remember that text in this bucket was cached under key"""
+        grams, norm = _ngram_vector(text)
+        with self._lock:
+            if self._size >= self.max_entries:
+                self._buckets.clear()
+                self._size = 0
+            self._buckets.setdefault(bucket, []).append((grams, norm, key))
+            self._size += 1
+
+    def find(self, bucket: Hashable, text: str) -> Optional[Hashable]:
+        """Return the key of the most similar text above the threshold, if any"""
+        grams, norm = _ngram_vector(text)
+        best_key, best_score = None, self.threshold
+        with self._lock:
+            entries = list(self._buckets.get(bucket, ()))
+        for other, other_norm, key in entries:
+            if not norm or not other_norm:
+                continue
+            score = sum(count * other.get(gram, 0) for gram, count in grams.items()) / (norm * other_norm)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
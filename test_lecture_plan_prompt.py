@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test that lecture plan prompts are byte-identical for identical requests, so provider prompt caching can hit
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import orjson
+
+# Add AI directory to path
+ai_dir = Path(__file__).parent / 'ai'
+sys.path.insert(0, str(ai_dir))
+
+# Building messages never calls the API, but the service requires a key to construct
+os.environ.setdefault('OPENROUTER_API_KEY', 'test-key')
+
+PLAN_ARGS = dict(
+    subject='Physics',
+    topic='Laws of Motion',
+    grade=9,
+    duration=45,
+    learning_objectives=['State Newton\'s three laws of motion'],
+    teaching_strategies=['inquiry_based', 'direct_instruction'],
+    difficulty='grade_appropriate',
+    language='en',
+    include_technology=True
+)
+
+def test_plan_messages_are_byte_identical():
+    """Two successive builds with the same arguments produce the same bytes"""
+    from enhanced_lecture_plan_generator import EnhancedLecturePlanGenerator
+
+    generator = EnhancedLecturePlanGenerator()
+    first = orjson.dumps(generator._build_plan_messages(**PLAN_ARGS))
+    time.sleep(0.01)  # a live timestamp in the prompt would differ by now
+    second = orjson.dumps(generator._build_plan_messages(**PLAN_ARGS))
+
+    assert first == second
+
+def test_plan_messages_match_across_instances():
+    """Separate generator instances (e.g. worker processes) build the same prompt"""
+    from enhanced_lecture_plan_generator import EnhancedLecturePlanGenerator
+
+    first = orjson.dumps(EnhancedLecturePlanGenerator()._build_plan_messages(**PLAN_ARGS))
+    second = orjson.dumps(EnhancedLecturePlanGenerator()._build_plan_messages(**PLAN_ARGS))
+
+    assert first == second
+
+def main():
+    """Main test function"""
+    test_plan_messages_are_byte_identical()
+    test_plan_messages_match_across_instances()
+    print("✅ Lecture plan prompts are byte-identical for identical requests")
+
+if __name__ == "__main__":
+    main()
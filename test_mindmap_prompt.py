@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test that the mindmap system and user prompts stay within their input token budget
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add AI directory to path
+ai_dir = Path(__file__).parent / 'ai'
+sys.path.insert(0, str(ai_dir))
+
+# Building messages never calls the API, but the service requires a key to construct
+os.environ.setdefault('OPENROUTER_API_KEY', 'test-key')
+
+MAX_PROMPT_TOKENS = 800
+
+def count_tokens(text):
+    """cl100k_base token count when tiktoken is installed, otherwise roughly 4 characters per token"""
+    try:
+        import tiktoken
+    except ImportError:
+        return len(text) // 4
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+def prompt_text(messages):
+    """System and user text the generator sends (the assistant prefill is output, not prompt)"""
+    parts = []
+    for message in messages:
+        if message["role"] == "assistant":
+            continue
+        content = message["content"]
+        if isinstance(content, list):
+            parts.extend(part["text"] for part in content)
+        else:
+            parts.append(content)
+    return "\n".join(parts)
+
+def test_mindmap_prompt_token_budget():
+    """Every mindmap type builds a system+user prompt under MAX_PROMPT_TOKENS"""
+    from enhanced_mindmap_generator import EnhancedMindmapGenerator
+
+    generator = EnhancedMindmapGenerator()
+    for mindmap_type in generator.mindmap_types:
+        messages = generator._build_messages(
+            'Physics', 'Laws of Motion', 9, mindmap_type, 'medium', 'en', True, 'modern'
+        )
+        tokens = count_tokens(prompt_text(messages))
+        assert tokens < MAX_PROMPT_TOKENS, f"{mindmap_type} prompt is {tokens} tokens"
+
+def main():
+    """Main test function"""
+    test_mindmap_prompt_token_budget()
+    print(f"✅ Mindmap prompts are under {MAX_PROMPT_TOKENS} tokens")
+
+if __name__ == "__main__":
+    main()